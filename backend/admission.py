@@ -0,0 +1,175 @@
+"""Per-user admission control for expensive endpoints.
+
+Each endpoint class (detect, search, download) has a token bucket per user
+bounding the request rate, a per-user concurrency limit and a total
+concurrency limit. Requests over the concurrency limits wait in per-user
+queues that are served round-robin, so one user with many requests in
+flight cannot starve the others. Requests that cannot be admitted are
+rejected with a retry delay (sent as 429 + Retry-After).
+
+All state lives on the event loop thread; nothing here blocks.
+"""
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from config import ADMISSION_ENABLED, ADMISSION_LIMITS, ADMISSION_MAX_QUEUE, ADMISSION_QUEUE_TIMEOUT
+from metrics import timed, ADMISSION_REJECTIONS, ADMISSION_IN_FLIGHT
+
+# Idle users' state is dropped once this many are tracked per class
+MAX_TRACKED_USERS = 10000
+
+
+class Rejected(Exception):
+    """A request was not admitted; retry after `retry_after` seconds."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Rate and concurrency limits of one endpoint class."""
+
+    def __init__(self, name: str, rate: float, burst: int, per_user: int, total: int,
+                 max_queue: int = ADMISSION_MAX_QUEUE, queue_timeout: float = ADMISSION_QUEUE_TIMEOUT):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.per_user = per_user
+        self.total = total
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.running = 0
+        self._buckets: dict[str, tuple[float, float]] = {}  # key -> (tokens, updated_at)
+        self._active: dict[str, int] = {}
+        # Users with waiting requests, in round-robin order
+        self._waiting: OrderedDict[str, deque[asyncio.Future]] = OrderedDict()
+
+    def _take_token(self, key: str) -> Optional[float]:
+        """Spend one token of the user's bucket; returns seconds until one is available if empty."""
+        if self.rate <= 0:
+            return None
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        if tokens < 1:
+            self._buckets[key] = (tokens, now)
+            return (1 - tokens) / self.rate
+        self._buckets[key] = (tokens - 1, now)
+        return None
+
+    def _prune(self):
+        """Forget users whose bucket has refilled and who have nothing in flight."""
+        now = time.monotonic()
+        for key, (tokens, updated) in list(self._buckets.items()):
+            full = tokens + (now - updated) * self.rate >= self.burst
+            if full and key not in self._active and key not in self._waiting:
+                del self._buckets[key]
+
+    def _reject(self, reason: str, retry_after: float):
+        ADMISSION_REJECTIONS.inc(endpoint_class=self.name, reason=reason)
+        raise Rejected(reason, max(1, math.ceil(retry_after)))
+
+    def _start(self, key: str):
+        self._active[key] = self._active.get(key, 0) + 1
+        self.running += 1
+        ADMISSION_IN_FLIGHT.set(self.running, endpoint_class=self.name)
+
+    def release(self, key: str):
+        """Free a slot taken by `acquire` and hand it to the next user in turn."""
+        self._active[key] -= 1
+        if self._active[key] == 0:
+            del self._active[key]
+        self.running -= 1
+        ADMISSION_IN_FLIGHT.set(self.running, endpoint_class=self.name)
+        self._dispatch()
+
+    def _dispatch(self):
+        """Admit waiting requests round-robin across users while slots are free."""
+        while self.running < self.total:
+            for key, queue in self._waiting.items():
+                if self._active.get(key, 0) < self.per_user:
+                    break
+            else:
+                return
+            future = queue.popleft()
+            if queue:
+                self._waiting.move_to_end(key)
+            else:
+                del self._waiting[key]
+            if not future.done():
+                self._start(key)
+                future.set_result(None)
+
+    def _withdraw(self, key: str, future: asyncio.Future):
+        queue = self._waiting.get(key)
+        if queue is not None and future in queue:
+            queue.remove(future)
+            if not queue:
+                del self._waiting[key]
+
+    async def acquire(self, key: str):
+        """Wait for a slot for `key`, or raise Rejected."""
+        if len(self._buckets) > MAX_TRACKED_USERS:
+            self._prune()
+        retry_after = self._take_token(key)
+        if retry_after is not None:
+            self._reject("rate", retry_after)
+
+        queue = self._waiting.get(key)
+        if queue is not None and len(queue) >= self.max_queue:
+            self._reject("queue_full", 1)
+        future = asyncio.get_running_loop().create_future()
+        self._waiting.setdefault(key, deque()).append(future)
+        self._dispatch()
+        if future.done():
+            return
+
+        try:
+            with timed("admission_wait"):
+                await asyncio.wait_for(asyncio.shield(future), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._withdraw(key, future)
+            future.cancel()
+            if future.cancelled():
+                self._reject("queue_timeout", self.queue_timeout / 2)
+        except asyncio.CancelledError:
+            # Client went away; give back a slot granted in the meantime
+            self._withdraw(key, future)
+            if not future.cancel():
+                self.release(key)
+            raise
+
+    @asynccontextmanager
+    async def slot(self, key: str):
+        await self.acquire(key)
+        try:
+            yield
+        finally:
+            self.release(key)
+
+
+def _parse(name: str, spec: str) -> AdmissionController:
+    rate, burst, per_user, total = (part.strip() for part in spec.split(","))
+    return AdmissionController(name, float(rate), int(burst), int(per_user), int(total))
+
+
+controllers: dict[str, AdmissionController] = {
+    name: _parse(name, spec) for name, spec in ADMISSION_LIMITS.items()
+} if ADMISSION_ENABLED else {}
+
+
+@asynccontextmanager
+async def admit(endpoint_class: str, key: str):
+    """Hold a slot of an endpoint class for `key` (no-op when admission control is off)."""
+    controller = controllers.get(endpoint_class)
+    if controller is None:
+        yield
+        return
+    async with controller.slot(key):
+        yield
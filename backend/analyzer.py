@@ -0,0 +1,230 @@
+"""Shared InsightFace analyzer factory with tuned ONNX Runtime sessions.
+
+Used by the API and the indexer. Sessions are created here instead of by
+FaceAnalysis so thread counts, graph optimization and the memory arena can
+be configured, optimized graphs are cached on disk, and models that are not
+needed are never loaded.
+"""
+import json
+import platform
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional
+
+from config import (
+    ANALYSIS_MODE, ANALYZER_MODEL, ANALYZER_DET_SIZE, ANALYZER_PROVIDERS, ANALYZER_MODULES,
+    ORT_INTRA_OP_THREADS, ORT_INTER_OP_THREADS, ORT_GRAPH_OPTIMIZATION, ORT_CPU_MEM_ARENA, ORT_CACHE_DIR
+)
+from metrics import timed, ANALYZER_STARTUP_SECONDS
+
+if TYPE_CHECKING:
+    import onnxruntime
+    from insightface.app import FaceAnalysis
+
+_OPTIMIZATION_LEVELS = {
+    "disable": "ORT_DISABLE_ALL",
+    "basic": "ORT_ENABLE_BASIC",
+    "extended": "ORT_ENABLE_EXTENDED",
+    "all": "ORT_ENABLE_ALL",
+}
+ANALYSIS_MODES = ("lean", "full")
+LEAN_MODULES = ["detection", "recognition"]
+# model file -> insightface task name, so excluded models can be skipped
+# without building a session just to identify them
+_MANIFEST = "models.json"
+
+
+def select_providers(requested: list[str] = ANALYZER_PROVIDERS) -> list[str]:
+    """Requested execution providers this onnxruntime build supports, in order."""
+    import onnxruntime
+
+    available = set(onnxruntime.get_available_providers())
+    providers = [p for p in requested if p in available]
+    return providers or ["CPUExecutionProvider"]
+
+
+def session_options() -> "onnxruntime.SessionOptions":
+    import onnxruntime
+
+    options = onnxruntime.SessionOptions()
+    options.intra_op_num_threads = ORT_INTRA_OP_THREADS
+    options.inter_op_num_threads = ORT_INTER_OP_THREADS
+    options.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+    options.enable_cpu_mem_arena = ORT_CPU_MEM_ARENA
+    options.graph_optimization_level = getattr(
+        onnxruntime.GraphOptimizationLevel, _OPTIMIZATION_LEVELS[ORT_GRAPH_OPTIMIZATION]
+    )
+    options.log_severity_level = 3
+    return options
+
+
+def _create_session(onnx_file: Path, providers: list[str]) -> "onnxruntime.InferenceSession":
+    """Build a session, reusing (or writing) the optimized graph on disk."""
+    import onnxruntime
+
+    options = session_options()
+    source = onnx_file
+    # Graphs partitioned for other providers cannot be serialized, and
+    # ORT_ENABLE_ALL output is specific to the machine that produced it
+    cacheable = providers == ["CPUExecutionProvider"] and ORT_GRAPH_OPTIMIZATION != "disable"
+    if cacheable:
+        cached = ORT_CACHE_DIR / (f"{onnx_file.stem}.ort{onnxruntime.__version__}."
+                                  f"{ORT_GRAPH_OPTIMIZATION}.{platform.machine()}.onnx")
+        if cached.exists() and cached.stat().st_mtime >= onnx_file.stat().st_mtime:
+            source = cached
+            options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_DISABLE_ALL
+        else:
+            ORT_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            options.optimized_model_filepath = str(cached)
+
+    try:
+        return onnxruntime.InferenceSession(str(source), sess_options=options, providers=providers)
+    except Exception:
+        if not cacheable:
+            raise
+        # A stale or unwritable cache must not prevent startup
+        return onnxruntime.InferenceSession(str(onnx_file), sess_options=session_options(), providers=providers)
+
+
+def _route(onnx_file: Path, session):
+    """Wrap a session in the insightface model class for its task (as ModelRouter does)."""
+    from insightface.model_zoo import RetinaFace, Landmark, Attribute, ArcFaceONNX
+
+    # The classes read preprocessing hints from the original graph, never
+    # from the optimized copy
+    model_file = str(onnx_file)
+    input_shape = session.get_inputs()[0].shape
+    if len(session.get_outputs()) >= 5:
+        return RetinaFace(model_file=model_file, session=session)
+    if input_shape[2] == 192 and input_shape[3] == 192:
+        return Landmark(model_file=model_file, session=session)
+    if input_shape[2] == 96 and input_shape[3] == 96:
+        return Attribute(model_file=model_file, session=session)
+    if input_shape[2] == input_shape[3] and input_shape[2] >= 112 and input_shape[2] % 16 == 0:
+        return ArcFaceONNX(model_file=model_file, session=session)
+    return None
+
+
+def _load_manifest() -> dict:
+    try:
+        return json.loads((ORT_CACHE_DIR / _MANIFEST).read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_manifest(manifest: dict):
+    try:
+        ORT_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        (ORT_CACHE_DIR / _MANIFEST).write_text(json.dumps(manifest, indent=2))
+    except OSError:
+        pass
+
+
+class FaceAnalyzer:
+    """Face detection and embedding on top of a prepared FaceAnalysis.
+
+    In "lean" mode only the detector and ArcFace run, and all faces of an
+    image are embedded in one batched inference; "full" mode runs every
+    loaded model per face like FaceAnalysis.get.
+    """
+
+    def __init__(self, app: "FaceAnalysis", mode: str):
+        self.app = app
+        self.mode = mode
+        self.recognition = app.models.get("recognition")
+
+    def get(self, img):
+        """Detect faces in a BGR image; each face has bbox, kps, det_score and embedding."""
+        from insightface.app.common import Face
+
+        with timed("detect"):
+            bboxes, kpss = self.app.det_model.detect(img, max_num=0, metric="default")
+        if bboxes.shape[0] == 0:
+            return []
+        faces = [Face(bbox=bboxes[i, 0:4], kps=kpss[i] if kpss is not None else None, det_score=bboxes[i, 4])
+                 for i in range(bboxes.shape[0])]
+
+        with timed("recognize"):
+            if self.mode == "lean":
+                self._embed(img, faces)
+            else:
+                for face in faces:
+                    for taskname, model in self.app.models.items():
+                        if taskname != "detection":
+                            model.get(img, face)
+        return faces
+
+    def _embed(self, img, faces: list):
+        """Embed all faces with a single recognition batch."""
+        from insightface.utils import face_align
+
+        size = self.recognition.input_size[0]
+        crops = [face_align.norm_crop(img, landmark=face.kps, image_size=size) for face in faces]
+        embeddings = self.recognition.get_feat(crops)
+        for face, embedding in zip(faces, embeddings):
+            face.embedding = embedding
+
+
+def create_face_analyzer(mode: str = ANALYSIS_MODE) -> FaceAnalyzer:
+    """Load the models an analysis mode needs and wrap them in a FaceAnalyzer."""
+    if mode not in ANALYSIS_MODES:
+        raise ValueError(f"Unknown analysis mode '{mode}' (expected one of {', '.join(ANALYSIS_MODES)})")
+    app = load_face_analysis(LEAN_MODULES if mode == "lean" else None)
+    if "recognition" not in app.models:
+        raise RuntimeError("No recognition model loaded")
+    print(f"  Analysis mode: {mode}")
+    return FaceAnalyzer(app, mode)
+
+
+def load_face_analysis(modules: Optional[list[str]] = None) -> "FaceAnalysis":
+    """Load the InsightFace model pack with tuned sessions and prepare it.
+
+    `modules` lists the tasks to load (detection is always included);
+    defaults to ANALYZER_MODULES, where empty means every model in the pack.
+    """
+    started = time.perf_counter()
+    import onnxruntime
+    from insightface.app import FaceAnalysis
+    from insightface.utils import ensure_available
+
+    onnxruntime.set_default_logger_severity(3)
+    modules = set(modules if modules is not None else ANALYZER_MODULES)
+    providers = select_providers()
+    print(f"Loading InsightFace {ANALYZER_MODEL} model...")
+
+    model_dir = Path(ensure_available("models", ANALYZER_MODEL, root="~/.insightface"))
+    manifest = _load_manifest()
+
+    def wanted(task: str) -> bool:
+        return not modules or task == "detection" or task in modules
+
+    models = {}
+    for onnx_file in sorted(model_dir.glob("*.onnx")):
+        key = f"{ANALYZER_MODEL}/{onnx_file.name}"
+        if key in manifest and not wanted(manifest[key]):
+            continue
+        model = _route(onnx_file, _create_session(onnx_file, providers))
+        if model is None:
+            continue
+        manifest[key] = model.taskname
+        if wanted(model.taskname) and model.taskname not in models:
+            models[model.taskname] = model
+    _save_manifest(manifest)
+
+    if "detection" not in models:
+        raise RuntimeError(f"No detection model found in {model_dir}")
+
+    # FaceAnalysis.__init__ would build a default session for every model in
+    # the pack; assemble the instance from the sessions built above instead
+    app = FaceAnalysis.__new__(FaceAnalysis)
+    app.model_dir = str(model_dir)
+    app.models = models
+    app.det_model = models["detection"]
+    app.prepare(ctx_id=0, det_size=(ANALYZER_DET_SIZE, ANALYZER_DET_SIZE))
+
+    elapsed = time.perf_counter() - started
+    ANALYZER_STARTUP_SECONDS.set(elapsed)
+    threads = ORT_INTRA_OP_THREADS or "auto"
+    print(f"✓ Face analyzer ready in {elapsed:.1f}s "
+          f"({', '.join(models)} on {providers[0]}, {threads} intra-op threads)")
+    return app
@@ -1,11 +1,19 @@
 """Microsoft OAuth authentication for YEP Photo Finder."""
+import hashlib
+import os
 import secrets
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from typing import Optional
-import msal
-from jose import jwt
+from jose import jwt, JWTError
 
-from config import MS_CLIENT_ID, MS_TENANT_ID, MS_CLIENT_SECRET, ALLOWED_DOMAIN
+from config import (
+    MS_CLIENT_ID, MS_TENANT_ID, MS_CLIENT_SECRET, ALLOWED_DOMAIN,
+    JWT_SECRET, JWT_SECRET_FILE, SESSION_CACHE_SIZE, AUTH_STATE_TTL
+)
+from metrics import record_cache
 
 # Microsoft OAuth Config
 MS_AUTHORITY = f"https://login.microsoftonline.com/{MS_TENANT_ID}"
@@ -13,16 +21,85 @@ MS_SCOPE = ["User.Read"]
 REDIRECT_PATH = "/auth/callback"
 
 # JWT Config
-JWT_SECRET = secrets.token_hex(32)
 JWT_ALGORITHM = "HS256"
 JWT_EXPIRE_HOURS = 24
-
-# Session store (in-memory for simplicity)
-auth_states = {}  # state -> redirect_url
+KEY_FILE_CHECK_SECONDS = 30
+
+# Signing keys as (kid, secret), current key first
+_keys: list[tuple[str, str]] = []
+_keys_checked_at = 0.0
+_keys_mtime: Optional[float] = None
+_keys_lock = threading.Lock()
+
+# Verified session tokens: token -> claims (require_auth runs in a threadpool)
+_verified: OrderedDict[str, dict] = OrderedDict()
+_verified_lock = threading.Lock()
+
+
+def _key_id(secret: str) -> str:
+    return hashlib.blake2b(secret.encode(), digest_size=4).hexdigest()
+
+
+def _read_key_file() -> list[str]:
+    """Keys in the key file, creating it with a fresh key if missing."""
+    if not JWT_SECRET_FILE.exists():
+        # Several workers may start at once: each writes a complete file under a
+        # temp name and hard-links it into place, which fails for all but the
+        # first, so nobody reads a created-but-unwritten key file
+        tmp = JWT_SECRET_FILE.with_name(f".{JWT_SECRET_FILE.name}.{os.getpid()}.tmp")
+        try:
+            fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w") as f:
+                f.write(secrets.token_hex(32) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.link(tmp, JWT_SECRET_FILE)
+        except FileExistsError:
+            pass
+        finally:
+            tmp.unlink(missing_ok=True)
+    lines = JWT_SECRET_FILE.read_text().splitlines()
+    return [line.strip() for line in lines if line.strip() and not line.startswith("#")]
+
+
+def signing_keys() -> list[tuple[str, str]]:
+    """Session keys as (kid, secret), the signing key first.
+
+    Keys come from JWT_SECRET or the shared key file, which is re-read at
+    most every KEY_FILE_CHECK_SECONDS when it changes.
+    """
+    global _keys, _keys_checked_at, _keys_mtime
+    now = time.monotonic()
+    if _keys and (JWT_SECRET or now - _keys_checked_at < KEY_FILE_CHECK_SECONDS):
+        return _keys
+
+    with _keys_lock:
+        if JWT_SECRET:
+            secrets_list = [k.strip() for k in JWT_SECRET.split(",") if k.strip()]
+        else:
+            mtime = JWT_SECRET_FILE.stat().st_mtime if JWT_SECRET_FILE.exists() else None
+            _keys_checked_at = now
+            if _keys and mtime == _keys_mtime:
+                return _keys
+            JWT_SECRET_FILE.parent.mkdir(parents=True, exist_ok=True)
+            secrets_list = _read_key_file()
+            _keys_mtime = JWT_SECRET_FILE.stat().st_mtime
+        if not secrets_list:
+            raise RuntimeError(f"No session signing key in JWT_SECRET or {JWT_SECRET_FILE}")
+        if _keys:
+            # Keys may have been revoked; re-verify cached sessions
+            print(f"Session signing keys reloaded ({len(secrets_list)} active)")
+            with _verified_lock:
+                _verified.clear()
+        _keys = [(_key_id(k), k) for k in secrets_list]
+        return _keys
 
 
 def get_msal_app(redirect_uri: str):
     """Create MSAL app instance."""
+    # Imported lazily: msal is only needed when auth is enabled
+    import msal
+
     return msal.ConfidentialClientApplication(
         MS_CLIENT_ID,
         authority=MS_AUTHORITY,
@@ -33,8 +110,7 @@ def get_msal_app(redirect_uri: str):
 def get_auth_url(redirect_uri: str, final_redirect: str = "/") -> tuple[str, str]:
     """Generate Microsoft OAuth URL."""
     app = get_msal_app(redirect_uri)
-    state = secrets.token_urlsafe(16)
-    auth_states[state] = final_redirect
+    state = create_state(final_redirect)
 
     auth_url = app.get_authorization_request_url(
         MS_SCOPE,
@@ -73,6 +149,27 @@ def validate_domain(email: str) -> bool:
     return domain == ALLOWED_DOMAIN
 
 
+def _encode(claims: dict) -> str:
+    kid, secret = signing_keys()[0]
+    return jwt.encode(claims, secret, algorithm=JWT_ALGORITHM, headers={"kid": kid})
+
+
+def _decode(token: str) -> Optional[dict]:
+    """Verify a token against the key named by its kid (or any active key)."""
+    keys = signing_keys()
+    try:
+        kid = jwt.get_unverified_header(token).get("kid")
+    except JWTError:
+        return None
+    candidates = [secret for key_id, secret in keys if key_id == kid] or [secret for _, secret in keys]
+    for secret in candidates:
+        try:
+            return jwt.decode(token, secret, algorithms=[JWT_ALGORITHM])
+        except JWTError:
+            continue
+    return None
+
+
 def create_session_token(user_info: dict) -> str:
     """Create JWT session token."""
     payload = {
@@ -80,18 +177,55 @@ def create_session_token(user_info: dict) -> str:
         "name": user_info["name"],
         "exp": datetime.utcnow() + timedelta(hours=JWT_EXPIRE_HOURS),
     }
-    return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
+    return _encode(payload)
 
 
 def verify_session_token(token: str) -> Optional[dict]:
-    """Verify and decode JWT session token."""
-    try:
-        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+    """Verify and decode JWT session token.
+
+    Verified tokens are kept in a bounded LRU until they expire, so repeat
+    requests skip signature checks.
+    """
+    signing_keys()  # picks up key rotation, which clears the cache
+    with _verified_lock:
+        payload = _verified.get(token)
+        if payload is not None:
+            if payload["exp"] > time.time():
+                _verified.move_to_end(token)
+            else:
+                del _verified[token]
+                payload = None
+    record_cache("session", payload is not None)
+    if payload is not None:
         return payload
-    except Exception:
+
+    payload = _decode(token)
+    if payload is None or payload.get("purpose") == "oauth_state":
         return None
+    with _verified_lock:
+        _verified[token] = payload
+        while len(_verified) > SESSION_CACHE_SIZE:
+            _verified.popitem(last=False)
+    return payload
+
+
+def create_state(final_redirect: str) -> str:
+    """OAuth state carrying the post-login redirect.
+
+    Signed and short-lived instead of kept in process memory, so the
+    callback can be handled by any worker.
+    """
+    return _encode({
+        "purpose": "oauth_state",
+        "redirect": final_redirect,
+        "nonce": secrets.token_urlsafe(8),
+        "exp": datetime.utcnow() + timedelta(seconds=AUTH_STATE_TTL),
+    })
 
 
 def get_state_redirect(state: str) -> str:
-    """Get and remove redirect URL for state."""
-    return auth_states.pop(state, "/")
+    """Get the redirect URL carried by a state, or "/" if it is invalid or expired."""
+    claims = _decode(state)
+    if not claims or claims.get("purpose") != "oauth_state":
+        return "/"
+    return claims.get("redirect") or "/"
@@ -0,0 +1,75 @@
+"""Request body size limit enforced while the body is received.
+
+FastAPI parses multipart forms (spooling uploads to disk) before any
+dependency or handler runs, so a limit checked there only rejects a request
+after the whole body has arrived. This middleware counts body bytes as the
+app receives them, rejects declared oversize bodies up front, and answers
+413 as soon as a body (chunked or not) crosses the limit.
+"""
+import json
+
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+class BodyTooLarge(Exception):
+    """Raised from `receive` once a request body exceeds the limit."""
+
+
+class BodySizeLimit:
+    """ASGI middleware answering 413 for request bodies over `max_bytes`."""
+
+    def __init__(self, app: ASGIApp, max_bytes: int):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        declared = Headers(scope=scope).get("content-length")
+        if declared and declared.isdigit() and int(declared) > self.max_bytes:
+            await self._reject(send)
+            return
+
+        received = 0
+        exceeded = False
+        started = False
+
+        async def limited_receive() -> Message:
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    exceeded = True
+                    raise BodyTooLarge()
+            return message
+
+        async def guarded_send(message: Message):
+            nonlocal started
+            # Whatever the app makes of the cut-off body (e.g. a 400 parse error) is replaced by the 413
+            if exceeded:
+                return
+            if message["type"] == "http.response.start":
+                started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            if not exceeded:
+                raise
+        if exceeded and not started:
+            await self._reject(send)
+
+    async def _reject(self, send: Send):
+        body = json.dumps({"detail": f"Request body exceeds {self.max_bytes // (1024 * 1024)}MB"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()),
+                        (b"connection", b"close")],
+        })
+        await send({"type": "http.response.body", "body": body})
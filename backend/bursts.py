@@ -0,0 +1,82 @@
+"""Near-duplicate burst detection for the indexer.
+
+Consecutive photos (in filename order, i.e. shooting order) form a burst when
+their perceptual hashes are close and they show the same set of faces. The
+first frame is the burst's representative; `photos.burst_id` of every frame
+points at it, and frames outside any burst keep a NULL burst_id.
+"""
+from typing import Optional
+
+import cv2
+import numpy as np
+
+from config import BURST_HASH_DISTANCE, BURST_FACE_SIMILARITY
+
+
+def dhash(img: np.ndarray) -> int:
+    """64-bit difference hash of a BGR image, as a signed int for SQLite."""
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    value = int(np.packbits(bits).view(">u8")[0])
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def hamming(a: int, b: int) -> int:
+    return ((a ^ b) & 0xFFFFFFFFFFFFFFFF).bit_count()
+
+
+def same_faces(a: list[np.ndarray], b: list[np.ndarray], threshold: float = BURST_FACE_SIMILARITY) -> bool:
+    """Whether two frames show the same people: equal face count and a
+    one-to-one pairing of faces above the similarity threshold."""
+    if len(a) != len(b):
+        return False
+    if not a:
+        return True
+    ea = np.vstack(a)
+    eb = np.vstack(b)
+    ea = ea / (np.linalg.norm(ea, axis=1, keepdims=True) + 1e-10)
+    eb = eb / (np.linalg.norm(eb, axis=1, keepdims=True) + 1e-10)
+    sims = ea @ eb.T
+    # Greedy pairing, best pairs first; bursts rarely hold more than a few faces
+    used_a, used_b = set(), set()
+    for flat in np.argsort(sims, axis=None)[::-1]:
+        i, j = divmod(int(flat), sims.shape[1])
+        if i in used_a or j in used_b:
+            continue
+        if sims[i, j] < threshold:
+            return False
+        used_a.add(i)
+        used_b.add(j)
+    return True
+
+
+class BurstTracker:
+    """Follows the current burst while photos are indexed in order."""
+
+    def __init__(self, max_distance: int = BURST_HASH_DISTANCE):
+        self.max_distance = max_distance
+        self.representative: Optional[int] = None
+        self.size = 0
+        self._phash = 0
+        self._faces: list[np.ndarray] = []
+
+    def match(self, phash: int, faces: list[np.ndarray]) -> Optional[int]:
+        """Representative photo id if this frame continues the current burst."""
+        if self.representative is None:
+            return None
+        if hamming(phash, self._phash) > self.max_distance or not same_faces(self._faces, faces):
+            return None
+        return self.representative
+
+    def start(self, photo_id: int, phash: int, faces: list[np.ndarray]):
+        """Make a photo the representative of a new (so far single-frame) burst."""
+        self.representative = photo_id
+        self.size = 1
+        self._phash = phash
+        self._faces = faces
+
+    def reset(self):
+        """Break the chain, e.g. at a skipped or unreadable photo."""
+        self.representative = None
+        self.size = 0
@@ -0,0 +1,158 @@
+"""Offline identity clustering of face embeddings (Chinese whispers)."""
+import numpy as np
+
+# Memory budget for one block of the pairwise similarity matrix
+BLOCK_BUDGET_BYTES = 256 * 1024 * 1024
+
+
+def _normalize(embeddings: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return (embeddings / (norms + 1e-10)).astype(np.float32)
+
+
+def build_neighbor_graph(embeddings: np.ndarray, threshold: float,
+                         k: int = 20) -> tuple[np.ndarray, np.ndarray]:
+    """Compute the k nearest neighbours of every face above a similarity threshold.
+
+    Args:
+        embeddings: L2-normalized embeddings, shape (N, 512)
+        threshold: Minimum cosine similarity for an edge
+        k: Maximum neighbours kept per face
+
+    Returns:
+        Tuple of (neighbors, weights), both shape (N, k). Missing edges have
+        neighbor index -1 and weight 0.
+    """
+    n = len(embeddings)
+    k = max(1, min(k, n - 1)) if n > 1 else 1
+    neighbors = np.full((n, k), -1, dtype=np.int64)
+    weights = np.zeros((n, k), dtype=np.float32)
+    if n < 2:
+        return neighbors, weights
+
+    # Bound the temporary (block, N) similarity matrix regardless of corpus size
+    block = max(1, BLOCK_BUDGET_BYTES // (n * 4))
+    for start in range(0, n, block):
+        stop = min(n, start + block)
+        sims = embeddings[start:stop] @ embeddings.T
+        rows = np.arange(stop - start)
+        sims[rows, rows + start] = -1.0  # no self edges
+
+        top = np.argpartition(sims, -k, axis=1)[:, -k:]
+        top_sims = np.take_along_axis(sims, top, axis=1)
+        keep = top_sims >= threshold
+        neighbors[start:stop] = np.where(keep, top, -1)
+        weights[start:stop] = np.where(keep, top_sims, 0.0)
+
+    return neighbors, weights
+
+
+def chinese_whispers(neighbors: np.ndarray, weights: np.ndarray,
+                     iterations: int = 20, seed: int = 0) -> np.ndarray:
+    """Label propagation over a weighted kNN graph.
+
+    Each round, a random half of the nodes adopts the label with the largest
+    summed edge weight among its neighbours. Updating only part of the graph
+    per round avoids the oscillation of fully synchronous propagation while
+    keeping every round vectorized.
+
+    Returns:
+        Array of cluster labels (not compacted), shape (N,)
+    """
+    n = len(neighbors)
+    labels = np.arange(n, dtype=np.int64)
+    rows, cols = np.nonzero(neighbors >= 0)
+    if len(rows) == 0:
+        return labels
+
+    targets = neighbors[rows, cols]
+    edge_weights = weights[rows, cols].astype(np.float64)
+    rng = np.random.default_rng(seed)
+
+    for _ in range(iterations):
+        # Sum edge weights per (node, neighbour label) pair
+        keys = rows * n + labels[targets]
+        uniq, inverse = np.unique(keys, return_inverse=True)
+        totals = np.bincount(inverse, weights=edge_weights)
+        nodes = uniq // n
+        candidates = uniq % n
+
+        # Winning label per node: sort by node, then by descending weight
+        order = np.lexsort((-totals, nodes))
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = nodes[order][1:] != nodes[order][:-1]
+        winners = order[first]
+
+        update = rng.random(len(winners)) < 0.5
+        labels = labels.copy()
+        labels[nodes[winners[update]]] = candidates[winners[update]]
+
+    return labels
+
+
+def cluster_embeddings(embeddings: np.ndarray, threshold: float = 0.5, k: int = 20,
+                       iterations: int = 20) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Group faces into identities.
+
+    Args:
+        embeddings: Raw face embeddings, shape (N, 512)
+        threshold: Minimum similarity for two faces to be linked
+        k: Neighbours considered per face
+        iterations: Chinese whispers rounds
+
+    Returns:
+        Tuple of (labels, centroids, representatives): compact cluster label
+        per face (N,), L2-normalized centroid per cluster (C, 512) and the
+        row index of the face closest to each centroid (C,).
+    """
+    if len(embeddings) == 0:
+        return (np.zeros(0, dtype=np.int64), np.zeros((0, 512), dtype=np.float32),
+                np.zeros(0, dtype=np.int64))
+
+    normalized = _normalize(embeddings)
+    neighbors, weights = build_neighbor_graph(normalized, threshold, k)
+    raw_labels = chinese_whispers(neighbors, weights, iterations)
+    _, labels = np.unique(raw_labels, return_inverse=True)
+    n_clusters = int(labels.max()) + 1
+
+    sums = np.zeros((n_clusters, normalized.shape[1]), dtype=np.float64)
+    np.add.at(sums, labels, normalized)
+    centroids = _normalize(sums)
+
+    # Representative = member most similar to its own centroid
+    member_sims = np.einsum('ij,ij->i', normalized, centroids[labels])
+    order = np.lexsort((-member_sims, labels))
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = labels[order][1:] != labels[order][:-1]
+    representatives = order[first]
+
+    return labels, centroids, representatives
+
+
+def assign_to_clusters(embeddings: np.ndarray, centroids: np.ndarray, sizes: np.ndarray,
+                       threshold: float = 0.5, block: int = 4096) -> tuple[np.ndarray, np.ndarray]:
+    """Attach new faces to their most similar existing cluster.
+
+    Linear in the number of new faces: each is compared with the centroids
+    only, never with other faces.
+
+    Returns:
+        Tuple of (labels, centroids): cluster row per face (-1 when no
+        centroid reaches the threshold) and the centroids moved toward their
+        new members (a cluster's member sum is approximated by centroid * size).
+    """
+    labels = np.full(len(embeddings), -1, dtype=np.int64)
+    if len(embeddings) == 0 or len(centroids) == 0:
+        return labels, centroids
+
+    normalized = _normalize(embeddings)
+    for start in range(0, len(normalized), block):
+        sims = normalized[start:start + block] @ centroids.T
+        best = sims.argmax(axis=1)
+        best[sims[np.arange(len(best)), best] < threshold] = -1
+        labels[start:start + block] = best
+
+    assigned = labels >= 0
+    sums = centroids.astype(np.float64) * sizes[:, None]
+    np.add.at(sums, labels[assigned], normalized[assigned])
+    return labels, _normalize(sums).astype(np.float32)
@@ -10,21 +10,143 @@ load_dotenv()
 PROJECT_ROOT = Path(__file__).parent.parent
 DATA_DIR = PROJECT_ROOT / "data"
 PHOTOS_DIR = DATA_DIR / "photos"
-DB_PATH = DATA_DIR / "database.db"
+DB_PATH = Path(os.getenv("DB_PATH", DATA_DIR / "database.db"))
+
+# Collections (one per event); photos indexed without a collection land here
+DEFAULT_COLLECTION = "default"
+
+# Budget for embedding partitions kept in memory; least recently used
+# collections are evicted beyond it
+EMBEDDING_CACHE_MB = int(os.getenv("EMBEDDING_CACHE_MB", "2048"))
 
 # Face matching defaults
 DEFAULT_THRESHOLD = 0.5
 DEFAULT_LIMIT = 50
+MAX_SEARCH_LIMIT = int(os.getenv("MAX_SEARCH_LIMIT", "1000"))
+# Full scans score the embedding matrix in blocks of this many rows, so the
+# temporaries per query stay bounded; blocks run on a shared thread pool
+# (BLAS releases the GIL). Set SEARCH_THREADS=1 when BLAS is multithreaded.
+SEARCH_CHUNK_ROWS = int(os.getenv("SEARCH_CHUNK_ROWS", "16384"))
+SEARCH_THREADS = int(os.getenv("SEARCH_THREADS", str(min(4, os.cpu_count() or 1))))
+
+# Identity clustering (offline, run by the indexer)
+CLUSTER_THRESHOLD = 0.5  # min similarity to link two faces
+CLUSTER_NEIGHBORS = 20  # kNN edges per face
+CLUSTER_ITERATIONS = 20
+# Clusters whose centroid is within this margin below the search threshold
+# are expanded, since members can match a query better than their centroid
+CLUSTER_SEARCH_MARGIN = 0.15
+
+# Burst collapsing (indexer): consecutive photos whose 64-bit dHashes differ in
+# at most this many bits and whose faces all pair up above the similarity
+# form one burst
+BURST_HASH_DISTANCE = int(os.getenv("BURST_HASH_DISTANCE", "10"))
+BURST_FACE_SIMILARITY = float(os.getenv("BURST_FACE_SIMILARITY", "0.7"))
+
+# Indexer journal: photos are committed (and the run's progress recorded) every
+# INDEX_BATCH_SIZE photos, so a killed run loses at most one batch. Photos that
+# failed this many times are skipped until retried with --retry-failures.
+INDEX_BATCH_SIZE = int(os.getenv("INDEX_BATCH_SIZE", "100"))
+INDEX_MAX_ATTEMPTS = int(os.getenv("INDEX_MAX_ATTEMPTS", "3"))
 
 # Server settings
 HOST = "0.0.0.0"
 PORT = 8000
 
+# Load the InsightFace model in this process. Disable for processes that only
+# serve search and photos, which then never import insightface/onnxruntime.
+FACE_DETECTION_ENABLED = os.getenv("FACE_DETECTION_ENABLED", "1") != "0"
+
+# Face analysis: InsightFace model pack run on ONNX Runtime (see analyzer.py)
+ANALYZER_MODEL = os.getenv("ANALYZER_MODEL", "buffalo_l")
+ANALYZER_DET_SIZE = int(os.getenv("ANALYZER_DET_SIZE", "640"))
+# Execution providers in order of preference; ones this onnxruntime build
+# lacks are skipped
+ANALYZER_PROVIDERS = [p.strip() for p in os.getenv(
+    "ANALYZER_PROVIDERS", "CoreMLExecutionProvider,CPUExecutionProvider").split(",") if p.strip()]
+# "lean" runs only detection and batched ArcFace recognition (all the app
+# uses); "full" also runs the landmark and gender/age heads per face
+ANALYSIS_MODE = os.getenv("ANALYSIS_MODE", "lean")
+# Models of the pack to load in full mode, e.g. "detection,recognition" (empty = all)
+ANALYZER_MODULES = [m.strip() for m in os.getenv("ANALYZER_MODULES", "").split(",") if m.strip()]
+# Threads per inference session (0 = ONNX Runtime default, one per core);
+# lower these when several workers or indexer processes share a machine
+ORT_INTRA_OP_THREADS = int(os.getenv("ORT_INTRA_OP_THREADS", "0"))
+ORT_INTER_OP_THREADS = int(os.getenv("ORT_INTER_OP_THREADS", "1"))
+ORT_GRAPH_OPTIMIZATION = os.getenv("ORT_GRAPH_OPTIMIZATION", "all")  # disable, basic, extended, all
+ORT_CPU_MEM_ARENA = os.getenv("ORT_CPU_MEM_ARENA", "1") != "0"
+# Optimized graphs are saved here and reused on the next start (CPU only)
+ORT_CACHE_DIR = Path(os.getenv("ORT_CACHE_DIR", DATA_DIR / "onnx_cache"))
+
+# Sharding: each node loads the faces of photos with photo_id % SHARD_COUNT ==
+# SHARD_INDEX (-1 loads none, for a pure coordinator). A node with SHARD_NODES
+# set answers /api/search by querying every listed node's shard endpoint.
+# Sharded nodes expose /internal/shard-search and refuse to start without a
+# SHARD_TOKEN.
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "1"))
+SHARD_INDEX = int(os.getenv("SHARD_INDEX", "0"))
+SHARD_NODES = [n.strip().rstrip("/") for n in os.getenv("SHARD_NODES", "").split(",") if n.strip()]
+SHARD_TOKEN = os.getenv("SHARD_TOKEN", "")  # shared secret for /internal/shard-search
+SHARD_TIMEOUT = float(os.getenv("SHARD_TIMEOUT", "10"))
+SHARDED = SHARD_COUNT > 1 or bool(SHARD_NODES)
+
 # Temp face TTL (seconds)
 TEMP_FACE_TTL = 1800  # 30 minutes
 
+# Thumbnails: rendered on a bounded thread pool and cached in memory
+THUMBNAIL_WORKERS = int(os.getenv("THUMBNAIL_WORKERS", str(min(8, os.cpu_count() or 4))))
+THUMBNAIL_CACHE_MB = int(os.getenv("THUMBNAIL_CACHE_MB", "128"))
+MAX_THUMBNAIL_SIZE = 1024
+# Formats offered to clients whose Accept header allows them, in order of
+# preference (JPEG is always the fallback)
+THUMBNAIL_FORMATS = [f.strip() for f in os.getenv("THUMBNAIL_FORMATS", "avif,webp").split(",") if f.strip()]
+# Detected-face crops served by URL instead of inline base64
+FACE_CROP_CACHE_MB = int(os.getenv("FACE_CROP_CACHE_MB", "32"))
+# Contact sheets (one sprite per search result page)
+CONTACT_SHEET_CACHE_MB = int(os.getenv("CONTACT_SHEET_CACHE_MB", "64"))
+MAX_CONTACT_SHEET_PHOTOS = 100
+MAX_CONTACT_SHEET_TILE = 400
+MAX_FACE_BOX_PHOTOS = 500  # photos per /api/faces/boxes request
+
+# Original photo downloads: photo_id -> path/size/ETag entries kept in memory
+PHOTO_CACHE_ENTRIES = int(os.getenv("PHOTO_CACHE_ENTRIES", "100000"))
+
+# Threads running SQLite queries for request handlers (one pooled read
+# connection each)
+DB_WORKERS = int(os.getenv("DB_WORKERS", "4"))
+DB_MMAP_SIZE = 256 * 1024 * 1024  # bytes of the DB file memory-mapped per connection
+DB_CACHE_KB = 64 * 1024  # page cache per connection
+DB_STATEMENT_CACHE = 256  # prepared statements kept per connection
+
+# ZIP downloads: archives are built by a small worker pool and cached on
+# disk per photo selection
+ZIP_CACHE_DIR = Path(os.getenv("ZIP_CACHE_DIR", DATA_DIR / "zip_cache"))
+ZIP_WORKERS = int(os.getenv("ZIP_WORKERS", "2"))
+ZIP_CACHE_TTL = int(os.getenv("ZIP_CACHE_TTL", str(6 * 3600)))  # seconds
+ZIP_CACHE_MB = int(os.getenv("ZIP_CACHE_MB", "4096"))
+MAX_DOWNLOAD_PHOTOS = int(os.getenv("MAX_DOWNLOAD_PHOTOS", "2000"))
+
+# Admission control per endpoint class as "rate,burst,per_user,total": token
+# bucket refill per second and size per user (rate 0 = unlimited), requests in
+# flight per user, and in flight across all users (waiting users take turns)
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "1") != "0"
+ADMISSION_LIMITS = {
+    name: os.getenv(f"ADMISSION_{name.upper()}", default)
+    for name, default in (("detect", "0.5,10,2,4"), ("search", "5,30,4,16"), ("download", "0.2,5,1,4"))
+}
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "4"))  # waiting requests per user and class
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "15"))  # seconds
+
 # Max upload size (bytes)
 MAX_UPLOAD_SIZE = 15 * 1024 * 1024  # 15MB
+# Any request body, enforced while it is received: an upload plus multipart framing
+MAX_REQUEST_SIZE = MAX_UPLOAD_SIZE + 64 * 1024
+# Uploads are decoded at most this large on the long edge (the detector runs
+# at 640px; the margin keeps enough pixels for recognition crops)
+DETECT_MAX_SIDE = int(os.getenv("DETECT_MAX_SIDE", "1280"))
+# The preset group photo keeps far more: its faces are small, and each one's
+# recognition crop is cut from the decoded image, not the detector input
+PRESET_DETECT_MAX_SIDE = int(os.getenv("PRESET_DETECT_MAX_SIDE", "4096"))
 
 # Microsoft OAuth Config (load from environment)
 MS_CLIENT_ID = os.getenv("MS_CLIENT_ID", "")
@@ -34,3 +156,12 @@ ALLOWED_DOMAIN = os.getenv("ALLOWED_DOMAIN", "finos.asia")
 
 # Auth is enabled only if all MS credentials are set
 AUTH_ENABLED = bool(MS_CLIENT_ID and MS_TENANT_ID and MS_CLIENT_SECRET)
+
+# Session signing keys, shared by all workers: JWT_SECRET (comma-separated,
+# the first one signs) or else the key file, one key per line, created on
+# first start. To rotate, add a new first line; older lines keep verifying
+# existing sessions until removed. Workers re-read the file on change.
+JWT_SECRET = os.getenv("JWT_SECRET", "")
+JWT_SECRET_FILE = Path(os.getenv("JWT_SECRET_FILE", DATA_DIR / "jwt_secret"))
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "4096"))  # verified session tokens kept
+AUTH_STATE_TTL = 600  # seconds to complete the Microsoft login
@@ -0,0 +1,99 @@
+"""Contact sheets: one sprite image holding the thumbnails of a result page.
+
+Tiles are square, center-cropped thumbnails (as the gallery shows them)
+laid out row by row, so the offset of every photo follows from its position
+in the list and the sheet can be re-rendered by any worker from its URL.
+Sheets are composed from the thumbnail cache and cached per result set.
+"""
+import asyncio
+import hashlib
+from io import BytesIO
+from typing import Optional
+
+from PIL import Image, ImageOps
+
+from config import CONTACT_SHEET_CACHE_MB, MAX_THUMBNAIL_SIZE
+from metrics import timed, record_cache
+from thumbnails import ByteLRU, get_thumbnail, encode_image, run_in_pool
+
+# Source thumbnails are fit into this multiple of the tile on the long edge,
+# enough to cover a square tile from a 3:2 photo without upscaling
+SOURCE_SCALE = 1.5
+BACKGROUND = (24, 24, 27)
+
+_cache = ByteLRU(CONTACT_SHEET_CACHE_MB * 1024 * 1024)
+_inflight: dict[tuple, asyncio.Future] = {}
+
+
+def sheet_key(photo_ids: list[int], tile: int, columns: int) -> str:
+    """Cache key of a sheet; order matters since it determines the layout."""
+    spec = f"{','.join(str(pid) for pid in photo_ids)}|{tile}|{columns}"
+    return hashlib.sha256(spec.encode()).hexdigest()[:32]
+
+
+def layout(photo_ids: list[int], tile: int, columns: int) -> tuple[int, int, list[dict]]:
+    """Sheet width, height and the pixel box of every photo's tile."""
+    columns = max(1, min(columns, len(photo_ids)))
+    rows = -(-len(photo_ids) // columns)
+    tiles = [
+        {"photo_id": pid, "x": (i % columns) * tile, "y": (i // columns) * tile, "w": tile, "h": tile}
+        for i, pid in enumerate(photo_ids)
+    ]
+    return columns * tile, rows * tile, tiles
+
+
+def compose(sources: list[Optional[bytes]], tile: int, columns: int, fmt: str) -> bytes:
+    """Paste thumbnails into a sheet and encode it (blocking).
+
+    Photos whose thumbnail could not be rendered leave an empty tile.
+    """
+    width, height, tiles = layout(list(range(len(sources))), tile, columns)
+    with timed("contact_sheet_compose"):
+        sheet = Image.new("RGB", (width, height), BACKGROUND)
+        for source, box in zip(sources, tiles):
+            if source is None:
+                continue
+            img = Image.open(BytesIO(source))
+            if img.mode != "RGB":
+                img = img.convert("RGB")
+            sheet.paste(ImageOps.fit(img, (tile, tile)), (box["x"], box["y"]))
+
+    with timed("thumbnail_encode"):
+        return encode_image(sheet, fmt)
+
+
+async def _build(photos: list[dict], tile: int, columns: int, fmt: str) -> bytes:
+    size = min(MAX_THUMBNAIL_SIZE, int(tile * SOURCE_SCALE))
+    # JPEG sources decode fastest; the sheet itself is encoded in `fmt`
+    sources = await asyncio.gather(*(
+        get_thumbnail(p["photo_id"], p["path"], size, "jpeg") for p in photos
+    ), return_exceptions=True)
+    sources = [None if isinstance(s, Exception) else s for s in sources]
+    return await run_in_pool(compose, sources, tile, columns, fmt)
+
+
+async def get_sheet(photos: list[dict], tile: int, columns: int, fmt: str) -> bytes:
+    """Render a sheet of `photos` ({photo_id, path}) once and cache it."""
+    key = (sheet_key([p["photo_id"] for p in photos], tile, columns), fmt)
+    data = _cache.get(key)
+    record_cache("contact_sheet", data is not None)
+    if data is not None:
+        return data
+
+    future = _inflight.get(key)
+    if future is None:
+        future = asyncio.ensure_future(_build(photos, tile, columns, fmt))
+        _inflight[key] = future
+        future.add_done_callback(lambda f: _finish(key, f))
+    return await asyncio.shield(future)
+
+
+def _finish(key: tuple, future: asyncio.Future):
+    _inflight.pop(key, None)
+    if not future.cancelled() and future.exception() is None:
+        _cache.put(key, future.result())
+
+
+def clear_cache():
+    """Drop cached sheets (after re-indexing)."""
+    _cache.clear()
@@ -1,20 +1,43 @@
 """SQLite database module for photos and faces storage."""
+import asyncio
 import sqlite3
+import threading
 import numpy as np
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
-from typing import Optional
+from typing import Callable, Optional, TypeVar
 
-DB_PATH = Path(__file__).parent.parent / "data" / "database.db"
+from config import DB_PATH, DB_WORKERS, DB_MMAP_SIZE, DB_CACHE_KB, DB_STATEMENT_CACHE, DEFAULT_COLLECTION
+
+T = TypeVar("T")
+
+# Request handlers run queries here so SQLite never blocks the event loop.
+# Each worker thread keeps its own read-only connection (see get_read_connection).
+_db_executor = ThreadPoolExecutor(max_workers=DB_WORKERS, thread_name_prefix="db")
+
+# Read connection pool: one connection per (thread, database). Bumping the
+# generation makes every thread close and reopen its own connections on its
+# next query; a connection is only ever closed by the thread that uses it.
+_read_local = threading.local()
+_read_pool_lock = threading.Lock()
+_read_connections: set[sqlite3.Connection] = set()  # all open ones, for shutdown
+_read_generation = 0
+
+_prepared_dirs: set[Path] = set()
 
 SCHEMA = """
 CREATE TABLE IF NOT EXISTS photos (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
-    filename TEXT NOT NULL UNIQUE,
+    filename TEXT NOT NULL,
     path TEXT NOT NULL,
     width INTEGER,
     height INTEGER,
-    indexed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    indexed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    collection TEXT NOT NULL DEFAULT 'default',
+    phash INTEGER,
+    burst_id INTEGER,
+    UNIQUE (collection, filename)
 );
 
 CREATE TABLE IF NOT EXISTS faces (
@@ -26,19 +49,105 @@ CREATE TABLE IF NOT EXISTS faces (
     bbox_h INTEGER NOT NULL,
     embedding BLOB NOT NULL,
     detection_score FLOAT,
+    collection TEXT NOT NULL DEFAULT 'default',
     FOREIGN KEY (photo_id) REFERENCES photos(id)
 );
 
-CREATE INDEX IF NOT EXISTS idx_faces_photo_id ON faces(photo_id);
+CREATE TABLE IF NOT EXISTS clusters (
+    id INTEGER PRIMARY KEY,
+    size INTEGER NOT NULL,
+    centroid BLOB NOT NULL,
+    representative_face_id INTEGER,
+    collection TEXT NOT NULL DEFAULT 'default',
+    FOREIGN KEY (representative_face_id) REFERENCES faces(id)
+);
+
+CREATE TABLE IF NOT EXISTS face_clusters (
+    face_id INTEGER PRIMARY KEY,
+    cluster_id INTEGER NOT NULL,
+    FOREIGN KEY (face_id) REFERENCES faces(id),
+    FOREIGN KEY (cluster_id) REFERENCES clusters(id)
+);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value
+);
+
+-- Indexer journal: one row per run, progress updated after every batch
+CREATE TABLE IF NOT EXISTS index_runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    collection TEXT NOT NULL,
+    photos_dir TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'running',
+    started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP,
+    last_filename TEXT,
+    progress TEXT
+);
+
+-- Photos that failed to index, retried by later runs
+CREATE TABLE IF NOT EXISTS index_failures (
+    collection TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    path TEXT NOT NULL,
+    reason TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 1,
+    run_id INTEGER,
+    failed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (collection, filename)
+);
+"""
+
+# Created after migrations, since older databases lack the collection columns
+INDEXES = """
+-- Covers box/score lookups by photo, so they never read the embedding BLOBs
+CREATE INDEX IF NOT EXISTS idx_faces_photo_boxes
+    ON faces(photo_id, id, bbox_x, bbox_y, bbox_w, bbox_h, detection_score);
+DROP INDEX IF EXISTS idx_faces_photo_id;
+CREATE INDEX IF NOT EXISTS idx_faces_collection ON faces(collection);
+CREATE INDEX IF NOT EXISTS idx_clusters_collection ON clusters(collection);
+CREATE INDEX IF NOT EXISTS idx_face_clusters_cluster_id ON face_clusters(cluster_id);
+CREATE INDEX IF NOT EXISTS idx_photos_indexed_at ON photos(indexed_at);
+CREATE INDEX IF NOT EXISTS idx_photos_burst_id ON photos(burst_id) WHERE burst_id IS NOT NULL;
 """
 
+# Counters behind /api/stats, kept current by triggers so reading them never
+# scans the photos/faces tables
+STATS_TRIGGERS = """
+CREATE TRIGGER IF NOT EXISTS trg_photos_insert_stats AFTER INSERT ON photos BEGIN
+    UPDATE meta SET value = value + 1 WHERE key = 'photo_count';
+    UPDATE meta SET value = NEW.indexed_at
+        WHERE key = 'last_indexed_at' AND (value IS NULL OR value < NEW.indexed_at);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_photos_delete_stats AFTER DELETE ON photos BEGIN
+    UPDATE meta SET value = value - 1 WHERE key = 'photo_count';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_faces_insert_stats AFTER INSERT ON faces BEGIN
+    UPDATE meta SET value = value + 1 WHERE key = 'face_count';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_faces_delete_stats AFTER DELETE ON faces BEGIN
+    UPDATE meta SET value = value - 1 WHERE key = 'face_count';
+END;
+"""
+
+
+def _ensure_parent(path: Path):
+    if path.parent not in _prepared_dirs:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        _prepared_dirs.add(path.parent)
+
 
 @contextmanager
 def get_connection(db_path: Optional[Path] = None):
     """Context manager for database connections."""
     path = db_path or DB_PATH
-    path.parent.mkdir(parents=True, exist_ok=True)
-    conn = sqlite3.connect(str(path))
+    _ensure_parent(path)
+    conn = sqlite3.connect(str(path), cached_statements=DB_STATEMENT_CACHE)
     conn.row_factory = sqlite3.Row
     try:
         yield conn
@@ -47,42 +156,202 @@ def get_connection(db_path: Optional[Path] = None):
         conn.close()
 
 
+def _open_read_connection(path: Path) -> sqlite3.Connection:
+    conn = sqlite3.connect(str(path), check_same_thread=False, cached_statements=DB_STATEMENT_CACHE)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA query_only = ON")
+    conn.execute(f"PRAGMA mmap_size = {DB_MMAP_SIZE}")
+    conn.execute(f"PRAGMA cache_size = -{DB_CACHE_KB}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    with _read_pool_lock:
+        _read_connections.add(conn)
+    return conn
+
+
+def _close_read_connection(conn: sqlite3.Connection):
+    with _read_pool_lock:
+        _read_connections.discard(conn)
+    try:
+        conn.close()
+    except sqlite3.Error:
+        pass
+
+
+@contextmanager
+def get_read_connection(db_path: Optional[Path] = None):
+    """Pooled read-only connection for the calling thread.
+
+    The connection stays open across calls, so its statement cache and page
+    cache are reused. Writes fail with "attempt to write a readonly database".
+    """
+    path = db_path or DB_PATH
+    pool = getattr(_read_local, "pool", None)
+    if pool is None or _read_local.generation != _read_generation:
+        # This thread's connections predate a reload; nobody else uses them
+        for stale in (pool or {}).values():
+            _close_read_connection(stale)
+        pool = _read_local.pool = {}
+        _read_local.generation = _read_generation
+    conn = pool.get(path)
+    if conn is None:
+        conn = pool[path] = _open_read_connection(path)
+    yield conn
+
+
+def close_read_connections():
+    """Make every thread reopen its read connections (e.g. after the database file changed).
+
+    Connections may be mid-query on their threads, so each is closed by its
+    own thread when it next takes one.
+    """
+    global _read_generation
+    with _read_pool_lock:
+        _read_generation += 1
+
+
+def shutdown_read_pool():
+    """Stop the database threads, then close their connections (at shutdown)."""
+    _db_executor.shutdown(wait=True)
+    with _read_pool_lock:
+        connections = list(_read_connections)
+        _read_connections.clear()
+    for conn in connections:
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+
+def _call_with_connection(func, db_path, args):
+    with get_read_connection(db_path) as conn:
+        return func(conn, *args)
+
+
+async def run_db(func: Callable[..., T], *args, db_path: Optional[Path] = None) -> T:
+    """Run read-only func(conn, *args) on the database thread pool and await its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_db_executor, _call_with_connection, func, db_path, args)
+
+
 def init_db(db_path: Optional[Path] = None):
     """Initialize database schema."""
     with get_connection(db_path) as conn:
+        # WAL lets the API keep reading while the indexer writes
+        conn.execute("PRAGMA journal_mode = WAL")
         conn.executescript(SCHEMA)
+        migrate_collections(conn)
+        migrate_bursts(conn)
+        conn.executescript(INDEXES)
+        init_stats(conn)
+
+
+def init_stats(conn: sqlite3.Connection):
+    """Backfill stats counters once, then let triggers maintain them."""
+    if conn.execute("SELECT 1 FROM meta WHERE key = 'photo_count'").fetchone() is None:
+        conn.execute(
+            """INSERT OR REPLACE INTO meta (key, value) VALUES
+               ('photo_count', (SELECT COUNT(*) FROM photos)),
+               ('face_count', (SELECT COUNT(*) FROM faces)),
+               ('last_indexed_at', (SELECT MAX(indexed_at) FROM photos))"""
+        )
+    conn.executescript(STATS_TRIGGERS)
+
+
+def _columns(conn: sqlite3.Connection, table: str) -> set[str]:
+    return {row['name'] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def migrate_collections(conn: sqlite3.Connection):
+    """Add collection columns to databases created before collections existed.
 
+    Existing rows land in the default collection. The photos table is rebuilt
+    because its filename uniqueness becomes per collection.
+    """
+    if 'collection' not in _columns(conn, 'photos'):
+        print("Migrating photos table to collections...")
+        conn.executescript("""
+            CREATE TABLE photos_new (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                filename TEXT NOT NULL,
+                path TEXT NOT NULL,
+                width INTEGER,
+                height INTEGER,
+                indexed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                collection TEXT NOT NULL DEFAULT 'default',
+                UNIQUE (collection, filename)
+            );
+            INSERT INTO photos_new (id, filename, path, width, height, indexed_at)
+                SELECT id, filename, path, width, height, indexed_at FROM photos;
+            DROP TABLE photos;
+            ALTER TABLE photos_new RENAME TO photos;
+        """)
+    for table in ('faces', 'clusters'):
+        if 'collection' not in _columns(conn, table):
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN collection TEXT NOT NULL DEFAULT 'default'")
 
-def is_photo_indexed(conn: sqlite3.Connection, filename: str) -> bool:
+
+def migrate_bursts(conn: sqlite3.Connection):
+    """Add the perceptual hash and burst columns to older photos tables."""
+    columns = _columns(conn, 'photos')
+    for column in ('phash', 'burst_id'):
+        if column not in columns:
+            conn.execute(f"ALTER TABLE photos ADD COLUMN {column} INTEGER")
+
+
+def is_photo_indexed(conn: sqlite3.Connection, filename: str, collection: str = DEFAULT_COLLECTION) -> bool:
     """Check if photo already indexed."""
-    cursor = conn.execute("SELECT 1 FROM photos WHERE filename = ?", (filename,))
+    cursor = conn.execute(
+        "SELECT 1 FROM photos WHERE collection = ? AND filename = ?", (collection, filename)
+    )
     return cursor.fetchone() is not None
 
 
-def insert_photo(conn: sqlite3.Connection, filename: str, path: str, width: int, height: int) -> int:
+def insert_photo(conn: sqlite3.Connection, filename: str, path: str, width: int, height: int,
+                 collection: str = DEFAULT_COLLECTION, phash: Optional[int] = None,
+                 burst_id: Optional[int] = None) -> int:
     """Insert photo record, return photo_id."""
     cursor = conn.execute(
-        "INSERT INTO photos (filename, path, width, height) VALUES (?, ?, ?, ?)",
-        (filename, path, width, height)
+        """INSERT INTO photos (filename, path, width, height, collection, phash, burst_id)
+           VALUES (?, ?, ?, ?, ?, ?, ?)""",
+        (filename, path, width, height, collection, phash, burst_id)
     )
     return cursor.lastrowid
 
 
+def set_burst_id(conn: sqlite3.Connection, photo_id: int, burst_id: int):
+    """Assign a photo to a burst (used to mark a burst's representative)."""
+    conn.execute("UPDATE photos SET burst_id = ? WHERE id = ?", (burst_id, photo_id))
+
+
 def insert_faces_batch(conn: sqlite3.Connection, faces: list[dict]):
     """Batch insert face records with embeddings."""
     for face in faces:
         embedding_blob = face['embedding'].astype(np.float32).tobytes()
         conn.execute(
-            """INSERT INTO faces (photo_id, bbox_x, bbox_y, bbox_w, bbox_h, embedding, detection_score)
-               VALUES (?, ?, ?, ?, ?, ?, ?)""",
+            """INSERT INTO faces (photo_id, bbox_x, bbox_y, bbox_w, bbox_h, embedding, detection_score, collection)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
             (face['photo_id'], face['bbox_x'], face['bbox_y'], face['bbox_w'], face['bbox_h'],
-             embedding_blob, face['detection_score'])
+             embedding_blob, face['detection_score'], face.get('collection', DEFAULT_COLLECTION))
         )
 
 
-def get_all_embeddings(conn: sqlite3.Connection) -> list[tuple[int, int, np.ndarray]]:
-    """Load all face embeddings. Returns [(face_id, photo_id, embedding), ...]"""
-    cursor = conn.execute("SELECT id, photo_id, embedding FROM faces")
+def get_all_embeddings(conn: sqlite3.Connection, collection: str = DEFAULT_COLLECTION,
+                       shard: Optional[tuple[int, int]] = None) -> list[tuple[int, int, np.ndarray]]:
+    """Load all face embeddings of a collection. Returns [(face_id, photo_id, embedding), ...]
+
+    With `shard=(index, count)` only faces of photos with photo_id % count == index
+    are loaded, so every photo's faces live on exactly one shard.
+    """
+    if shard is None:
+        cursor = conn.execute(
+            "SELECT id, photo_id, embedding FROM faces WHERE collection = ?", (collection,)
+        )
+    else:
+        index, count = shard
+        cursor = conn.execute(
+            "SELECT id, photo_id, embedding FROM faces WHERE collection = ? AND photo_id % ? = ?",
+            (collection, count, index)
+        )
     results = []
     for row in cursor:
         embedding = np.frombuffer(row['embedding'], dtype=np.float32)
@@ -90,6 +359,163 @@ def get_all_embeddings(conn: sqlite3.Connection) -> list[tuple[int, int, np.ndar
     return results
 
 
+def start_index_run(conn: sqlite3.Connection, collection: str, photos_dir: str) -> int:
+    """Open a journal entry for an indexing run; it supersedes unfinished earlier runs."""
+    conn.execute(
+        """UPDATE index_runs SET status = 'abandoned'
+           WHERE collection = ? AND status IN ('running', 'interrupted')""",
+        (collection,)
+    )
+    cursor = conn.execute(
+        "INSERT INTO index_runs (collection, photos_dir) VALUES (?, ?)", (collection, photos_dir)
+    )
+    return cursor.lastrowid
+
+
+def get_resumable_run(conn: sqlite3.Connection, collection: str) -> Optional[dict]:
+    """Latest run of a collection that was killed or interrupted before finishing."""
+    row = conn.execute(
+        """SELECT * FROM index_runs WHERE collection = ? AND status IN ('running', 'interrupted')
+           ORDER BY id DESC LIMIT 1""",
+        (collection,)
+    ).fetchone()
+    return dict(row) if row else None
+
+
+def update_index_run(conn: sqlite3.Connection, run_id: int, progress: str,
+                     last_filename: Optional[str] = None, status: str = 'running'):
+    """Record a run's progress (JSON) and where it got to."""
+    conn.execute(
+        """UPDATE index_runs SET status = ?, progress = ?, last_filename = COALESCE(?, last_filename),
+                  updated_at = CURRENT_TIMESTAMP,
+                  finished_at = CASE WHEN ? = 'completed' THEN CURRENT_TIMESTAMP END
+           WHERE id = ?""",
+        (status, progress, last_filename, status, run_id)
+    )
+
+
+def record_index_failure(conn: sqlite3.Connection, collection: str, filename: str, path: str,
+                         reason: str, run_id: int):
+    """Remember a photo that failed to index, counting repeated attempts."""
+    conn.execute(
+        """INSERT INTO index_failures (collection, filename, path, reason, run_id) VALUES (?, ?, ?, ?, ?)
+           ON CONFLICT (collection, filename) DO UPDATE SET
+               reason = excluded.reason, path = excluded.path, run_id = excluded.run_id,
+               attempts = attempts + 1, failed_at = CURRENT_TIMESTAMP""",
+        (collection, filename, path, reason, run_id)
+    )
+
+
+def clear_index_failure(conn: sqlite3.Connection, collection: str, filename: str):
+    conn.execute("DELETE FROM index_failures WHERE collection = ? AND filename = ?", (collection, filename))
+
+
+def get_index_failures(conn: sqlite3.Connection, collection: str) -> dict[str, dict]:
+    """Failed photos of a collection. Returns {filename: failure}."""
+    cursor = conn.execute("SELECT * FROM index_failures WHERE collection = ?", (collection,))
+    return {row['filename']: dict(row) for row in cursor}
+
+
+def replace_clusters(conn: sqlite3.Connection, collection: str, face_ids: list[int],
+                     labels: np.ndarray, centroids: np.ndarray, representatives: np.ndarray):
+    """Replace a collection's identity clusters with a fresh clustering run."""
+    conn.execute(
+        """DELETE FROM face_clusters
+           WHERE cluster_id IN (SELECT id FROM clusters WHERE collection = ?)""",
+        (collection,)
+    )
+    conn.execute("DELETE FROM clusters WHERE collection = ?", (collection,))
+
+    sizes = np.bincount(labels, minlength=len(centroids))
+    cluster_ids = []
+    for label in range(len(centroids)):
+        cursor = conn.execute(
+            "INSERT INTO clusters (size, centroid, representative_face_id, collection) VALUES (?, ?, ?, ?)",
+            (int(sizes[label]), centroids[label].astype(np.float32).tobytes(),
+             face_ids[int(representatives[label])], collection)
+        )
+        cluster_ids.append(cursor.lastrowid)
+    conn.executemany(
+        "INSERT INTO face_clusters (face_id, cluster_id) VALUES (?, ?)",
+        ((face_id, cluster_ids[int(label)]) for face_id, label in zip(face_ids, labels))
+    )
+
+
+def get_unclustered_embeddings(conn: sqlite3.Connection, collection: str = DEFAULT_COLLECTION
+                               ) -> list[tuple[int, np.ndarray]]:
+    """Embeddings of faces indexed since the last clustering. Returns [(face_id, embedding), ...]"""
+    cursor = conn.execute(
+        """SELECT f.id, f.embedding FROM faces f
+           LEFT JOIN face_clusters fc ON fc.face_id = f.id
+           WHERE f.collection = ? AND fc.face_id IS NULL""",
+        (collection,)
+    )
+    return [(row['id'], np.frombuffer(row['embedding'], dtype=np.float32)) for row in cursor]
+
+
+def get_cluster_sizes(conn: sqlite3.Connection, collection: str = DEFAULT_COLLECTION) -> dict[int, int]:
+    cursor = conn.execute("SELECT id, size FROM clusters WHERE collection = ?", (collection,))
+    return {row['id']: row['size'] for row in cursor}
+
+
+def add_cluster_members(conn: sqlite3.Connection, face_ids: list[int], cluster_ids: list[int],
+                        labels: np.ndarray, centroids: np.ndarray):
+    """Attach faces to existing clusters and store their moved centroids.
+
+    `labels` index `cluster_ids` (and `centroids`); faces labelled -1 stay unclustered.
+    """
+    members = [(face_id, cluster_ids[int(label)]) for face_id, label in zip(face_ids, labels) if label >= 0]
+    conn.executemany("INSERT INTO face_clusters (face_id, cluster_id) VALUES (?, ?)", members)
+    added = np.bincount(labels[labels >= 0], minlength=len(cluster_ids))
+    conn.executemany(
+        "UPDATE clusters SET size = size + ?, centroid = ? WHERE id = ?",
+        ((int(added[i]), centroids[i].astype(np.float32).tobytes(), cluster_ids[i])
+         for i in np.flatnonzero(added))
+    )
+
+
+def get_all_clusters(conn: sqlite3.Connection, collection: str = DEFAULT_COLLECTION
+                     ) -> tuple[list[int], Optional[np.ndarray], dict[int, int]]:
+    """Load a collection's cluster centroids and face memberships.
+
+    Returns:
+        Tuple of (cluster_ids, centroids, face_to_cluster). centroids is None
+        when no clustering has been run.
+    """
+    cluster_ids = []
+    centroids = []
+    cursor = conn.execute(
+        "SELECT id, centroid FROM clusters WHERE collection = ? ORDER BY id", (collection,)
+    )
+    for row in cursor:
+        cluster_ids.append(row['id'])
+        centroids.append(np.frombuffer(row['centroid'], dtype=np.float32))
+    if not centroids:
+        return [], None, {}
+
+    cursor = conn.execute(
+        """SELECT fc.face_id, fc.cluster_id FROM face_clusters fc
+           JOIN clusters c ON c.id = fc.cluster_id WHERE c.collection = ?""",
+        (collection,)
+    )
+    face_to_cluster = {row['face_id']: row['cluster_id'] for row in cursor}
+    return cluster_ids, np.vstack(centroids), face_to_cluster
+
+
+def get_people(conn: sqlite3.Connection, collection: str = DEFAULT_COLLECTION, min_size: int = 2,
+               limit: int = 50, offset: int = 0) -> list[dict]:
+    """List a collection's identity clusters by size, with their representative face."""
+    cursor = conn.execute(
+        """SELECT c.id AS cluster_id, c.size, f.photo_id, f.bbox_x, f.bbox_y, f.bbox_w, f.bbox_h
+           FROM clusters c JOIN faces f ON f.id = c.representative_face_id
+           WHERE c.collection = ? AND c.size >= ?
+           ORDER BY c.size DESC, c.id
+           LIMIT ? OFFSET ?""",
+        (collection, min_size, limit, offset)
+    )
+    return [dict(row) for row in cursor]
+
+
 def get_photo_by_id(conn: sqlite3.Connection, photo_id: int) -> Optional[dict]:
     """Get photo record by ID."""
     cursor = conn.execute("SELECT * FROM photos WHERE id = ?", (photo_id,))
@@ -97,31 +523,107 @@ def get_photo_by_id(conn: sqlite3.Connection, photo_id: int) -> Optional[dict]:
     return dict(row) if row else None
 
 
-def get_face_by_id(conn: sqlite3.Connection, face_id: int) -> Optional[dict]:
-    """Get face record by ID."""
-    cursor = conn.execute("SELECT * FROM faces WHERE id = ?", (face_id,))
-    row = cursor.fetchone()
-    if row:
-        result = dict(row)
-        result['embedding'] = np.frombuffer(result['embedding'], dtype=np.float32)
-        return result
-    return None
+def get_photos_by_ids(conn: sqlite3.Connection, photo_ids: list[int]) -> dict[int, dict]:
+    """Get photo records for many IDs at once. Returns {photo_id: photo}."""
+    photos = {}
+    unique_ids = list(dict.fromkeys(photo_ids))
+    # Stay under SQLite's bound-parameter limit
+    for start in range(0, len(unique_ids), 500):
+        chunk = unique_ids[start:start + 500]
+        placeholders = ",".join("?" * len(chunk))
+        cursor = conn.execute(f"SELECT * FROM photos WHERE id IN ({placeholders})", chunk)
+        photos.update((row['id'], dict(row)) for row in cursor)
+    return photos
 
 
-def get_faces_by_photo_id(conn: sqlite3.Connection, photo_id: int) -> list[dict]:
-    """Get all faces for a photo."""
-    cursor = conn.execute("SELECT * FROM faces WHERE photo_id = ?", (photo_id,))
-    results = []
-    for row in cursor:
-        face = dict(row)
+def get_burst_sizes(conn: sqlite3.Connection, burst_ids: list[int]) -> dict[int, int]:
+    """Number of frames in each burst. Returns {burst_id: size}."""
+    sizes = {}
+    unique_ids = list(dict.fromkeys(burst_ids))
+    for start in range(0, len(unique_ids), 500):
+        chunk = unique_ids[start:start + 500]
+        placeholders = ",".join("?" * len(chunk))
+        cursor = conn.execute(
+            f"SELECT burst_id, COUNT(*) AS size FROM photos WHERE burst_id IN ({placeholders}) GROUP BY burst_id",
+            chunk
+        )
+        sizes.update((row['burst_id'], row['size']) for row in cursor)
+    return sizes
+
+
+def get_burst_photos(conn: sqlite3.Connection, burst_id: int) -> list[dict]:
+    """Frames of a burst in shooting (filename) order."""
+    cursor = conn.execute(
+        "SELECT id, filename, collection FROM photos WHERE burst_id = ? ORDER BY filename", (burst_id,)
+    )
+    return [dict(row) for row in cursor]
+
+
+# Face columns without the embedding; all covered by idx_faces_photo_boxes
+FACE_BOX_COLUMNS = "id, photo_id, bbox_x, bbox_y, bbox_w, bbox_h, detection_score"
+
+
+def _face_record(row: sqlite3.Row) -> dict:
+    face = dict(row)
+    if 'embedding' in face:
         face['embedding'] = np.frombuffer(face['embedding'], dtype=np.float32)
-        results.append(face)
-    return results
+    return face
+
+
+def get_face_by_id(conn: sqlite3.Connection, face_id: int, with_embedding: bool = False) -> Optional[dict]:
+    """Get face record by ID; the embedding is only read if asked for."""
+    columns = f"{FACE_BOX_COLUMNS}, collection" + (", embedding" if with_embedding else "")
+    row = conn.execute(f"SELECT {columns} FROM faces WHERE id = ?", (face_id,)).fetchone()
+    return _face_record(row) if row else None
+
+
+def get_faces_by_photo_id(conn: sqlite3.Connection, photo_id: int, with_embedding: bool = False) -> list[dict]:
+    """Get all faces for a photo; without embeddings this reads only the covering index."""
+    columns = FACE_BOX_COLUMNS + (", embedding" if with_embedding else "")
+    cursor = conn.execute(f"SELECT {columns} FROM faces WHERE photo_id = ? ORDER BY id", (photo_id,))
+    return [_face_record(row) for row in cursor]
+
+
+def get_face_boxes(conn: sqlite3.Connection, photo_ids: list[int]) -> dict[int, list[dict]]:
+    """Face boxes of many photos at once, from the covering index. Returns {photo_id: [face]}."""
+    boxes: dict[int, list[dict]] = {}
+    unique_ids = list(dict.fromkeys(photo_ids))
+    for start in range(0, len(unique_ids), 500):
+        chunk = unique_ids[start:start + 500]
+        placeholders = ",".join("?" * len(chunk))
+        cursor = conn.execute(
+            f"SELECT {FACE_BOX_COLUMNS} FROM faces WHERE photo_id IN ({placeholders}) ORDER BY photo_id, id",
+            chunk
+        )
+        for row in cursor:
+            boxes.setdefault(row['photo_id'], []).append(dict(row))
+    return boxes
+
+
+def get_collections(conn: sqlite3.Connection) -> list[dict]:
+    """List collections with their photo and face counts."""
+    cursor = conn.execute(
+        """SELECT p.collection, COUNT(*) AS photos,
+                  (SELECT COUNT(*) FROM faces f WHERE f.collection = p.collection) AS faces
+           FROM photos p GROUP BY p.collection ORDER BY p.collection"""
+    )
+    return [dict(row) for row in cursor]
+
+
+def collection_exists(conn: sqlite3.Connection, collection: str) -> bool:
+    """Whether any photo is indexed in a collection."""
+    row = conn.execute("SELECT 1 FROM photos WHERE collection = ? LIMIT 1", (collection,)).fetchone()
+    return row is not None
 
 
 def get_stats(conn: sqlite3.Connection) -> dict:
-    """Get database statistics."""
-    photos = conn.execute("SELECT COUNT(*) as count FROM photos").fetchone()['count']
-    faces = conn.execute("SELECT COUNT(*) as count FROM faces").fetchone()['count']
-    last_indexed = conn.execute("SELECT MAX(indexed_at) as ts FROM photos").fetchone()['ts']
-    return {'total_photos': photos, 'total_faces': faces, 'indexed_at': last_indexed}
+    """Get database statistics from the trigger-maintained counters."""
+    cursor = conn.execute(
+        "SELECT key, value FROM meta WHERE key IN ('photo_count', 'face_count', 'last_indexed_at')"
+    )
+    meta = {row['key']: row['value'] for row in cursor}
+    return {
+        'total_photos': meta.get('photo_count') or 0,
+        'total_faces': meta.get('face_count') or 0,
+        'indexed_at': meta.get('last_indexed_at'),
+    }
@@ -0,0 +1,80 @@
+"""Shared post-processing of detected faces: padded boxes, crops and thumbnails."""
+import asyncio
+import base64
+from typing import Literal
+
+import numpy as np
+from PIL import Image
+
+from models import DetectedFace, BBox
+from thumbnails import encode_image, store_face_crop, media_type, run_in_pool
+
+# Expand each box by this fraction of its size per side for a less zoomed-in crop
+BOX_PADDING = 0.5
+MIN_FACE_SIZE = 30  # px, after padding and clamping
+FACE_THUMBNAIL_SIZE = 150
+
+# How detected-face thumbnails are returned: inline data URLs, or URLs of
+# crops cached server-side (smaller JSON, cacheable and format-negotiated)
+ThumbnailMode = Literal["inline", "url"]
+
+
+def padded_boxes(bboxes: np.ndarray, width: int, height: int,
+                 scale: float = 1.0) -> tuple[np.ndarray, np.ndarray]:
+    """Pad and clamp all (x1, y1, x2, y2) boxes at once.
+
+    Returns the int boxes and a mask of those large enough to keep, judged
+    at original resolution when the image was downscaled by `scale`.
+    """
+    boxes = bboxes.astype(int)
+    sizes = boxes[:, 2:] - boxes[:, :2]
+    pads = (sizes * BOX_PADDING).astype(int)
+    top_left = np.maximum(boxes[:, :2] - pads, 0)
+    bottom_right = np.minimum(boxes[:, 2:] + pads, [width, height])
+    padded = np.hstack([top_left, bottom_right])
+    keep = ((bottom_right - top_left) * scale >= MIN_FACE_SIZE).all(axis=1)
+    return padded, keep
+
+
+def _render_face(img: np.ndarray, box: np.ndarray, temp_id: str, fmt: str, mode: ThumbnailMode) -> str:
+    """Crop one face from a BGR image and produce its thumbnail reference (blocking)."""
+    x1, y1, x2, y2 = box
+    # BGR -> RGB by reversing the channel axis of the crop only
+    crop = Image.fromarray(np.ascontiguousarray(img[y1:y2, x1:x2, ::-1]))
+    crop.thumbnail((FACE_THUMBNAIL_SIZE, FACE_THUMBNAIL_SIZE))
+    if mode == "url":
+        store_face_crop(temp_id, crop)
+        return f"/api/faces/{temp_id}/thumbnail"
+    data = encode_image(crop, fmt)
+    return f"data:{media_type(fmt)};base64,{base64.b64encode(data).decode()}"
+
+
+async def detected_faces(img: np.ndarray, faces: list, matcher, fmt: str,
+                         mode: ThumbnailMode = "inline", scale: float = 1.0) -> list[DetectedFace]:
+    """Build the API result for faces found in a BGR image.
+
+    Faces too small after padding are dropped before any pixel work; the
+    remaining crops are encoded in parallel on the thumbnail pool. `scale`
+    maps boxes from a downscaled detection image back to the original.
+    """
+    if not faces:
+        return []
+    height, width = img.shape[:2]
+    boxes, keep = padded_boxes(np.array([face.bbox for face in faces]), width, height, scale)
+    kept = [(face, box) for face, box, k in zip(faces, boxes, keep) if k]
+    temp_ids = [matcher.store_temp_face(face.embedding) for face, _ in kept]
+    thumbnails = await asyncio.gather(*(
+        run_in_pool(_render_face, img, box, temp_id, fmt, mode)
+        for (_, box), temp_id in zip(kept, temp_ids)
+    ))
+
+    return [
+        DetectedFace(
+            temp_id=temp_id,
+            thumbnail=thumbnail,
+            bbox=BBox(x=round(x1 * scale), y=round(y1 * scale),
+                      w=round((x2 - x1) * scale), h=round((y2 - y1) * scale)),
+            score=float(face.det_score)
+        )
+        for (face, (x1, y1, x2, y2)), temp_id, thumbnail in zip(kept, temp_ids, thumbnails)
+    ]
@@ -1,54 +1,299 @@
 """Face matching service with in-memory embedding cache."""
+import heapq
 import numpy as np
 import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Optional
 import threading
 
-from database import get_connection, get_all_embeddings
+from config import (
+    CLUSTER_SEARCH_MARGIN, DEFAULT_COLLECTION, EMBEDDING_CACHE_MB, SHARD_INDEX, SHARD_COUNT,
+    SEARCH_CHUNK_ROWS, SEARCH_THREADS
+)
+from database import get_connection, get_all_embeddings, get_all_clusters
+from metrics import timed, record_cache
 
+_scan_pool: Optional[ThreadPoolExecutor] = None
+_scan_pool_lock = threading.Lock()
 
-class FaceMatcher:
-    """Manages face embeddings and performs similarity search."""
 
-    def __init__(self, db_path: Path):
-        self.db_path = db_path
-        self.embeddings: Optional[np.ndarray] = None  # Shape: (N, 512)
+def _get_scan_pool() -> ThreadPoolExecutor:
+    """Thread pool shared by all searches, so concurrent queries interleave blocks."""
+    global _scan_pool
+    with _scan_pool_lock:
+        if _scan_pool is None:
+            _scan_pool = ThreadPoolExecutor(max_workers=SEARCH_THREADS, thread_name_prefix="scan")
+        return _scan_pool
+
+
+class EmbeddingPartition:
+    """Normalized embeddings and identity clusters of one collection."""
+
+    def __init__(self, collection: str, shard: Optional[tuple[int, int]] = None):
+        self.collection = collection
+        self.shard = shard
+        self.embeddings = np.array([], dtype=np.float32).reshape(0, 512)  # Shape: (N, 512)
         self.face_ids: list[int] = []
         self.photo_ids: list[int] = []
-        self.temp_faces: dict[str, tuple[np.ndarray, datetime]] = {}
-        self._lock = threading.Lock()
-        self._load_embeddings()
+        # Identity clusters: centroid matrix plus member rows grouped by cluster
+        self.centroids: Optional[np.ndarray] = None  # Shape: (C, 512)
+        self.cluster_index: dict[int, int] = {}  # cluster_id -> centroid row
+        self._cluster_order = np.zeros(0, dtype=np.int64)
+        self._cluster_offsets = np.zeros(1, dtype=np.int64)
+        self._unclustered_rows = np.zeros(0, dtype=np.int64)
 
-    def _load_embeddings(self):
-        """Load all embeddings from database into numpy array."""
-        if not self.db_path.exists():
-            print(f"Warning: Database not found at {self.db_path}")
-            self.embeddings = np.array([]).reshape(0, 512)
-            return
+    @property
+    def nbytes(self) -> int:
+        """Approximate resident size, used for cache eviction."""
+        size = self.embeddings.nbytes + 16 * len(self.face_ids)
+        if self.centroids is not None:
+            size += self.centroids.nbytes + self._cluster_order.nbytes
+        return size
 
-        with get_connection(self.db_path) as conn:
-            data = get_all_embeddings(conn)
+    def load(self, db_path: Path):
+        """Load the collection's embeddings and clusters from the database."""
+        with get_connection(db_path) as conn:
+            data = get_all_embeddings(conn, self.collection, self.shard)
+            clusters = get_all_clusters(conn, self.collection)
 
         if not data:
-            self.embeddings = np.array([]).reshape(0, 512)
             return
 
         self.face_ids = [d[0] for d in data]
         self.photo_ids = [d[1] for d in data]
-        self.embeddings = np.vstack([d[2] for d in data])
+        embeddings = np.vstack([d[2] for d in data])
 
         # Normalize embeddings for faster cosine similarity
-        norms = np.linalg.norm(self.embeddings, axis=1, keepdims=True)
-        self.embeddings = self.embeddings / (norms + 1e-10)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        self.embeddings = embeddings / (norms + 1e-10)
+
+        shard = f" (shard {self.shard[0]}/{self.shard[1]})" if self.shard else ""
+        print(f"Loaded {len(self.face_ids)} face embeddings for collection '{self.collection}'{shard}")
+        self._load_clusters(*clusters)
+
+    def _load_clusters(self, cluster_ids: list[int], centroids: Optional[np.ndarray],
+                       face_to_cluster: dict[int, int]):
+        """Index identity clusters built by the indexer for two-stage search."""
+        if centroids is None:
+            return
+
+        # Map each embedding row to its cluster index (-1 = indexed after clustering)
+        self.cluster_index = {cid: i for i, cid in enumerate(cluster_ids)}
+        labels = np.array(
+            [self.cluster_index.get(face_to_cluster.get(fid), -1) for fid in self.face_ids],
+            dtype=np.int64
+        )
+        order = np.argsort(labels, kind='stable')
+        sorted_labels = labels[order]
+
+        self._unclustered_rows = order[sorted_labels < 0]
+        self._cluster_order = order
+        self._cluster_offsets = np.searchsorted(sorted_labels, np.arange(len(cluster_ids) + 1))
+        self.centroids = centroids / (np.linalg.norm(centroids, axis=1, keepdims=True) + 1e-10)
+        print(f"Loaded {len(cluster_ids)} identity clusters "
+              f"({len(self._unclustered_rows)} faces unclustered)")
+
+    def _candidate_rows(self, query: np.ndarray, threshold: float) -> Optional[np.ndarray]:
+        """Rows worth scoring for a query, or None to scan everything.
+
+        Matches the query against cluster centroids first and expands only
+        clusters close enough to contain a face above the threshold.
+        """
+        if self.centroids is None:
+            return None
+
+        centroid_sims = np.dot(self.centroids, query)
+        hits = np.where(centroid_sims >= threshold - CLUSTER_SEARCH_MARGIN)[0]
+        starts = self._cluster_offsets[hits]
+        stops = self._cluster_offsets[hits + 1]
+        expanded = int((stops - starts).sum()) + len(self._unclustered_rows)
+
+        # A broad query touching most clusters is cheaper as a plain scan
+        if expanded > len(self.face_ids) // 2:
+            return None
+
+        parts = [self._cluster_order[a:b] for a, b in zip(starts, stops)]
+        parts.append(self._unclustered_rows)
+        return np.concatenate(parts)
+
+    def search(self, query: np.ndarray, threshold: float, limit: int) -> list[dict]:
+        """Best match per photo for a normalized query embedding."""
+        if len(self.face_ids) == 0:
+            return []
+
+        # Cosine similarity (embeddings already normalized), restricted to
+        # matching identity clusters when a clustering is available
+        with timed("centroid_match"):
+            rows = self._candidate_rows(query, threshold)
+        with timed("similarity"):
+            best = self._scan(query, threshold, limit, rows)
+
+        with timed("dedup"):
+            return heapq.nlargest(limit, best, key=lambda m: m["similarity"])
+
+    def _scan(self, query: np.ndarray, threshold: float, limit: int,
+              rows: Optional[np.ndarray] = None) -> list[dict]:
+        """Score embeddings (or only `rows`) in blocks of SEARCH_CHUNK_ROWS.
+
+        Keeps a running best match per photo, pruned to the top `limit`
+        photos after every block; once `limit` photos are held, the lowest
+        of their scores becomes the threshold for the remaining blocks.
+        """
+        total = len(self.face_ids) if rows is None else len(rows)
+        blocks = [(start, min(start + SEARCH_CHUNK_ROWS, total))
+                  for start in range(0, total, SEARCH_CHUNK_ROWS)]
+        best: dict[int, dict] = {}
+        floor = threshold
+        lock = threading.Lock()
+
+        def score_block(block: tuple[int, int]):
+            nonlocal best, floor
+            start, stop = block
+            if rows is None:
+                similarities = np.dot(self.embeddings[start:stop], query)
+                indices = np.flatnonzero(similarities >= floor)
+                scores = similarities[indices]
+                indices += start
+            else:
+                block_rows = rows[start:stop]
+                similarities = np.dot(self.embeddings[block_rows], query)
+                mask = similarities >= floor
+                indices = block_rows[mask]
+                scores = similarities[mask]
+            matches = self._rank(indices, scores, limit)
+
+            with lock:
+                for match in matches:
+                    current = best.get(match["photo_id"])
+                    if current is None or match["similarity"] > current["similarity"]:
+                        best[match["photo_id"]] = match
+                if len(best) >= limit:
+                    kept = heapq.nlargest(limit, best.values(), key=lambda m: m["similarity"])
+                    best = {m["photo_id"]: m for m in kept}
+                    floor = max(floor, kept[-1]["similarity"])
+
+        if len(blocks) > 1 and SEARCH_THREADS > 1:
+            list(_get_scan_pool().map(score_block, blocks))
+        else:
+            for block in blocks:
+                score_block(block)
+        return list(best.values())
+
+    def cluster_matches(self, cluster_id: int, limit: int = 200) -> Optional[list[dict]]:
+        """Photos containing members of an identity cluster, closest to the centroid first.
+
+        Returns None if the cluster does not belong to this partition.
+        """
+        idx = self.cluster_index.get(cluster_id)
+        if self.centroids is None or idx is None:
+            return None
+        rows = self._cluster_order[self._cluster_offsets[idx]:self._cluster_offsets[idx + 1]]
+        scores = np.dot(self.embeddings[rows], self.centroids[idx])
+        return self._rank(rows, scores, limit)
+
+    def _rank(self, indices: np.ndarray, scores: np.ndarray, limit: int) -> list[dict]:
+        """Sort scored rows and keep the best face per photo."""
+        if len(indices) == 0:
+            return []
+
+        # Sort by similarity descending
+        order = np.argsort(scores)[::-1]
+
+        # Deduplicate by photo_id, keep best match per photo
+        seen_photos = {}
+        results = []
+        for idx, score in zip(indices[order], scores[order]):
+            photo_id = self.photo_ids[idx]
+            if photo_id not in seen_photos:
+                seen_photos[photo_id] = True
+                results.append({
+                    "face_id": self.face_ids[idx],
+                    "photo_id": photo_id,
+                    "similarity": float(score)
+                })
+                if len(results) >= limit:
+                    break
+
+        return results
+
+
+class FaceMatcher:
+    """Manages face embeddings and performs similarity search.
+
+    Embeddings are partitioned by collection. Partitions are loaded on first
+    use and the least recently used ones are evicted once the total exceeds
+    EMBEDDING_CACHE_MB. In a sharded deployment only this node's share of
+    each collection is loaded.
+    """
+
+    def __init__(self, db_path: Path, cache_mb: int = EMBEDDING_CACHE_MB,
+                 shard_index: int = SHARD_INDEX, shard_count: int = SHARD_COUNT):
+        self.db_path = db_path
+        self.cache_bytes = cache_mb * 1024 * 1024
+        self.shard = (shard_index, shard_count) if shard_count > 1 else None
+        self.partitions: OrderedDict[str, EmbeddingPartition] = OrderedDict()
+        self.temp_faces: dict[str, tuple[np.ndarray, datetime]] = {}
+        self._lock = threading.Lock()
+        self._partition_lock = threading.Lock()
+        self._generation = 0  # bumped by reloads, so loads that raced one are not cached
+        self._load_embeddings()
 
-        print(f"Loaded {len(self.face_ids)} face embeddings")
+    def _load_embeddings(self):
+        """Drop loaded partitions and warm the default collection."""
+        with self._partition_lock:
+            self.partitions.clear()
+            self._generation += 1
+        if not self.db_path.exists():
+            print(f"Warning: Database not found at {self.db_path}")
+            return
+        self.partition(DEFAULT_COLLECTION)
 
     def reload_embeddings(self):
         """Reload embeddings from database (call after indexing)."""
         self._load_embeddings()
 
+    def partition(self, collection: str) -> EmbeddingPartition:
+        """Get a collection's partition, loading it (and evicting others) if needed.
+
+        Loading reads SQLite, so it happens outside the lock; searches of
+        loaded collections are not held up by it.
+        """
+        with self._partition_lock:
+            part = self.partitions.get(collection)
+            if part is not None:
+                self.partitions.move_to_end(collection)
+                return part
+            generation = self._generation
+
+        loaded = EmbeddingPartition(collection, self.shard)
+        if self.db_path.exists():
+            loaded.load(self.db_path)
+
+        with self._partition_lock:
+            if generation != self._generation:
+                return loaded
+            # Another thread may have loaded it meanwhile; keep the first
+            part = self.partitions.setdefault(collection, loaded)
+            self.partitions.move_to_end(collection)
+
+            # Evict least recently used partitions under memory pressure
+            while len(self.partitions) > 1 and self.loaded_bytes > self.cache_bytes:
+                evicted, _ = self.partitions.popitem(last=False)
+                print(f"Evicted embeddings for collection '{evicted}'")
+            return part
+
+    @property
+    def loaded_bytes(self) -> int:
+        return sum(p.nbytes for p in self.partitions.values())
+
+    @property
+    def total_faces(self) -> int:
+        """Number of embeddings currently loaded across partitions."""
+        return sum(len(p.face_ids) for p in self.partitions.values())
+
     def store_temp_face(self, embedding: np.ndarray) -> str:
         """Store a temporary face embedding and return its ID."""
         temp_id = str(uuid.uuid4())
@@ -60,7 +305,8 @@ class FaceMatcher:
         """Get temporary embedding by ID."""
         with self._lock:
             data = self.temp_faces.get(temp_id)
-            return data[0] if data else None
+        record_cache("temp_faces", data is not None)
+        return data[0] if data else None
 
     def cleanup_temp_faces(self, ttl_seconds: int = 1800):
         """Remove expired temporary faces."""
@@ -72,47 +318,25 @@ class FaceMatcher:
         if expired:
             print(f"Cleaned up {len(expired)} expired temp faces")
 
-    def search(self, temp_face_id: str, threshold: float = 0.5, limit: int = 50) -> list[dict]:
+    def search(self, temp_face_id: str, threshold: float = 0.5, limit: int = 50,
+               collection: str = DEFAULT_COLLECTION) -> list[dict]:
         """Search for matching faces. Returns list of {face_id, photo_id, similarity}."""
         embedding = self.get_temp_embedding(temp_face_id)
         if embedding is None:
             return []
+        return self.search_embedding(embedding, threshold, limit, collection)
 
-        if self.embeddings is None or len(self.embeddings) == 0:
-            return []
-
+    def search_embedding(self, embedding: np.ndarray, threshold: float = 0.5, limit: int = 50,
+                         collection: str = DEFAULT_COLLECTION) -> list[dict]:
+        """Search with a raw query embedding (also used by shard nodes)."""
         # Normalize query embedding
         query = embedding / (np.linalg.norm(embedding) + 1e-10)
+        return self.partition(collection).search(query, threshold, limit)
 
-        # Cosine similarity (embeddings already normalized)
-        similarities = np.dot(self.embeddings, query)
-
-        # Filter by threshold
-        mask = similarities >= threshold
-        indices = np.where(mask)[0]
-
-        if len(indices) == 0:
-            return []
-
-        # Sort by similarity descending
-        sorted_indices = indices[np.argsort(similarities[indices])[::-1]]
-
-        # Deduplicate by photo_id, keep best match per photo
-        seen_photos = {}
-        results = []
-        for idx in sorted_indices:
-            photo_id = self.photo_ids[idx]
-            if photo_id not in seen_photos:
-                seen_photos[photo_id] = True
-                results.append({
-                    "face_id": self.face_ids[idx],
-                    "photo_id": photo_id,
-                    "similarity": float(similarities[idx])
-                })
-                if len(results) >= limit:
-                    break
-
-        return results
+    def cluster_matches(self, cluster_id: int, limit: int = 200,
+                        collection: str = DEFAULT_COLLECTION) -> Optional[list[dict]]:
+        """Photos of an identity cluster, or None if the cluster is unknown."""
+        return self.partition(collection).cluster_matches(cluster_id, limit)
 
 
 # Global instance (initialized in main.py)
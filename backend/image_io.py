@@ -0,0 +1,39 @@
+"""Decoding uploads for face detection at the resolution the detector needs."""
+from io import BytesIO
+from typing import Optional
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from config import DETECT_MAX_SIDE
+
+# EXIF orientations that swap width and height (90/270 degree rotations)
+_TRANSPOSED_ORIENTATIONS = {5, 6, 7, 8}
+
+
+def decode_for_detection(data: bytes, max_side: int = DETECT_MAX_SIDE) -> Optional[tuple[np.ndarray, float, tuple[int, int]]]:
+    """Decode an image upright and at most about `max_side` pixels on its long edge.
+
+    JPEGs are scaled down by the decoder itself (1/2..1/8 in the DCT), so a
+    48 MP phone photo is never materialized at full size. Returns the BGR
+    array, the factor mapping its coordinates back to the original and the
+    original (upright) size, or None if the data is not a readable image.
+    """
+    try:
+        img = Image.open(BytesIO(data))
+        width, height = img.size
+        if img.getexif().get(0x0112, 1) in _TRANSPOSED_ORIENTATIONS:
+            width, height = height, width
+
+        img.draft("RGB", (max_side, max_side))
+        img = ImageOps.exif_transpose(img)
+        if max(img.size) > max_side:
+            img.thumbnail((max_side, max_side))
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+
+    # RGB -> BGR, the channel order InsightFace expects
+    bgr = np.ascontiguousarray(np.asarray(img)[:, :, ::-1])
+    return bgr, width / img.width, (width, height)
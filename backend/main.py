@@ -1,66 +1,134 @@
 """FastAPI backend for YEP Photo Finder."""
-import base64
-import zipfile
-from io import BytesIO
+import asyncio
+import hashlib
+import hmac
+import time
 from contextlib import asynccontextmanager
 from pathlib import Path
+from typing import Optional
+from urllib.parse import urlencode
 
-import cv2
-import numpy as np
-from PIL import Image
 from fastapi import FastAPI, UploadFile, File, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, StreamingResponse, HTMLResponse
-from fastapi.staticfiles import StaticFiles
-from insightface.app import FaceAnalysis
+from fastapi.responses import FileResponse, StreamingResponse, PlainTextResponse, JSONResponse
 
-from fastapi import Request, Response, Cookie
+from fastapi import Request, Response, Cookie, Header, Query
 from fastapi.responses import RedirectResponse
-from config import DB_PATH, DEFAULT_THRESHOLD, DEFAULT_LIMIT, TEMP_FACE_TTL, AUTH_ENABLED
+from config import (
+    DB_PATH, DEFAULT_THRESHOLD, DEFAULT_LIMIT, TEMP_FACE_TTL, AUTH_ENABLED, DEFAULT_COLLECTION,
+    FACE_DETECTION_ENABLED, ANALYSIS_MODE, MAX_THUMBNAIL_SIZE, MAX_DOWNLOAD_PHOTOS, MAX_UPLOAD_SIZE,
+    MAX_REQUEST_SIZE, MAX_SEARCH_LIMIT, PRESET_DETECT_MAX_SIDE, SHARDED, SHARD_NODES, SHARD_TOKEN,
+    MAX_CONTACT_SHEET_PHOTOS, MAX_CONTACT_SHEET_TILE, MAX_FACE_BOX_PHOTOS
+)
 from auth import (
     get_auth_url, exchange_code, validate_domain,
     create_session_token, verify_session_token, get_state_redirect, ALLOWED_DOMAIN
 )
 from models import (
-    DetectFacesResponse, DetectedFace, BBox, ImageSize,
-    SearchRequest, SearchResponse, PhotoMatch,
-    DownloadRequest, StatsResponse
+    DetectFacesResponse, BBox, ImageSize,
+    SearchRequest, SearchResponse, PhotoMatch, BurstPhoto, BurstResponse,
+    FaceBoxesRequest, FaceBox, FaceBoxesResponse,
+    ShardSearchRequest, ShardPersonRequest, ShardSearchResponse, ShardMatch, ContactSheetRequest, ContactSheet, SheetTile,
+    DownloadRequest, DownloadJob, StatsResponse, Person, PeopleResponse, Collection, CollectionsResponse
 )
 from face_matcher import FaceMatcher
-from database import get_connection, get_photo_by_id, get_stats, init_db
-
-# Global instances
+from metrics import timed, render as render_metrics, HTTP_REQUEST_SECONDS, TEMP_FACES, EMBEDDINGS_LOADED
+from database import (
+    run_db, close_read_connections, shutdown_read_pool, get_photo_by_id, get_photos_by_ids, get_burst_sizes,
+    get_burst_photos, get_face_boxes, get_stats, get_people, get_collections, collection_exists, init_db
+)
+from thumbnails import (
+    get_thumbnail, get_face_thumbnail, negotiate_format, media_type,
+    clear_cache as clear_thumbnail_cache
+)
+from analyzer import FaceAnalyzer, create_face_analyzer
+from face_crops import detected_faces, ThumbnailMode
+from image_io import decode_for_detection
+from static_files import StaticSite, respond as respond_static
+from admission import admit, Rejected
+from body_limit import BodySizeLimit
+import contact_sheets
+import photo_files
+import shards
+import zip_jobs
+
+# Global instances (populated in the background after startup)
 face_matcher: FaceMatcher = None
-face_analyzer: FaceAnalysis = None
+face_analyzer: FaceAnalyzer = None
+
+# Startup state of each background component: "loading", "ready", "disabled" or "failed"
+readiness = {"embeddings": "loading", "face_analyzer": "loading" if FACE_DETECTION_ENABLED else "disabled"}
+
 
+async def load_embeddings():
+    global face_matcher
+    try:
+        face_matcher = await asyncio.to_thread(FaceMatcher, DB_PATH)
+        readiness["embeddings"] = "ready"
+    except Exception as e:
+        readiness["embeddings"] = "failed"
+        print(f"Error: failed to load embeddings: {e}")
 
-def init_face_analyzer() -> FaceAnalysis:
-    """Initialize InsightFace analyzer."""
-    print("Loading InsightFace buffalo_l model...")
-    app = FaceAnalysis(name='buffalo_l', providers=['CoreMLExecutionProvider', 'CPUExecutionProvider'])
-    app.prepare(ctx_id=0, det_size=(640, 640))
-    print("✓ Face analyzer ready")
-    return app
+
+async def load_face_analyzer():
+    global face_analyzer
+    try:
+        face_analyzer = await asyncio.to_thread(create_face_analyzer)
+        readiness["face_analyzer"] = "ready"
+    except Exception as e:
+        readiness["face_analyzer"] = "failed"
+        print(f"Error: failed to load face analyzer: {e}")
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    """Startup and shutdown lifecycle."""
-    global face_matcher, face_analyzer
+    """Startup and shutdown lifecycle.
+
+    The server starts accepting connections right away (health checks and
+    static files work immediately); embeddings and the model load
+    concurrently in the background and /ready reports when they are done.
+    """
+    if SHARDED and not SHARD_TOKEN:
+        raise RuntimeError("Sharded mode (SHARD_COUNT > 1 or SHARD_NODES) requires SHARD_TOKEN")
 
     # Initialize database
     init_db(DB_PATH)
+    zip_jobs.prune()
 
-    # Load face matcher with embeddings
-    face_matcher = FaceMatcher(DB_PATH)
-
-    # Initialize face analyzer
-    face_analyzer = init_face_analyzer()
+    loaders = [load_embeddings()]
+    if FACE_DETECTION_ENABLED:
+        loaders.append(load_face_analyzer())
+    warmup = asyncio.gather(*loaders)
 
     yield
 
     # Cleanup
     print("Shutting down...")
+    warmup.cancel()
+    await shards.close()
+    await asyncio.to_thread(shutdown_read_pool)
+
+
+def _require_ready(component: str, description: str):
+    state = readiness[component]
+    if state == "ready":
+        return
+    if state == "disabled":
+        raise HTTPException(503, f"{description} is disabled on this server")
+    if state == "failed":
+        raise HTTPException(503, f"{description} failed to load")
+    raise HTTPException(503, f"{description} is still loading", headers={"Retry-After": "5"})
+
+
+def require_matcher():
+    """Dependency for routes that need the embedding index."""
+    _require_ready("embeddings", "Face index")
+
+
+def require_analyzer():
+    """Dependency for routes that run face detection."""
+    require_matcher()
+    _require_ready("face_analyzer", "Face detection")
 
 
 app = FastAPI(
@@ -78,6 +146,23 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Oversize uploads get 413 while arriving, not after FastAPI has spooled the form
+app.add_middleware(BodySizeLimit, max_bytes=MAX_REQUEST_SIZE)
+
+
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    """Observe request latency per route template (not per raw path)."""
+    start = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    HTTP_REQUEST_SECONDS.observe(
+        time.perf_counter() - start,
+        method=request.method,
+        route=route.path if route else "unmatched",
+        status=response.status_code
+    )
+    return response
 
 
 # ==================== ROUTES ====================
@@ -88,6 +173,28 @@ async def health():
     return {"status": "ok"}
 
 
+@app.get("/ready")
+async def ready():
+    """Readiness check: 200 once embeddings (and the model, if enabled) are loaded."""
+    is_ready = all(state in ("ready", "disabled") for state in readiness.values())
+    return JSONResponse(
+        {"status": "ready" if is_ready else "starting", "components": readiness,
+         "analysis_mode": ANALYSIS_MODE if FACE_DETECTION_ENABLED else None},
+        status_code=200 if is_ready else 503
+    )
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus metrics: per-stage timings, caches, memory-resident state."""
+    if face_matcher is not None:
+        TEMP_FACES.set(len(face_matcher.temp_faces))
+        EMBEDDINGS_LOADED.clear()
+        for name, part in list(face_matcher.partitions.items()):
+            EMBEDDINGS_LOADED.set(len(part.face_ids), collection=name)
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
 # ==================== AUTH ROUTES ====================
 
 def get_base_url(request: Request) -> str:
@@ -159,6 +266,24 @@ def require_auth(session: str = Cookie(None)):
     return user
 
 
+def admission_control(endpoint_class: str):
+    """Dependency holding an admission slot of an endpoint class for the caller.
+
+    Callers are told apart by user when auth is enabled, else by client IP,
+    which is only per client behind a proxy whose X-Forwarded-For uvicorn
+    trusts (FORWARDED_ALLOW_IPS; see the deployment guide).
+    """
+    async def dependency(request: Request, user: dict = Depends(require_auth)):
+        key = user["email"] if AUTH_ENABLED else (request.client.host if request.client else "unknown")
+        try:
+            async with admit(endpoint_class, key):
+                yield
+        except Rejected as e:
+            raise HTTPException(429, f"Too many {endpoint_class} requests ({e.reason}), try again later",
+                                headers={"Retry-After": str(e.retry_after)})
+    return dependency
+
+
 @app.get("/api/auth-status")
 async def get_auth_status():
     """Check if authentication is enabled."""
@@ -178,76 +303,73 @@ async def get_current_user(session: str = Cookie(None)):
     return {"email": user["email"], "name": user["name"], "auth_enabled": True}
 
 
-@app.get("/api/stats", response_model=StatsResponse)
-async def get_statistics():
-    """Get database statistics."""
-    with get_connection(DB_PATH) as conn:
-        stats = get_stats(conn)
-    return StatsResponse(
-        total_photos=stats['total_photos'],
-        total_faces=stats['total_faces'],
-        last_indexed=stats['indexed_at']
-    )
+# Serialized /api/stats body and its ETag, refreshed on reload-embeddings
+_stats_cache: tuple[bytes, str] | None = None
 
 
-@app.post("/api/detect-faces", response_model=DetectFacesResponse)
-async def detect_faces(file: UploadFile = File(...), user: dict = Depends(require_auth)):
+async def load_stats() -> tuple[bytes, str]:
+    """Get the cached stats response, reading the counters on first use."""
+    global _stats_cache
+    if _stats_cache is None:
+        stats = await run_db(get_stats)
+        body = StatsResponse(
+            total_photos=stats['total_photos'],
+            total_faces=stats['total_faces'],
+            last_indexed=stats['indexed_at']
+        ).model_dump_json().encode()
+        _stats_cache = (body, f'"{hashlib.sha1(body).hexdigest()[:16]}"')
+    return _stats_cache
+
+
+@app.get("/api/stats", response_model=StatsResponse)
+async def get_statistics(request: Request):
+    """Get database statistics."""
+    body, etag = await load_stats()
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+
+async def read_upload(file: UploadFile) -> bytes:
+    """Read an uploaded file in chunks, enforcing MAX_UPLOAD_SIZE on the file part.
+
+    The request body as a whole is already capped by BodySizeLimit.
+    """
+    buffer = bytearray()
+    while chunk := await file.read(1024 * 1024):
+        buffer.extend(chunk)
+        if len(buffer) > MAX_UPLOAD_SIZE:
+            raise HTTPException(413, f"Upload exceeds {MAX_UPLOAD_SIZE // (1024 * 1024)}MB")
+    return bytes(buffer)
+
+
+@app.post("/api/detect-faces", response_model=DetectFacesResponse,
+          dependencies=[Depends(require_analyzer), Depends(admission_control("detect"))])
+async def detect_faces(request: Request, file: UploadFile = File(...), thumbnails: ThumbnailMode = "inline",
+                       user: dict = Depends(require_auth)):
     """Upload image, detect faces, return thumbnails with temp IDs."""
-    # Read image
-    contents = await file.read()
-    nparr = np.frombuffer(contents, np.uint8)
-    img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    contents = await read_upload(file)
+    with timed("decode"):
+        decoded = await asyncio.to_thread(decode_for_detection, contents)
 
-    if img is None:
+    if decoded is None:
         raise HTTPException(400, "Invalid image file")
 
-    height, width = img.shape[:2]
+    # Detection runs on a downscaled copy; boxes are mapped back to the upload
+    img, scale, (width, height) = decoded
 
-    # Detect faces
-    faces = face_analyzer.get(img)
+    # Detect and embed faces (ONNX Runtime releases the GIL)
+    with timed("analyze"):
+        faces = await asyncio.to_thread(face_analyzer.get, img)
 
     if not faces:
         raise HTTPException(400, "No faces detected in the image")
 
-    # Process each face
-    result_faces = []
-    for face in faces:
-        bbox = face.bbox.astype(int)
-        x1, y1, x2, y2 = bbox[0], bbox[1], bbox[2], bbox[3]
-
-        # Expand bounding box by 50% on each side for less zoomed-in look
-        face_w, face_h = x2 - x1, y2 - y1
-        pad_x, pad_y = int(face_w * 0.5), int(face_h * 0.5)
-        x1, y1 = x1 - pad_x, y1 - pad_y
-        x2, y2 = x2 + pad_x, y2 + pad_y
-
-        # Clamp to image bounds
-        x1, y1 = max(0, x1), max(0, y1)
-        x2, y2 = min(width, x2), min(height, y2)
-
-        # Skip tiny faces
-        if (x2 - x1) < 30 or (y2 - y1) < 30:
-            continue
-
-        # Crop face with padding and encode as base64
-        crop = img[y1:y2, x1:x2]
-        crop_rgb = cv2.cvtColor(crop, cv2.COLOR_BGR2RGB)
-        pil_img = Image.fromarray(crop_rgb)
-        pil_img.thumbnail((150, 150))
-
-        buffer = BytesIO()
-        pil_img.save(buffer, format="JPEG", quality=85)
-        thumbnail_b64 = base64.b64encode(buffer.getvalue()).decode()
-
-        # Store embedding temporarily
-        temp_id = face_matcher.store_temp_face(face.embedding)
-
-        result_faces.append(DetectedFace(
-            temp_id=temp_id,
-            thumbnail=f"data:image/jpeg;base64,{thumbnail_b64}",
-            bbox=BBox(x=int(x1), y=int(y1), w=int(x2 - x1), h=int(y2 - y1)),
-            score=float(face.det_score)
-        ))
+    # Crop and encode thumbnails for all faces
+    fmt = negotiate_format(request.headers.get("accept"))
+    with timed("face_crops"):
+        result_faces = await detected_faces(img, faces, face_matcher, fmt, thumbnails, scale)
 
     if not result_faces:
         raise HTTPException(400, "No valid faces detected (faces too small)")
@@ -258,128 +380,461 @@ async def detect_faces(file: UploadFile = File(...), user: dict = Depends(requir
     )
 
 
-@app.post("/api/search", response_model=SearchResponse)
+async def require_collection(collection: str):
+    """404 for collections without indexed photos.
+
+    Names come straight from requests; each one searched gets a cached
+    partition and a metrics label, so unknown names must not get that far.
+    """
+    if collection != DEFAULT_COLLECTION and not await run_db(collection_exists, collection):
+        raise HTTPException(404, "Collection not found")
+
+
+@app.post("/api/search", response_model=SearchResponse,
+          dependencies=[Depends(require_matcher), Depends(admission_control("search"))])
 async def search_faces(request: SearchRequest, user: dict = Depends(require_auth)):
     """Search for matching photos using detected face."""
-    matches = face_matcher.search(
-        request.temp_face_id,
-        request.threshold or DEFAULT_THRESHOLD,
-        request.limit or DEFAULT_LIMIT
-    )
-
+    threshold = request.threshold or DEFAULT_THRESHOLD
+    limit = request.limit or DEFAULT_LIMIT
+    collection = request.collection or DEFAULT_COLLECTION
+    await require_collection(collection)
+
+    if SHARD_NODES:
+        embedding = face_matcher.get_temp_embedding(request.temp_face_id)
+        if embedding is None:
+            return SearchResponse(matches=[], total=0)
+        try:
+            matches = await shards.scatter_search(embedding, threshold, limit, collection)
+        except shards.ShardError as e:
+            print(f"Error: shard search failed: {e}")
+            raise HTTPException(502, "Search is temporarily unavailable")
+    else:
+        # The scan (and a first partition load) blocks; keep it off the event loop
+        matches = await asyncio.to_thread(face_matcher.search, request.temp_face_id, threshold, limit,
+                                          collection)
+
+    return await build_search_response(matches, request.collapse_bursts)
+
+
+def require_shard_token(x_shard_token: str = Header(None)):
+    """Dependency for node-to-node routes: the shared SHARD_TOKEN."""
+    if not SHARD_TOKEN or not hmac.compare_digest(x_shard_token or "", SHARD_TOKEN):
+        raise HTTPException(403, "Invalid shard token")
+
+
+async def shard_search(request: ShardSearchRequest):
+    """Search this node's shard with a raw embedding (called by the coordinator)."""
+    try:
+        embedding = shards.decode_embedding(request.embedding)
+    except ValueError as e:
+        raise HTTPException(422, f"Invalid embedding: {e}")
+    await require_collection(request.collection)
+    matches = await asyncio.to_thread(face_matcher.search_embedding, embedding, request.threshold,
+                                      request.limit, request.collection)
+    return ShardSearchResponse(matches=[ShardMatch(**m) for m in matches])
+
+
+async def shard_person(request: ShardPersonRequest):
+    """This node's photos of an identity cluster (called by the coordinator)."""
+    await require_collection(request.collection)
+    matches = await asyncio.to_thread(face_matcher.cluster_matches, request.cluster_id, request.limit,
+                                      request.collection)
+    # Not every shard holds members of every cluster
+    return ShardSearchResponse(matches=[ShardMatch(**m) for m in matches or []])
+
+
+# Node-to-node routes exist only on sharded deployments
+if SHARDED:
+    for path, endpoint in (("/internal/shard-search", shard_search), ("/internal/shard-person", shard_person)):
+        app.post(path, response_model=ShardSearchResponse,
+                 dependencies=[Depends(require_shard_token), Depends(require_matcher)])(endpoint)
+
+
+async def build_search_response(matches: list[dict], collapse_bursts: bool = True) -> SearchResponse:
+    """Attach photo info to ranked face matches.
+
+    With `collapse_bursts`, only the best-matching frame of each burst is
+    returned, carrying the burst's size so the client can expand it.
+    """
     if not matches:
         return SearchResponse(matches=[], total=0)
 
     # Get photo info for matches
     result = []
-    with get_connection(DB_PATH) as conn:
-        for m in matches:
-            photo = get_photo_by_id(conn, m["photo_id"])
-            if photo:
-                result.append(PhotoMatch(
-                    photo_id=m["photo_id"],
-                    similarity=round(m["similarity"], 3),
-                    thumbnail_url=f"/api/photos/{m['photo_id']}/thumbnail",
-                    filename=photo["filename"]
-                ))
+    with timed("photo_lookup"):
+        photos = await run_db(get_photos_by_ids, [m["photo_id"] for m in matches])
+        burst_ids = [p["burst_id"] for p in photos.values() if p.get("burst_id") is not None]
+        burst_sizes = await run_db(get_burst_sizes, burst_ids) if burst_ids else {}
+
+    seen_bursts = set()
+    for m in matches:
+        photo = photos.get(m["photo_id"])
+        if not photo:
+            continue
+        burst_id = photo.get("burst_id")
+        if burst_id is not None and collapse_bursts:
+            if burst_id in seen_bursts:
+                continue
+            seen_bursts.add(burst_id)
+        result.append(PhotoMatch(
+            photo_id=m["photo_id"],
+            face_id=m.get("face_id"),
+            similarity=round(m["similarity"], 3),
+            thumbnail_url=f"/api/photos/{m['photo_id']}/thumbnail",
+            filename=photo["filename"],
+            burst_id=burst_id,
+            burst_size=burst_sizes.get(burst_id, 1)
+        ))
 
     return SearchResponse(matches=result, total=len(result))
 
 
-@app.get("/api/photos/{photo_id}")
-async def get_photo(photo_id: int, user: dict = Depends(require_auth)):
-    """Serve original photo file."""
-    with get_connection(DB_PATH) as conn:
-        photo = get_photo_by_id(conn, photo_id)
+@app.get("/api/bursts/{burst_id}", response_model=BurstResponse)
+async def get_burst(burst_id: int, user: dict = Depends(require_auth)):
+    """All frames of a burst, to expand a collapsed search result."""
+    photos = await run_db(get_burst_photos, burst_id)
+    if not photos:
+        raise HTTPException(404, "Burst not found")
+    return BurstResponse(burst_id=burst_id, photos=[
+        BurstPhoto(photo_id=p["id"], filename=p["filename"], thumbnail_url=f"/api/photos/{p['id']}/thumbnail")
+        for p in photos
+    ])
+
+
+@app.get("/api/collections", response_model=CollectionsResponse)
+async def list_collections(user: dict = Depends(require_auth)):
+    """List indexed collections (events)."""
+    rows = await run_db(get_collections)
+    return CollectionsResponse(collections=[
+        Collection(name=r["collection"], photos=r["photos"], faces=r["faces"]) for r in rows
+    ])
+
+
+@app.get("/api/people", response_model=PeopleResponse)
+async def list_people(collection: str = DEFAULT_COLLECTION, min_size: int = 2, limit: int = 50,
+                      offset: int = 0, user: dict = Depends(require_auth)):
+    """Browse precomputed identity clusters, largest first."""
+    rows = await run_db(get_people, collection, min_size, limit, offset)
+
+    people = [Person(
+        cluster_id=r["cluster_id"],
+        size=r["size"],
+        photo_id=r["photo_id"],
+        bbox=BBox(x=r["bbox_x"], y=r["bbox_y"], w=r["bbox_w"], h=r["bbox_h"]),
+        thumbnail_url=f"/api/photos/{r['photo_id']}/thumbnail"
+    ) for r in rows]
+    return PeopleResponse(people=people, total=len(people))
+
+
+@app.get("/api/people/{cluster_id}", response_model=SearchResponse, dependencies=[Depends(require_matcher)])
+async def get_person_photos(cluster_id: int, collection: str = DEFAULT_COLLECTION,
+                            limit: int = Query(200, ge=1, le=MAX_SEARCH_LIMIT),
+                            user: dict = Depends(require_auth)):
+    """Photos of one identity cluster (gathered from every shard when sharded)."""
+    await require_collection(collection)
+    if SHARD_NODES:
+        try:
+            matches = await shards.scatter_person(cluster_id, limit, collection)
+        except shards.ShardError as e:
+            print(f"Error: shard person lookup failed: {e}")
+            raise HTTPException(502, "People are temporarily unavailable")
+    else:
+        matches = await asyncio.to_thread(face_matcher.cluster_matches, cluster_id, limit, collection)
+    if not matches:
+        raise HTTPException(404, "Person not found")
+    return await build_search_response(matches)
 
-    if not photo:
-        raise HTTPException(404, "Photo not found")
 
-    path = Path(photo["path"])
-    if not path.exists():
+@app.get("/api/photos/{photo_id}")
+async def get_photo(photo_id: int, request: Request, user: dict = Depends(require_auth)):
+    """Serve original photo file.
+
+    Originals never change once indexed, so responses carry a strong
+    content-hash ETag and an immutable Cache-Control, and support
+    conditional GET and single byte ranges for resumable downloads.
+    """
+    entry = photo_files.lookup(photo_id)
+    if entry is None:
+        photo = await run_db(get_photo_by_id, photo_id)
+        if not photo:
+            raise HTTPException(404, "Photo not found")
+        try:
+            entry = await asyncio.to_thread(
+                photo_files.resolve, photo_id, Path(photo["path"]), photo["filename"]
+            )
+        except FileNotFoundError:
+            raise HTTPException(404, "Photo file not found")
+
+    headers = {
+        "ETag": entry.etag,
+        "Cache-Control": f"{'private' if AUTH_ENABLED else 'public'}, max-age=31536000, immutable",
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": photo_files.content_disposition(entry.filename),
+    }
+    if request.headers.get("if-none-match") == entry.etag:
+        return Response(status_code=304, headers=headers)
+
+    # A stale If-Range validator means the client's partial copy is outdated
+    byte_range = None
+    if_range = request.headers.get("if-range")
+    if if_range is None or if_range == entry.etag:
+        try:
+            byte_range = photo_files.parse_range(request.headers.get("range"), entry.size)
+        except photo_files.RangeNotSatisfiable:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{entry.size}"})
+
+    start, end, status = 0, entry.size - 1, 200
+    if byte_range is not None:
+        start, end = byte_range
+        status = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{entry.size}"
+    headers["Content-Length"] = str(end - start + 1)
+
+    try:
+        body = await asyncio.to_thread(photo_files.open_range, entry.path, start, end - start + 1)
+    except FileNotFoundError:
+        photo_files.forget(photo_id)
         raise HTTPException(404, "Photo file not found")
 
-    return FileResponse(
-        path,
-        media_type="image/jpeg",
-        filename=photo["filename"]
+    return StreamingResponse(
+        body,
+        status_code=status,
+        media_type=entry.media_type,
+        headers=headers,
     )
 
 
 @app.get("/api/photos/{photo_id}/thumbnail")
-async def get_photo_thumbnail(photo_id: int, size: int = 300, user: dict = Depends(require_auth)):
-    """Serve photo thumbnail."""
-    with get_connection(DB_PATH) as conn:
-        photo = get_photo_by_id(conn, photo_id)
+async def get_photo_thumbnail(photo_id: int, request: Request, size: int = 300,
+                              user: dict = Depends(require_auth)):
+    """Serve photo thumbnail.
+
+    Rendering runs on a bounded thread pool; concurrent requests for the same
+    (photo_id, size, format) share a single decode and results are cached.
+    AVIF or WebP is returned when the Accept header allows it.
+    """
+    size = max(16, min(size, MAX_THUMBNAIL_SIZE))
+    with timed("photo_lookup"):
+        photo = await run_db(get_photo_by_id, photo_id)
 
     if not photo:
         raise HTTPException(404, "Photo not found")
 
     path = Path(photo["path"])
-    if not path.exists():
+    fmt = negotiate_format(request.headers.get("accept"))
+    try:
+        data = await get_thumbnail(photo_id, path, size, fmt)
+    except FileNotFoundError:
         raise HTTPException(404, "Photo file not found")
 
-    # Generate thumbnail
-    img = Image.open(path)
-    img.thumbnail((size, size))
-
-    buffer = BytesIO()
-    img.save(buffer, format="JPEG", quality=85)
-    buffer.seek(0)
+    return Response(data, media_type=media_type(fmt), headers={"Vary": "Accept"})
+
+
+@app.get("/api/faces/{temp_id}/thumbnail")
+async def get_detected_face_thumbnail(temp_id: str, request: Request, user: dict = Depends(require_auth)):
+    """Serve the crop of a face detected with `thumbnails=url`."""
+    fmt = negotiate_format(request.headers.get("accept"))
+    data = await get_face_thumbnail(temp_id, fmt)
+    if data is None:
+        raise HTTPException(404, "Face not found or expired")
+    return Response(data, media_type=media_type(fmt), headers={
+        "Vary": "Accept",
+        "Cache-Control": f"private, max-age={TEMP_FACE_TTL}",
+    })
+
+
+@app.post("/api/faces/boxes", response_model=FaceBoxesResponse)
+async def get_faces_boxes(request: FaceBoxesRequest, user: dict = Depends(require_auth)):
+    """Face boxes of many photos in one call, e.g. to highlight matched faces on a result page.
+
+    Served from a covering index; embeddings are never read.
+    """
+    if len(request.photo_ids) > MAX_FACE_BOX_PHOTOS:
+        raise HTTPException(400, f"Maximum {MAX_FACE_BOX_PHOTOS} photos per request")
+    with timed("face_boxes"):
+        boxes = await run_db(get_face_boxes, request.photo_ids)
+    return FaceBoxesResponse(faces={
+        photo_id: [
+            FaceBox(face_id=f["id"], bbox=BBox(x=f["bbox_x"], y=f["bbox_y"], w=f["bbox_w"], h=f["bbox_h"]),
+                    score=f["detection_score"])
+            for f in faces
+        ]
+        for photo_id, faces in boxes.items()
+    })
+
+
+async def resolve_sheet(photo_ids: list[int], tile: int, columns: int,
+                        collection: Optional[str]) -> tuple[list[dict], int, int]:
+    """Validate a contact sheet request; photos that no longer exist are left out."""
+    if not photo_ids:
+        raise HTTPException(400, "No photo IDs provided")
+    if len(photo_ids) > MAX_CONTACT_SHEET_PHOTOS:
+        raise HTTPException(400, f"Maximum {MAX_CONTACT_SHEET_PHOTOS} photos per contact sheet")
+    tile = max(32, min(tile, MAX_CONTACT_SHEET_TILE))
+    columns = max(1, min(columns, 20))
 
-    return StreamingResponse(buffer, media_type="image/jpeg")
+    with timed("photo_lookup"):
+        records = await run_db(get_photos_by_ids, photo_ids)
+    photos = []
+    for pid in dict.fromkeys(photo_ids):
+        photo = records.get(pid)
+        if photo and (not collection or photo["collection"] == collection):
+            photos.append({"photo_id": pid, "path": Path(photo["path"])})
+    if not photos:
+        raise HTTPException(404, "No valid photos found")
+    return photos, tile, columns
+
+
+@app.post("/api/contact-sheets", response_model=ContactSheet)
+async def create_contact_sheet(request: ContactSheetRequest, user: dict = Depends(require_auth)):
+    """Lay out a result page as one sprite; returns tile offsets and the sheet URL.
+
+    Lets a gallery paint every thumbnail of a page with a single image request.
+    """
+    photos, tile, columns = await resolve_sheet(request.photo_ids, request.tile, request.columns,
+                                                request.collection)
+    ids = [p["photo_id"] for p in photos]
+    width, height, tiles = contact_sheets.layout(ids, tile, columns)
+    params = {"ids": ",".join(map(str, ids)), "tile": tile, "columns": columns}
+    if request.collection:
+        params["collection"] = request.collection
+    return ContactSheet(
+        url=f"/api/contact-sheet?{urlencode(params, safe=',')}",
+        width=width,
+        height=height,
+        tile=tile,
+        columns=min(columns, len(ids)),
+        tiles=[SheetTile(**t) for t in tiles]
+    )
 
 
-@app.post("/api/download-zip")
-async def download_zip(request: DownloadRequest, user: dict = Depends(require_auth)):
-    """Generate ZIP of selected photos."""
+@app.get("/api/contact-sheet")
+async def get_contact_sheet(request: Request, ids: str, tile: int = 300, columns: int = 5,
+                            collection: Optional[str] = None, user: dict = Depends(require_auth)):
+    """Serve a contact sheet image (AVIF/WebP/JPEG by Accept), cached per result set."""
+    try:
+        photo_ids = [int(pid) for pid in ids.split(",") if pid]
+    except ValueError:
+        raise HTTPException(400, "Invalid photo IDs")
+    photos, tile, columns = await resolve_sheet(photo_ids, tile, columns, collection)
+
+    fmt = negotiate_format(request.headers.get("accept"))
+    key = contact_sheets.sheet_key([p["photo_id"] for p in photos], tile, columns)
+    headers = {
+        "ETag": f'"{key}-{fmt}"',
+        "Vary": "Accept",
+        "Cache-Control": "private, max-age=3600",
+    }
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+
+    data = await contact_sheets.get_sheet(photos, tile, columns, fmt)
+    return Response(data, media_type=media_type(fmt), headers=headers)
+
+
+async def resolve_download(request: DownloadRequest) -> list[dict]:
+    """Validate a download selection and look up its files."""
     if not request.photo_ids:
         raise HTTPException(400, "No photo IDs provided")
 
-    if len(request.photo_ids) > 200:
-        raise HTTPException(400, "Maximum 200 photos per download")
+    if len(request.photo_ids) > MAX_DOWNLOAD_PHOTOS:
+        raise HTTPException(400, f"Maximum {MAX_DOWNLOAD_PHOTOS} photos per download")
 
-    # Get photo paths
+    # Get photo paths (missing files are skipped while building the archive)
+    with timed("photo_lookup"):
+        records = await run_db(get_photos_by_ids, request.photo_ids)
     photos = []
-    with get_connection(DB_PATH) as conn:
-        for pid in request.photo_ids:
-            photo = get_photo_by_id(conn, pid)
-            if photo:
-                path = Path(photo["path"])
-                if path.exists():
-                    photos.append({"path": path, "filename": photo["filename"]})
+    for pid in dict.fromkeys(request.photo_ids):
+        photo = records.get(pid)
+        if photo and (not request.collection or photo["collection"] == request.collection):
+            photos.append({"photo_id": pid, "path": Path(photo["path"]), "filename": photo["filename"]})
 
     if not photos:
         raise HTTPException(404, "No valid photos found")
+    return photos
 
-    # Create ZIP in memory
-    buffer = BytesIO()
-    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
-        for photo in photos:
-            zf.write(photo["path"], photo["filename"])
 
-    buffer.seek(0)
-
-    return StreamingResponse(
-        buffer,
-        media_type="application/zip",
-        headers={"Content-Disposition": "attachment; filename=yep-photos.zip"}
+def download_job_response(job: zip_jobs.ZipJob) -> DownloadJob:
+    return DownloadJob(
+        job_id=job.id,
+        status=job.status,
+        photo_count=job.photo_count,
+        size=job.size,
+        download_url=f"/api/download-jobs/{job.id}/file" if job.status == "ready" else None,
+        error=job.error
     )
 
 
-@app.post("/api/reload-embeddings")
+async def archive_response(job: zip_jobs.ZipJob) -> FileResponse:
+    """Serve a finished archive, or 410 if it was evicted since it was built."""
+    if not await asyncio.to_thread(zip_jobs.touch, job.path):
+        zip_jobs.forget(job.id)
+        raise HTTPException(410, "Archive expired, request the download again")
+    return FileResponse(job.path, media_type="application/zip", filename="yep-photos.zip")
+
+
+@app.post("/api/download-jobs", response_model=DownloadJob, status_code=202,
+          dependencies=[Depends(admission_control("download"))])
+async def create_download_job(request: DownloadRequest, user: dict = Depends(require_auth)):
+    """Queue a ZIP of selected photos; identical selections reuse one archive."""
+    job = zip_jobs.submit(await resolve_download(request))
+    return download_job_response(job)
+
+
+@app.get("/api/download-jobs/{job_id}", response_model=DownloadJob)
+async def get_download_job(job_id: str, user: dict = Depends(require_auth)):
+    """Poll a download job."""
+    job = zip_jobs.get_job(job_id)
+    if job is None:
+        raise HTTPException(404, "Download job not found or expired")
+    return download_job_response(job)
+
+
+@app.get("/api/download-jobs/{job_id}/file")
+async def get_download_job_file(job_id: str, user: dict = Depends(require_auth)):
+    """Download a finished archive."""
+    job = zip_jobs.get_job(job_id)
+    if job is None:
+        raise HTTPException(404, "Download job not found or expired")
+    if job.status != "ready":
+        raise HTTPException(409, f"Download job is {job.status}")
+    return await archive_response(job)
+
+
+@app.post("/api/download-zip", dependencies=[Depends(admission_control("download"))])
+async def download_zip(request: DownloadRequest, user: dict = Depends(require_auth)):
+    """Generate ZIP of selected photos.
+
+    Goes through the download job queue, so repeated selections are served
+    from the cached archive.
+    """
+    job = await zip_jobs.wait(zip_jobs.submit(await resolve_download(request)))
+    if job.status != "ready":
+        raise HTTPException(500, "Failed to build archive")
+    return await archive_response(job)
+
+
+@app.post("/api/reload-embeddings", dependencies=[Depends(require_matcher)])
 async def reload_embeddings():
     """Reload embeddings from database (use after re-indexing)."""
-    face_matcher.reload_embeddings()
-    return {"status": "ok", "total_faces": len(face_matcher.face_ids)}
+    global _stats_cache
+    close_read_connections()
+    await asyncio.to_thread(face_matcher.reload_embeddings)
+    clear_thumbnail_cache()
+    contact_sheets.clear_cache()
+    photo_files.clear_cache()
+    _stats_cache = None
+    return {"status": "ok", "total_faces": face_matcher.total_faces}
 
 
 # ==================== PRESET ENDPOINTS ====================
 
 PRESETS_DIR = Path(__file__).parent.parent / "data" / "presets"
 
-@app.get("/api/presets/finos", response_model=DetectFacesResponse)
-async def get_finos_preset(user: dict = Depends(require_auth)):
+@app.get("/api/presets/finos", response_model=DetectFacesResponse,
+         dependencies=[Depends(require_analyzer), Depends(admission_control("detect"))])
+async def get_finos_preset(request: Request, thumbnails: ThumbnailMode = "inline",
+                           user: dict = Depends(require_auth)):
     """Get pre-detected faces from FinOS team photo."""
     preset_path = PRESETS_DIR / "finos.jpg"
 
@@ -387,57 +842,21 @@ async def get_finos_preset(user: dict = Depends(require_auth)):
         raise HTTPException(404, "FinOS preset image not found")
 
     # Load image
-    img = cv2.imread(str(preset_path))
-    if img is None:
+    decoded = await asyncio.to_thread(decode_for_detection, preset_path.read_bytes(), PRESET_DETECT_MAX_SIDE)
+    if decoded is None:
         raise HTTPException(500, "Failed to load preset image")
 
-    height, width = img.shape[:2]
+    img, scale, (width, height) = decoded
 
     # Detect faces
-    faces = face_analyzer.get(img)
+    faces = await asyncio.to_thread(face_analyzer.get, img)
 
     if not faces:
         raise HTTPException(500, "No faces detected in preset image")
 
-    # Process each face
-    result_faces = []
-    for face in faces:
-        bbox = face.bbox.astype(int)
-        x1, y1, x2, y2 = bbox[0], bbox[1], bbox[2], bbox[3]
-
-        # Expand bounding box by 50% on each side for less zoomed-in look
-        face_w, face_h = x2 - x1, y2 - y1
-        pad_x, pad_y = int(face_w * 0.5), int(face_h * 0.5)
-        x1, y1 = x1 - pad_x, y1 - pad_y
-        x2, y2 = x2 + pad_x, y2 + pad_y
-
-        # Clamp to image bounds
-        x1, y1 = max(0, x1), max(0, y1)
-        x2, y2 = min(width, x2), min(height, y2)
-
-        # Skip tiny faces
-        if (x2 - x1) < 30 or (y2 - y1) < 30:
-            continue
-
-        # Crop face with padding and encode as base64
-        crop = img[y1:y2, x1:x2]
-        crop_rgb = cv2.cvtColor(crop, cv2.COLOR_BGR2RGB)
-        pil_img = Image.fromarray(crop_rgb)
-        pil_img.thumbnail((150, 150))
-
-        buffer = BytesIO()
-        pil_img.save(buffer, format="JPEG", quality=85)
-        thumbnail_b64 = base64.b64encode(buffer.getvalue()).decode()
-
-        # Store embedding temporarily
-        temp_id = face_matcher.store_temp_face(face.embedding)
-
-        result_faces.append(DetectedFace(
-            temp_id=temp_id,
-            thumbnail=f"data:image/jpeg;base64,{thumbnail_b64}",
-            bbox=BBox(x=int(x1), y=int(y1), w=int(x2 - x1), h=int(y2 - y1)),
-            score=float(face.det_score)
-        ))
+    # Crop and encode thumbnails for all faces
+    fmt = negotiate_format(request.headers.get("accept"))
+    result_faces = await detected_faces(img, faces, face_matcher, fmt, thumbnails, scale)
 
     # Sort by x position (left to right)
     result_faces.sort(key=lambda f: f.bbox.x)
@@ -451,20 +870,18 @@ async def get_finos_preset(user: dict = Depends(require_auth)):
 # Serve frontend static files
 STATIC_DIR = Path(__file__).parent.parent / "frontend" / "dist"
 if STATIC_DIR.exists():
-    app.mount("/assets", StaticFiles(directory=STATIC_DIR / "assets"), name="assets")
-
-    @app.get("/", response_class=HTMLResponse)
-    async def serve_frontend():
-        """Serve frontend index.html."""
-        return (STATIC_DIR / "index.html").read_text()
+    static_site = StaticSite(STATIC_DIR)
 
     @app.get("/{path:path}")
-    async def serve_static(path: str):
-        """Serve static files or fallback to index.html for SPA routing."""
-        file_path = STATIC_DIR / path
-        if file_path.exists() and file_path.is_file():
-            return FileResponse(file_path)
-        return HTMLResponse((STATIC_DIR / "index.html").read_text())
+    async def serve_static(path: str, request: Request):
+        """Serve the built frontend from memory; unknown paths get index.html for SPA routing."""
+        asset = await static_site.get(path or "index.html")
+        # A missing hashed asset must not be answered with HTML
+        if asset is None and not path.startswith("assets/"):
+            asset = await static_site.get("index.html")
+        if asset is None:
+            raise HTTPException(404, "Not found")
+        return respond_static(asset, request)
 
 
 if __name__ == "__main__":
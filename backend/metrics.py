@@ -0,0 +1,160 @@
+"""Prometheus-style metrics (text exposition format) without external dependencies."""
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_registry: list["_Metric"] = []
+
+
+def _escape(value: str) -> str:
+    """Escape a label value as the text exposition format requires."""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    parts = [f'{k}="{_escape(v)}"' for k, v in zip(labelnames, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: dict[tuple, object] = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def clear(self):
+        """Drop all label sets (e.g. for gauges of evicted collections)."""
+        with self._lock:
+            self._values.clear()
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_sample(key, value))
+        return lines
+
+    def _render_sample(self, key: tuple, value) -> list[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0, 0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+            state[1] += 1
+            state[2] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def totals(self, **labels) -> tuple[int, float]:
+        """Observation count and sum for a label set."""
+        with self._lock:
+            state = self._values.get(self._key(labels))
+        return (state[1], state[2]) if state else (0, 0.0)
+
+    def _render_sample(self, key: tuple, value) -> list[str]:
+        counts, count, total = value
+        lines = []
+        for bound, bucket_count in zip(self.buckets, counts):
+            labels = _format_labels(self.labelnames, key, f'le="{bound}"')
+            lines.append(f"{self.name}_bucket{labels} {bucket_count}")
+        labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+        lines.append(f"{self.name}_bucket{labels} {count}")
+        plain = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{plain} {total}")
+        lines.append(f"{self.name}_count{plain} {count}")
+        return lines
+
+
+def render() -> str:
+    """Render all registered metrics in Prometheus text format."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def write_textfile(path: Path):
+    """Write metrics for the node_exporter textfile collector (used by the indexer)."""
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(render())
+    tmp.replace(path)
+
+
+# ==================== METRICS ====================
+
+STAGE_SECONDS = Histogram("yep_stage_seconds", "Time spent per processing stage", ("stage",))
+HTTP_REQUEST_SECONDS = Histogram(
+    "yep_http_request_seconds", "HTTP request latency by route", ("method", "route", "status")
+)
+CACHE_REQUESTS = Counter("yep_cache_requests_total", "Cache lookups by result", ("cache", "result"))
+TEMP_FACES = Gauge("yep_temp_faces", "Temporary face embeddings held in memory")
+EMBEDDINGS_LOADED = Gauge("yep_embeddings_loaded", "Face embeddings loaded per collection", ("collection",))
+INDEXER_PHOTOS = Counter("yep_indexer_photos_total", "Photos handled by the indexer", ("result",))
+INDEXER_FACES = Counter("yep_indexer_faces_total", "Faces written by the indexer")
+INDEXER_THROUGHPUT = Gauge("yep_indexer_photos_per_second", "Indexer throughput of the last run")
+ADMISSION_REJECTIONS = Counter("yep_admission_rejections_total", "Requests refused with 429",
+                              ("endpoint_class", "reason"))
+ADMISSION_IN_FLIGHT = Gauge("yep_admission_in_flight", "Admitted requests running per endpoint class",
+                            ("endpoint_class",))
+ANALYZER_STARTUP_SECONDS = Gauge("yep_analyzer_startup_seconds", "Time to load the face analysis models")
+
+
+def timed(stage: str):
+    """Context manager recording the duration of a processing stage."""
+    return STAGE_SECONDS.time(stage=stage)
+
+
+def record_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
@@ -1,7 +1,9 @@
 """Pydantic models for API request/response."""
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional
 
+from config import MAX_SEARCH_LIMIT
+
 
 class BBox(BaseModel):
     x: int
@@ -12,7 +14,7 @@ class BBox(BaseModel):
 
 class DetectedFace(BaseModel):
     temp_id: str
-    thumbnail: str  # base64 data URL
+    thumbnail: str  # base64 data URL, or a URL with ?thumbnails=url
     bbox: BBox
     score: float
 
@@ -29,15 +31,69 @@ class DetectFacesResponse(BaseModel):
 
 class SearchRequest(BaseModel):
     temp_face_id: str
-    threshold: float = 0.5
-    limit: int = 50
+    # Bounded like ShardSearchRequest, which the coordinator forwards them in
+    threshold: float = Field(0.5, ge=0, le=1)
+    limit: int = Field(50, ge=1, le=MAX_SEARCH_LIMIT)
+    collection: Optional[str] = None
+    collapse_bursts: bool = True  # one result per burst of near-duplicate frames
+
+
+class ShardSearchRequest(BaseModel):
+    embedding: str  # base64 of the float32 query embedding
+    threshold: float = Field(ge=0, le=1)
+    limit: int = Field(ge=1, le=MAX_SEARCH_LIMIT)
+    collection: str
+
+
+class ShardPersonRequest(BaseModel):
+    cluster_id: int
+    limit: int = Field(ge=1, le=MAX_SEARCH_LIMIT)
+    collection: str
+
+
+class ShardMatch(BaseModel):
+    face_id: int
+    photo_id: int
+    similarity: float
+
+
+class ShardSearchResponse(BaseModel):
+    matches: list[ShardMatch]
 
 
 class PhotoMatch(BaseModel):
     photo_id: int
+    face_id: Optional[int] = None  # the matched face, see /api/faces/boxes
     similarity: float
     thumbnail_url: str
     filename: str
+    burst_id: Optional[int] = None  # expand with /api/bursts/{burst_id}
+    burst_size: int = 1
+
+
+class FaceBoxesRequest(BaseModel):
+    photo_ids: list[int]
+
+
+class FaceBox(BaseModel):
+    face_id: int
+    bbox: BBox
+    score: Optional[float] = None
+
+
+class FaceBoxesResponse(BaseModel):
+    faces: dict[int, list[FaceBox]]  # photo_id -> boxes; photos without faces are omitted
+
+
+class BurstPhoto(BaseModel):
+    photo_id: int
+    filename: str
+    thumbnail_url: str
+
+
+class BurstResponse(BaseModel):
+    burst_id: int
+    photos: list[BurstPhoto]
 
 
 class SearchResponse(BaseModel):
@@ -45,11 +101,68 @@ class SearchResponse(BaseModel):
     total: int
 
 
+class ContactSheetRequest(BaseModel):
+    photo_ids: list[int]
+    tile: int = 300
+    columns: int = 5
+    collection: Optional[str] = None
+
+
+class SheetTile(BaseModel):
+    photo_id: int
+    x: int
+    y: int
+    w: int
+    h: int
+
+
+class ContactSheet(BaseModel):
+    url: str
+    width: int
+    height: int
+    tile: int
+    columns: int
+    tiles: list[SheetTile]
+
+
 class DownloadRequest(BaseModel):
     photo_ids: list[int]
+    collection: Optional[str] = None
+
+
+class DownloadJob(BaseModel):
+    job_id: str
+    status: str  # queued, running, ready, failed
+    photo_count: int
+    size: int = 0
+    download_url: Optional[str] = None
+    error: Optional[str] = None
 
 
 class StatsResponse(BaseModel):
     total_photos: int
     total_faces: int
     last_indexed: Optional[str]
+
+
+class Person(BaseModel):
+    cluster_id: int
+    size: int
+    photo_id: int
+    bbox: BBox
+    thumbnail_url: str
+
+
+class PeopleResponse(BaseModel):
+    people: list[Person]
+    total: int
+
+
+class Collection(BaseModel):
+    name: str
+    photos: int
+    faces: int
+
+
+class CollectionsResponse(BaseModel):
+    collections: list[Collection]
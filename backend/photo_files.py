@@ -0,0 +1,143 @@
+"""Original photo delivery: cached file metadata, strong ETags and byte ranges."""
+import hashlib
+import mimetypes
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator, Optional
+from urllib.parse import quote
+
+from config import PHOTO_CACHE_ENTRIES
+from metrics import timed, record_cache
+
+CHUNK_SIZE = 256 * 1024
+
+
+@dataclass
+class PhotoFile:
+    """Resolved on-disk original of an indexed photo."""
+    path: Path
+    filename: str
+    size: int
+    mtime: float
+    media_type: str
+    etag: Optional[str] = None
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+_files: OrderedDict[int, PhotoFile] = OrderedDict()
+_lock = threading.Lock()
+
+
+def lookup(photo_id: int) -> Optional[PhotoFile]:
+    """Cached metadata for a photo, if it was served before."""
+    with _lock:
+        entry = _files.get(photo_id)
+        if entry is not None:
+            _files.move_to_end(photo_id)
+    record_cache("photo_files", entry is not None)
+    return entry
+
+
+def resolve(photo_id: int, path: Path, filename: str) -> PhotoFile:
+    """Stat a photo's file, hash its content and cache the result (blocking).
+
+    Raises FileNotFoundError if the original is gone.
+    """
+    st = path.stat()
+    media_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    entry = PhotoFile(path, filename, st.st_size, st.st_mtime, media_type)
+    entry.etag = content_etag(path)
+    with _lock:
+        _files[photo_id] = entry
+        while len(_files) > PHOTO_CACHE_ENTRIES:
+            _files.popitem(last=False)
+    return entry
+
+
+def forget(photo_id: int):
+    with _lock:
+        _files.pop(photo_id, None)
+
+
+def clear_cache():
+    """Drop cached metadata (after re-indexing)."""
+    with _lock:
+        _files.clear()
+
+
+def content_etag(path: Path) -> str:
+    """Strong ETag from a hash of the file content."""
+    with timed("photo_hash"):
+        digest = hashlib.blake2b(digest_size=16)
+        with open(path, "rb") as f:
+            while chunk := f.read(1024 * 1024):
+                digest.update(chunk)
+    return f'"{digest.hexdigest()}"'
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[tuple[int, int]]:
+    """Parse a single `bytes=` range into an inclusive (start, end).
+
+    Returns None when the whole file should be sent (no header, malformed or
+    multi-range requests) and raises RangeNotSatisfiable for ranges past EOF,
+    which includes every range of an empty file.
+    """
+    if not header or not header.startswith("bytes="):
+        return None
+    spec = header[len("bytes="):].strip()
+    if "," in spec or "-" not in spec:
+        return None
+
+    first, last = (part.strip() for part in spec.split("-", 1))
+    try:
+        if not first:
+            # Suffix range: the last N bytes
+            length = int(last)
+            if length <= 0 or size == 0:
+                raise RangeNotSatisfiable()
+            return max(0, size - length), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+
+    if start >= size:
+        raise RangeNotSatisfiable()
+    if end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+def open_range(path: Path, start: int, length: int) -> Iterator[bytes]:
+    """Open a photo and yield `length` bytes from `start` in chunks (blocking).
+
+    The file is opened eagerly so a missing original raises FileNotFoundError
+    before the response starts; chunks are read in Starlette's threadpool.
+    """
+    f = open(path, "rb")
+    f.seek(start)
+
+    def chunks():
+        remaining = length
+        with f:
+            while remaining > 0:
+                chunk = f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+    return chunks()
+
+
+def content_disposition(filename: str) -> str:
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"attachment; filename*=utf-8''{quoted}"
+    return f'attachment; filename="{filename}"'
+
@@ -0,0 +1,103 @@
+"""Scatter-gather search over shard nodes.
+
+Faces are sharded by photo_id, so each photo's faces live on exactly one
+node and per-photo deduplication is already complete in every shard's
+result; merging is a top-k over the union.
+"""
+import asyncio
+import base64
+import heapq
+from typing import Optional
+
+import httpx
+import numpy as np
+
+from config import SHARD_NODES, SHARD_TOKEN, SHARD_TIMEOUT
+from metrics import timed
+
+EMBEDDING_DIM = 512
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+class ShardError(Exception):
+    pass
+
+
+def encode_embedding(embedding: np.ndarray) -> str:
+    return base64.b64encode(np.asarray(embedding, dtype=np.float32).tobytes()).decode()
+
+
+def decode_embedding(data: str) -> np.ndarray:
+    """Decode a query embedding; ValueError unless it is EMBEDDING_DIM finite float32 values."""
+    raw = base64.b64decode(data, validate=True)
+    if len(raw) != EMBEDDING_DIM * 4:
+        raise ValueError(f"expected {EMBEDDING_DIM} float32 values, got {len(raw)} bytes")
+    embedding = np.frombuffer(raw, dtype=np.float32)
+    if not np.isfinite(embedding).all():
+        raise ValueError("embedding has non-finite values")
+    return embedding
+
+
+def _get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None:
+        headers = {"X-Shard-Token": SHARD_TOKEN} if SHARD_TOKEN else {}
+        _client = httpx.AsyncClient(timeout=SHARD_TIMEOUT, headers=headers,
+                                    limits=httpx.Limits(max_keepalive_connections=4 * len(SHARD_NODES)))
+    return _client
+
+
+async def _query(node: str, path: str, payload: dict) -> list[dict]:
+    try:
+        resp = await _get_client().post(f"{node}{path}", json=payload)
+        resp.raise_for_status()
+    except httpx.HTTPError as e:
+        raise ShardError(f"{node}: {e}") from e
+    return resp.json()["matches"]
+
+
+async def _scatter(path: str, payload: dict, limit: int) -> list[dict]:
+    """POST to every shard node and merge their per-photo best matches.
+
+    Raises ShardError if any shard fails, rather than returning results
+    silently missing part of the archive.
+    """
+    with timed("shard_fanout"):
+        results = await asyncio.gather(*(_query(node, path, payload) for node in SHARD_NODES),
+                                       return_exceptions=True)
+    failures = [r for r in results if isinstance(r, BaseException)]
+    if failures:
+        raise ShardError("; ".join(str(f) for f in failures))
+
+    with timed("shard_merge"):
+        return heapq.nlargest(limit, (m for matches in results for m in matches),
+                              key=lambda m: m["similarity"])
+
+
+async def scatter_search(embedding: np.ndarray, threshold: float, limit: int, collection: str) -> list[dict]:
+    """Search every shard node with a query embedding."""
+    payload = {
+        "embedding": encode_embedding(embedding),
+        "threshold": threshold,
+        "limit": limit,
+        "collection": collection,
+    }
+    return await _scatter("/internal/shard-search", payload, limit)
+
+
+async def scatter_person(cluster_id: int, limit: int, collection: str) -> list[dict]:
+    """Photos of an identity cluster from every shard node.
+
+    Each node ranks its members against its own part of the cluster, so the
+    merged order is approximate; the set of photos is complete.
+    """
+    payload = {"cluster_id": cluster_id, "limit": limit, "collection": collection}
+    return await _scatter("/internal/shard-person", payload, limit)
+
+
+async def close():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
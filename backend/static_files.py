@@ -0,0 +1,128 @@
+"""In-memory serving of the built frontend with precompressed variants.
+
+Files of frontend/dist are read once, compressed once (gzip, plus brotli
+when the `brotli` package is installed or a prebuilt .br file exists) and
+served from memory. Vite puts content-hashed files under assets/, so those
+are cached as immutable; everything else (index.html) is revalidated by ETag.
+"""
+import asyncio
+import gzip
+import hashlib
+import mimetypes
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+from fastapi import Request, Response
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Smaller files gain too little from compression to be worth a variant
+MIN_COMPRESS_SIZE = 1024
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml",
+                      "application/manifest+json", "application/wasm")
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+
+@dataclass
+class StaticAsset:
+    """One file of the build with its encoded variants."""
+    body: bytes
+    media_type: str
+    etag: str
+    cache_control: str
+    encodings: dict[str, bytes] = field(default_factory=dict)  # "br"/"gzip" -> body
+
+
+def _compressible(media_type: str) -> bool:
+    return media_type.startswith(COMPRESSIBLE_TYPES)
+
+
+def load_asset(path: Path, relative: str) -> StaticAsset:
+    """Read and precompress a file (blocking)."""
+    body = path.read_bytes()
+    media_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+    if media_type.startswith("text/") or media_type == "application/javascript":
+        media_type += "; charset=utf-8"
+    asset = StaticAsset(
+        body=body,
+        media_type=media_type,
+        etag=f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"',
+        cache_control=IMMUTABLE if relative.startswith("assets/") else REVALIDATE,
+    )
+    if len(body) < MIN_COMPRESS_SIZE or not _compressible(media_type):
+        return asset
+
+    prebuilt = path.with_name(path.name + ".br")
+    if prebuilt.is_file():
+        asset.encodings["br"] = prebuilt.read_bytes()
+    elif brotli is not None:
+        asset.encodings["br"] = brotli.compress(body, quality=11)
+    asset.encodings["gzip"] = gzip.compress(body, compresslevel=9, mtime=0)
+    # Drop variants that did not end up smaller
+    asset.encodings = {enc: data for enc, data in asset.encodings.items() if len(data) < len(body)}
+    return asset
+
+
+def accepted_encodings(header: Optional[str]) -> set[str]:
+    """Content codings allowed by an Accept-Encoding header."""
+    accepted = set()
+    for part in (header or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        if params.replace(" ", "") in ("q=0", "q=0.0"):
+            continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+class StaticSite:
+    """The built frontend, read into memory on first request.
+
+    Only files present at load time are served; restart the backend after
+    rebuilding the frontend.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self._assets: Optional[dict[str, StaticAsset]] = None
+        self._lock = asyncio.Lock()
+
+    def _load_all(self) -> dict[str, StaticAsset]:
+        assets = {}
+        for path in sorted(self.directory.rglob("*")):
+            if path.is_file() and path.suffix not in (".gz", ".br"):
+                relative = path.relative_to(self.directory).as_posix()
+                assets[relative] = load_asset(path, relative)
+        total = sum(len(a.body) for a in assets.values())
+        print(f"Loaded frontend: {len(assets)} files, {total / 1024:.0f} KB")
+        return assets
+
+    async def get(self, relative: str) -> Optional[StaticAsset]:
+        """The asset at a path relative to the build directory, if any."""
+        if self._assets is None:
+            async with self._lock:
+                if self._assets is None:
+                    self._assets = await asyncio.to_thread(self._load_all)
+        return self._assets.get(relative)
+
+
+def respond(asset: StaticAsset, request: Request) -> Response:
+    """Serve an asset in the best encoding the client accepts, or 304 on a matching ETag."""
+    accepted = accepted_encodings(request.headers.get("accept-encoding"))
+    encoding = next((enc for enc in ("br", "gzip") if enc in asset.encodings and enc in accepted), None)
+    # Each encoding is a distinct representation with its own strong ETag
+    etag = asset.etag if encoding is None else f'{asset.etag[:-1]}-{encoding}"'
+    headers = {"ETag": etag, "Cache-Control": asset.cache_control}
+    if asset.encodings:
+        headers["Vary"] = "Accept-Encoding"
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    if encoding is None:
+        return Response(asset.body, media_type=asset.media_type, headers=headers)
+    headers["Content-Encoding"] = encoding
+    return Response(asset.encodings[encoding], media_type=asset.media_type, headers=headers)
@@ -0,0 +1,180 @@
+"""Thumbnail rendering off the event loop, with request coalescing and an LRU cache."""
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import Path
+
+from typing import Optional
+
+from PIL import Image, features
+
+from config import THUMBNAIL_WORKERS, THUMBNAIL_CACHE_MB, THUMBNAIL_FORMATS, FACE_CROP_CACHE_MB
+from metrics import timed, record_cache
+
+# Output formats: (Pillow format, media type)
+FORMATS = {
+    "avif": ("AVIF", "image/avif"),
+    "webp": ("WEBP", "image/webp"),
+    "jpeg": ("JPEG", "image/jpeg"),
+}
+# Quality by longest edge: artifacts show sooner on small images, while
+# large previews compress harder at the same perceived quality
+QUALITY = {
+    "avif": ((200, 65), (600, 55), (None, 50)),
+    "webp": ((200, 82), (600, 78), (None, 72)),
+    "jpeg": ((200, 88), (600, 85), (None, 80)),
+}
+# Modern formats in order of preference, limited to what this Pillow build encodes
+_negotiable = [fmt for fmt in THUMBNAIL_FORMATS if fmt in ("avif", "webp") and features.check(fmt)]
+
+# Pillow releases the GIL while decoding/encoding, so a small pool scales across cores
+_executor = ThreadPoolExecutor(max_workers=THUMBNAIL_WORKERS, thread_name_prefix="thumbnail")
+_inflight: dict[tuple, asyncio.Future] = {}
+
+
+class ByteLRU:
+    """Thread-safe LRU cache of encoded images bounded by total size."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._items: OrderedDict[tuple, bytes] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple):
+        with self._lock:
+            data = self._items.get(key)
+            if data is not None:
+                self._items.move_to_end(key)
+            return data
+
+    def put(self, key: tuple, data: bytes):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._items[key] = data
+            self._size += len(data)
+            while self._size > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self._size -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._size = 0
+
+
+_cache = ByteLRU(THUMBNAIL_CACHE_MB * 1024 * 1024)
+# Lossless sources of detected-face crops plus their encoded variants
+_face_crops = ByteLRU(FACE_CROP_CACHE_MB * 1024 * 1024)
+
+
+def negotiate_format(accept: Optional[str]) -> str:
+    """Pick the best output format the client accepts, falling back to JPEG."""
+    accepted = set()
+    for part in (accept or "").split(","):
+        media_type, _, params = part.strip().partition(";")
+        if params.replace(" ", "") in ("q=0", "q=0.0"):
+            continue
+        accepted.add(media_type.strip().lower())
+    for fmt in _negotiable:
+        if FORMATS[fmt][1] in accepted:
+            return fmt
+    return "jpeg"
+
+
+def media_type(fmt: str) -> str:
+    return FORMATS[fmt][1]
+
+
+def encode_image(img: Image.Image, fmt: str) -> bytes:
+    """Encode an RGB image with a quality suited to its size (blocking)."""
+    longest = max(img.size)
+    quality = next(q for bound, q in QUALITY[fmt] if bound is None or longest <= bound)
+    options = {"quality": quality}
+    if fmt == "avif":
+        options["speed"] = 8  # default speed is several times slower for thumbnails
+    buffer = BytesIO()
+    img.save(buffer, format=FORMATS[fmt][0], **options)
+    return buffer.getvalue()
+
+
+def render_thumbnail(path: Path, size: int, fmt: str = "jpeg") -> bytes:
+    """Decode, downscale and encode a photo (blocking)."""
+    with timed("thumbnail_decode"):
+        img = Image.open(path)
+        # Let the JPEG decoder scale by 1/2..1/8 in the DCT instead of
+        # decoding every pixel of a large original
+        img.draft("RGB", (size, size))
+        img.thumbnail((size, size))
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+
+    with timed("thumbnail_encode"):
+        return encode_image(img, fmt)
+
+
+async def get_thumbnail(photo_id: int, path: Path, size: int, fmt: str = "jpeg") -> bytes:
+    """Get a thumbnail from cache, or render it once however many requests wait for it."""
+    key = (photo_id, size, fmt)
+    data = _cache.get(key)
+    record_cache("thumbnail", data is not None)
+    if data is not None:
+        return data
+
+    future = _inflight.get(key)
+    if future is None:
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(_executor, render_thumbnail, path, size, fmt)
+        _inflight[key] = future
+        future.add_done_callback(lambda f: _finish(key, f))
+    # Shield so one cancelled client does not cancel the shared render
+    return await asyncio.shield(future)
+
+
+def _finish(key: tuple, future: asyncio.Future):
+    _inflight.pop(key, None)
+    if not future.cancelled() and future.exception() is None:
+        _cache.put(key, future.result())
+
+
+async def run_in_pool(func, *args):
+    """Run blocking image work on the thumbnail pool."""
+    return await asyncio.get_running_loop().run_in_executor(_executor, func, *args)
+
+
+def store_face_crop(temp_id: str, img: Image.Image):
+    """Keep a detected face's crop so it can be served by URL."""
+    buffer = BytesIO()
+    img.save(buffer, format="PNG", compress_level=1)
+    _face_crops.put((temp_id, "source"), buffer.getvalue())
+
+
+def _encode_face_crop(source: bytes, fmt: str) -> bytes:
+    with timed("thumbnail_encode"):
+        return encode_image(Image.open(BytesIO(source)).convert("RGB"), fmt)
+
+
+async def get_face_thumbnail(temp_id: str, fmt: str) -> Optional[bytes]:
+    """Encoded crop of a detected face, or None once it expired."""
+    data = _face_crops.get((temp_id, fmt))
+    record_cache("face_thumbnail", data is not None)
+    if data is not None:
+        return data
+    source = _face_crops.get((temp_id, "source"))
+    if source is None:
+        return None
+    loop = asyncio.get_running_loop()
+    data = await loop.run_in_executor(_executor, _encode_face_crop, source, fmt)
+    _face_crops.put((temp_id, fmt), data)
+    return data
+
+
+def clear_cache():
+    """Drop cached thumbnails (after re-indexing)."""
+    _cache.clear()
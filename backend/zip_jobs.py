@@ -0,0 +1,217 @@
+"""Background ZIP archive builds, cached on disk by photo selection.
+
+A job is identified by a hash of the sorted photo ids it contains, so
+identical selections share one build and later requests are served from the
+finished file until it expires or is evicted by the disk budget.
+"""
+import asyncio
+import hashlib
+import os
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+from config import ZIP_CACHE_DIR, ZIP_WORKERS, ZIP_CACHE_TTL, ZIP_CACHE_MB
+from metrics import timed, record_cache
+
+# Formats that are already compressed; deflating them costs CPU for ~0% gain
+STORED_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp", ".heic", ".avif", ".gif"}
+
+# The pool size is the build concurrency limit; further jobs queue
+_executor = ThreadPoolExecutor(max_workers=ZIP_WORKERS, thread_name_prefix="zip")
+_jobs: dict[str, "ZipJob"] = {}
+
+
+@dataclass
+class ZipJob:
+    """An archive of one photo selection."""
+    id: str
+    photo_count: int
+    status: str = "queued"  # queued, running, ready, failed
+    size: int = 0
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    future: Optional[asyncio.Future] = field(default=None, repr=False)
+
+    @property
+    def path(self) -> Path:
+        return ZIP_CACHE_DIR / f"{self.id}.zip"
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("ready", "failed")
+
+
+def selection_key(photo_ids: list[int]) -> str:
+    """Cache key of a selection, independent of order and duplicates."""
+    ids = ",".join(str(pid) for pid in sorted(set(photo_ids)))
+    return hashlib.sha256(ids.encode()).hexdigest()[:32]
+
+
+def get_job(job_id: str) -> Optional[ZipJob]:
+    """Look up a job, including archives finished by a previous process."""
+    job = _jobs.get(job_id)
+    if job is not None and job.status == "ready" and not job.path.exists():
+        # Evicted from disk since it was built
+        del _jobs[job_id]
+        return None
+    if job is None and len(job_id) == 32 and job_id.isalnum():
+        path = ZIP_CACHE_DIR / f"{job_id}.zip"
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            return None
+        if time.time() - st.st_mtime > ZIP_CACHE_TTL:
+            return None
+        try:
+            # One entry per photo; only the central directory at the end is read
+            with zipfile.ZipFile(path) as zf:
+                photo_count = len(zf.namelist())
+        except (zipfile.BadZipFile, FileNotFoundError):
+            return None
+        job = _jobs[job_id] = ZipJob(job_id, photo_count=photo_count, status="ready", size=st.st_size)
+    return job
+
+
+def submit(photos: list[dict]) -> ZipJob:
+    """Queue an archive of `photos` ({photo_id, path, filename}), or reuse a cached one."""
+    job_id = selection_key([p["photo_id"] for p in photos])
+    job = get_job(job_id)
+    if job is not None and job.status != "failed":
+        record_cache("zip", job.status == "ready")
+        if job.status == "ready":
+            touch(job.path)
+        return job
+
+    record_cache("zip", False)
+    job = _jobs[job_id] = ZipJob(job_id, photo_count=len(photos))
+    loop = asyncio.get_running_loop()
+    job.future = loop.run_in_executor(_executor, _build, job, photos)
+    job.future.add_done_callback(lambda f: _finish(job, f))
+    return job
+
+
+async def wait(job: ZipJob) -> ZipJob:
+    """Wait for a job to finish (shielded: the build outlives a cancelled request)."""
+    if job.future is not None and not job.done:
+        try:
+            await asyncio.shield(job.future)
+        except Exception:
+            pass
+    return job
+
+
+def _build(job: ZipJob, photos: list[dict]) -> tuple[int, set[str]]:
+    """Write the archive to a temp file and move it into place (blocking).
+
+    Returns the archive size and the ids of archives evicted to make room.
+    """
+    job.status = "running"
+    ZIP_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = job.path.with_suffix(f".{os.getpid()}.part")
+    try:
+        with timed("zip_build"), zipfile.ZipFile(tmp, "w", allowZip64=True) as zf:
+            names = set()
+            for photo in photos:
+                name = _unique_name(photo["filename"], names)
+                compression = (zipfile.ZIP_STORED if Path(name).suffix.lower() in STORED_SUFFIXES
+                               else zipfile.ZIP_DEFLATED)
+                try:
+                    # Streams the file in chunks, so memory stays flat for large selections
+                    zf.write(photo["path"], name, compress_type=compression)
+                except FileNotFoundError:
+                    continue
+        tmp.replace(job.path)
+    finally:
+        tmp.unlink(missing_ok=True)
+    size = job.path.stat().st_size
+    return size, _prune_files(keep=job.id)
+
+
+def _unique_name(filename: str, names: set[str]) -> str:
+    name, n = filename, 1
+    while name in names:
+        stem, suffix = os.path.splitext(filename)
+        name, n = f"{stem}_{n}{suffix}", n + 1
+    names.add(name)
+    return name
+
+
+def _finish(job: ZipJob, future: asyncio.Future):
+    job.future = None
+    if future.cancelled() or future.exception() is not None:
+        job.status = "failed"
+        job.error = "cancelled" if future.cancelled() else str(future.exception())
+        print(f"Error: ZIP job {job.id} failed: {job.error}")
+        return
+    job.size, evicted = future.result()
+    job.status = "ready"
+    _forget_jobs(evicted)
+
+
+def touch(path: Path) -> bool:
+    """Mark an archive as recently used for eviction; False if it is gone."""
+    try:
+        os.utime(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def forget(job_id: str):
+    """Drop a job whose archive disappeared."""
+    _jobs.pop(job_id, None)
+
+
+def _prune_files(keep: Optional[str] = None) -> set[str]:
+    """Delete expired archives, then least recently used ones beyond ZIP_CACHE_MB (blocking).
+
+    The archive `keep` (just built) is never deleted, even if it alone
+    exceeds the budget. Returns the ids of the deleted archives.
+    """
+    if not ZIP_CACHE_DIR.exists():
+        return set()
+    now = time.time()
+    archives = []
+    removed = set()
+    for path in ZIP_CACHE_DIR.glob("*.zip"):
+        if path.stem == keep:
+            continue
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            continue
+        if now - st.st_mtime > ZIP_CACHE_TTL:
+            path.unlink(missing_ok=True)
+            removed.add(path.stem)
+        else:
+            archives.append((st.st_mtime, st.st_size, path))
+
+    budget = ZIP_CACHE_MB * 1024 * 1024
+    total = sum(size for _, size, _ in archives)
+    if keep is not None:
+        total += (ZIP_CACHE_DIR / f"{keep}.zip").stat().st_size
+    for _, size, path in sorted(archives):
+        if total <= budget:
+            break
+        path.unlink(missing_ok=True)
+        removed.add(path.stem)
+        total -= size
+    return removed
+
+
+def _forget_jobs(removed: set[str]):
+    """Drop finished jobs whose archive was deleted, and old failures (event loop)."""
+    now = time.time()
+    for job_id, job in list(_jobs.items()):
+        if (job.status == "ready" and job_id in removed) or \
+                (job.status == "failed" and now - job.created_at > ZIP_CACHE_TTL):
+            del _jobs[job_id]
+
+
+def prune():
+    """Delete expired and over-budget archives (blocking; run at startup)."""
+    _forget_jobs(_prune_files())
@@ -7,40 +7,45 @@ const api = axios.create({
   timeout: 60000,
 });
 
-export async function detectFaces(file) {
+export async function detectFaces(file, thumbnails = 'inline') {
   const formData = new FormData();
   formData.append('file', file);
 
   const response = await api.post('/api/detect-faces', formData, {
     headers: { 'Content-Type': 'multipart/form-data' },
+    params: { thumbnails },
   });
   return response.data;
 }
 
-export async function searchFaces(tempFaceId, threshold = 0.5, limit = 50) {
+export async function searchFaces(tempFaceId, threshold = 0.5, limit = 50, collection = null) {
   const response = await api.post('/api/search', {
     temp_face_id: tempFaceId,
     threshold,
     limit,
+    collection,
   });
   return response.data;
 }
 
-export async function downloadZip(photoIds) {
-  const response = await api.post('/api/download-zip',
-    { photo_ids: photoIds },
-    { responseType: 'blob' }
-  );
+export async function downloadZip(photoIds, collection = null) {
+  // Archives are built server-side as a job; the finished file is downloaded
+  // by the browser directly instead of being buffered as a blob
+  let { data: job } = await api.post('/api/download-jobs', { photo_ids: photoIds, collection });
+  while (job.status === 'queued' || job.status === 'running') {
+    await new Promise((resolve) => setTimeout(resolve, 1000));
+    ({ data: job } = await api.get(`/api/download-jobs/${job.job_id}`));
+  }
+  if (job.status !== 'ready') {
+    throw new Error(job.error || 'Failed to build archive');
+  }
 
-  // Create download link
-  const url = window.URL.createObjectURL(new Blob([response.data]));
   const link = document.createElement('a');
-  link.href = url;
+  link.href = `${API_BASE}${job.download_url}`;
   link.setAttribute('download', 'yep-photos.zip');
   document.body.appendChild(link);
   link.click();
   link.remove();
-  window.URL.revokeObjectURL(url);
 }
 
 export async function getStats() {
@@ -53,6 +58,18 @@ export async function getPresetFaces(presetName) {
   return response.data;
 }
 
+export async function getFaceBoxes(photoIds) {
+  // Boxes of every face on a result page in one call; match.face_id marks the matched one
+  const response = await api.post('/api/faces/boxes', { photo_ids: photoIds });
+  return response.data.faces;
+}
+
+export async function getBurst(burstId) {
+  // All frames of a burst that search collapsed into one result
+  const response = await api.get(`/api/bursts/${burstId}`);
+  return response.data;
+}
+
 export function getPhotoUrl(photoId) {
   return `${API_BASE}/api/photos/${photoId}`;
 }
@@ -61,6 +78,34 @@ export function getThumbnailUrl(photoId, size = 300) {
   return `${API_BASE}/api/photos/${photoId}/thumbnail?size=${size}`;
 }
 
+export async function createContactSheet(photoIds, tile = 300, columns = 5, collection = null) {
+  // One sprite for a whole result page instead of one request per thumbnail
+  const response = await api.post('/api/contact-sheets', {
+    photo_ids: photoIds,
+    tile,
+    columns,
+    collection,
+  });
+  const sheet = response.data;
+  return {
+    ...sheet,
+    url: `${API_BASE}${sheet.url}`,
+    tilesById: new Map(sheet.tiles.map((t) => [t.photo_id, t])),
+  };
+}
+
+export function getSpriteStyle(sheet, photoId) {
+  // Percent-based so the tile scales with its element, like object-cover
+  const t = sheet?.tilesById.get(photoId);
+  if (!t) return null;
+  const percent = (offset, size, total) => (total === size ? 0 : (offset / (total - size)) * 100);
+  return {
+    backgroundImage: `url("${sheet.url}")`,
+    backgroundSize: `${(sheet.width / t.w) * 100}% ${(sheet.height / t.h) * 100}%`,
+    backgroundPosition: `${percent(t.x, t.w, sheet.width)}% ${percent(t.y, t.h, sheet.height)}%`,
+  };
+}
+
 export async function getCurrentUser() {
   const response = await api.get('/api/me');
   return response.data;
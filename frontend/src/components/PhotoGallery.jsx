@@ -1,12 +1,24 @@
 import { useState, useEffect } from 'react';
 import toast from 'react-hot-toast';
-import { searchFaces, downloadZip, getThumbnailUrl, getPhotoUrl } from '../api/client';
+import {
+  searchFaces, downloadZip, getThumbnailUrl, getPhotoUrl, createContactSheet, getSpriteStyle, getBurst,
+  getFaceBoxes,
+} from '../api/client';
+
+// Results painted from the contact sheet (the server's per-sheet limit)
+const SHEET_PHOTOS = 100;
 
 export default function PhotoGallery({ face, matches, onMatchesFound, onBack, onReset }) {
   const [isLoading, setIsLoading] = useState(true);
   const [isDownloading, setIsDownloading] = useState(false);
   const [selectedIds, setSelectedIds] = useState(new Set());
   const [lightboxPhoto, setLightboxPhoto] = useState(null);
+  const [lightboxBox, setLightboxBox] = useState(null);
+  const [lightboxSize, setLightboxSize] = useState(null);
+  const [contactSheet, setContactSheet] = useState(null);
+  const [sheetFailed, setSheetFailed] = useState(false);
+  const [burstFrames, setBurstFrames] = useState({});
+  const [expandedBursts, setExpandedBursts] = useState(new Set());
 
   useEffect(() => {
     if (matches.length === 0) {
@@ -16,6 +28,52 @@ export default function PhotoGallery({ face, matches, onMatchesFound, onBack, on
     }
   }, [face.temp_id]);
 
+  // Paint the first page of results from a single sprite. Its tiles show
+  // placeholders until the sprite image has loaded; per-photo thumbnails are
+  // only requested if creating or loading the sheet fails (or for results
+  // beyond it)
+  useEffect(() => {
+    setContactSheet(null);
+    setSheetFailed(false);
+    setBurstFrames({});
+    setExpandedBursts(new Set());
+    if (matches.length === 0) return;
+    let cancelled = false;
+    const fail = (error) => {
+      console.error('Contact sheet error:', error);
+      if (!cancelled) setSheetFailed(true);
+    };
+    const sprite = new Image();
+    createContactSheet(matches.slice(0, SHEET_PHOTOS).map((m) => m.photo_id))
+      .then((sheet) => {
+        // A CSS background gives no error event, so load the sprite here first
+        sprite.onload = () => { if (!cancelled) setContactSheet(sheet); };
+        sprite.onerror = () => fail(`failed to load ${sheet.url}`);
+        sprite.src = sheet.url;
+      })
+      .catch(fail);
+    return () => {
+      cancelled = true;
+      sprite.onload = null;
+      sprite.onerror = null;
+    };
+  }, [matches]);
+
+  // Outline the matched face in the lightbox; boxes are in original image pixels
+  useEffect(() => {
+    setLightboxBox(null);
+    setLightboxSize(null);
+    if (!lightboxPhoto?.face_id) return;
+    let cancelled = false;
+    getFaceBoxes([lightboxPhoto.photo_id])
+      .then((faces) => {
+        const box = (faces[lightboxPhoto.photo_id] || []).find((f) => f.face_id === lightboxPhoto.face_id);
+        if (!cancelled && box) setLightboxBox(box.bbox);
+      })
+      .catch((error) => console.error('Face boxes error:', error));
+    return () => { cancelled = true; };
+  }, [lightboxPhoto]);
+
   const searchForMatches = async () => {
     setIsLoading(true);
     try {
@@ -42,22 +100,72 @@ export default function PhotoGallery({ face, matches, onMatchesFound, onBack, on
     setSelectedIds(newSelected);
   };
 
-  const selectAll = () => {
-    setSelectedIds(new Set(matches.map(m => m.photo_id)));
+  // Search returns one result per burst of near-duplicate frames; the other
+  // frames are fetched on demand and cached by burst id
+  const fetchBursts = async (burstIds) => {
+    const missing = [...new Set(burstIds)].filter((id) => !burstFrames[id]);
+    const fetched = await Promise.all(missing.map(getBurst));
+    const frames = { ...burstFrames };
+    fetched.forEach((burst) => { frames[burst.burst_id] = burst.photos; });
+    if (fetched.length > 0) setBurstFrames(frames);
+    return frames;
   };
 
-  const selectNone = () => {
-    setSelectedIds(new Set());
+  const toggleBurst = async (burstId) => {
+    if (expandedBursts.has(burstId)) {
+      setExpandedBursts((prev) => new Set([...prev].filter((id) => id !== burstId)));
+      return;
+    }
+    try {
+      await fetchBursts([burstId]);
+    } catch (error) {
+      console.error('Burst error:', error);
+      toast.error('Lỗi khi tải ảnh liên tiếp');
+      return;
+    }
+    setExpandedBursts((prev) => new Set(prev).add(burstId));
   };
 
-  const handleDownload = async (photoIds) => {
-    if (photoIds.length === 0) {
-      toast.error('Vui lòng chọn ít nhất 1 ảnh');
-      return;
+  // Every result photo, including the hidden frames of collapsed bursts
+  const allPhotoIds = async () => {
+    const frames = await fetchBursts(matches.filter((m) => m.burst_size > 1).map((m) => m.burst_id));
+    return matches.flatMap((m) => (m.burst_size > 1 ? frames[m.burst_id].map((p) => p.photo_id) : [m.photo_id]));
+  };
+
+  const totalPhotos = matches.reduce((total, m) => total + (m.burst_size || 1), 0);
+
+  // Grid entries: each result, followed by the other frames of its burst once expanded
+  const tiles = matches.flatMap((match, index) => [
+    { ...match, sheetIndex: index },
+    ...(expandedBursts.has(match.burst_id)
+      ? burstFrames[match.burst_id]
+        .filter((p) => p.photo_id !== match.photo_id)
+        .map((p) => ({ ...p, burstFrame: true }))
+      : []),
+  ]);
+
+  const selectAll = async () => {
+    try {
+      setSelectedIds(new Set(await allPhotoIds()));
+    } catch (error) {
+      console.error('Burst error:', error);
+      toast.error('Lỗi khi tải ảnh liên tiếp');
     }
+  };
 
+  const selectNone = () => {
+    setSelectedIds(new Set());
+  };
+
+  // getPhotoIds may fetch (the frames of collapsed bursts), so it runs inside the download state
+  const handleDownload = async (getPhotoIds) => {
     setIsDownloading(true);
     try {
+      const photoIds = await getPhotoIds();
+      if (photoIds.length === 0) {
+        toast.error('Vui lòng chọn ít nhất 1 ảnh');
+        return;
+      }
       await downloadZip(photoIds);
       toast.success(`Đang tải ${photoIds.length} ảnh`);
     } catch (error) {
@@ -68,8 +176,8 @@ export default function PhotoGallery({ face, matches, onMatchesFound, onBack, on
     }
   };
 
-  const downloadAll = () => handleDownload(matches.map(m => m.photo_id));
-  const downloadSelected = () => handleDownload([...selectedIds]);
+  const downloadAll = () => handleDownload(allPhotoIds);
+  const downloadSelected = () => handleDownload(() => [...selectedIds]);
 
   if (isLoading) {
     return (
@@ -134,7 +242,7 @@ export default function PhotoGallery({ face, matches, onMatchesFound, onBack, on
               <svg className="w-5 h-5" fill="none" viewBox="0 0 24 24" stroke="currentColor">
                 <path strokeLinecap="round" strokeLinejoin="round" strokeWidth={2} d="M4 16v1a3 3 0 003 3h10a3 3 0 003-3v-1m-4-4l-4 4m0 0l-4-4m4 4V4" />
               </svg>
-              Tải tất cả ({matches.length})
+              Tải tất cả ({totalPhotos})
             </button>
             {selectedIds.size > 0 && (
               <button
@@ -173,7 +281,7 @@ export default function PhotoGallery({ face, matches, onMatchesFound, onBack, on
       {/* Photo grid */}
       {matches.length > 0 ? (
         <div className="grid grid-cols-2 sm:grid-cols-3 md:grid-cols-4 lg:grid-cols-5 gap-4">
-          {matches.map((match) => (
+          {tiles.map((match) => (
             <div
               key={match.photo_id}
               className={`group relative rounded-2xl overflow-hidden cursor-pointer transition-all duration-300 hover:scale-[1.02]
@@ -182,24 +290,54 @@ export default function PhotoGallery({ face, matches, onMatchesFound, onBack, on
                   : 'ring-2 ring-white/10 hover:ring-white/30'}`}
             >
               {/* Clickable image to open lightbox */}
-              <img
-                src={getThumbnailUrl(match.photo_id)}
-                alt={match.filename}
-                className="w-full aspect-square object-cover cursor-zoom-in"
-                loading="lazy"
-                onClick={() => setLightboxPhoto(match)}
-              />
+              {getSpriteStyle(contactSheet, match.photo_id) ? (
+                <div
+                  role="img"
+                  aria-label={match.filename}
+                  style={getSpriteStyle(contactSheet, match.photo_id)}
+                  className="w-full aspect-square bg-no-repeat cursor-zoom-in"
+                  onClick={() => setLightboxPhoto(match)}
+                />
+              ) : !contactSheet && !sheetFailed && !match.burstFrame && match.sheetIndex < SHEET_PHOTOS ? (
+                <div
+                  className="w-full aspect-square bg-white/5 animate-pulse cursor-zoom-in"
+                  onClick={() => setLightboxPhoto(match)}
+                />
+              ) : (
+                <img
+                  src={getThumbnailUrl(match.photo_id)}
+                  alt={match.filename}
+                  className="w-full aspect-square object-cover cursor-zoom-in"
+                  loading="lazy"
+                  onClick={() => setLightboxPhoto(match)}
+                />
+              )}
 
               {/* Gradient overlay - pointer-events-none to allow clicks through */}
               <div className="absolute inset-0 bg-gradient-to-t from-black/60 via-transparent to-transparent opacity-0 group-hover:opacity-100 transition-opacity pointer-events-none"></div>
 
-              {/* Similarity badge */}
-              <div className="absolute top-2 right-2 px-2 py-1 rounded-lg bg-black/50 backdrop-blur-sm text-white text-xs font-medium flex items-center gap-1 pointer-events-none">
-                <svg className="w-3 h-3 text-green-400" fill="none" viewBox="0 0 24 24" stroke="currentColor">
-                  <path strokeLinecap="round" strokeLinejoin="round" strokeWidth={2} d="M9 12l2 2 4-4m6 2a9 9 0 11-18 0 9 9 0 0118 0z" />
-                </svg>
-                {Math.round(match.similarity * 100)}%
-              </div>
+              {/* Similarity badge (burst frames were not matched themselves) */}
+              {!match.burstFrame && (
+                <div className="absolute top-2 right-2 px-2 py-1 rounded-lg bg-black/50 backdrop-blur-sm text-white text-xs font-medium flex items-center gap-1 pointer-events-none">
+                  <svg className="w-3 h-3 text-green-400" fill="none" viewBox="0 0 24 24" stroke="currentColor">
+                    <path strokeLinecap="round" strokeLinejoin="round" strokeWidth={2} d="M9 12l2 2 4-4m6 2a9 9 0 11-18 0 9 9 0 0118 0z" />
+                  </svg>
+                  {Math.round(match.similarity * 100)}%
+                </div>
+              )}
+
+              {/* Burst badge: similar frames collapsed into this result, click to show them */}
+              {match.burst_size > 1 && (
+                <button
+                  className="absolute bottom-2 right-2 px-2 py-1 rounded-lg bg-black/50 backdrop-blur-sm text-white text-xs font-medium hover:bg-black/70 transition-colors"
+                  onClick={(e) => {
+                    e.stopPropagation();
+                    toggleBurst(match.burst_id);
+                  }}
+                >
+                  {expandedBursts.has(match.burst_id) ? '−' : '+'}{match.burst_size - 1}
+                </button>
+              )}
 
               {/* Selection checkbox - clickable */}
               <button
@@ -278,24 +416,41 @@ export default function PhotoGallery({ face, matches, onMatchesFound, onBack, on
             </svg>
           </button>
 
-          {/* Image */}
-          <img
-            src={getPhotoUrl(lightboxPhoto.photo_id)}
-            alt={lightboxPhoto.filename}
-            className="max-h-[90vh] max-w-[90vw] object-contain rounded-lg shadow-2xl"
-            onClick={(e) => e.stopPropagation()}
-          />
+          {/* Image, with the matched face outlined */}
+          <div className="relative" onClick={(e) => e.stopPropagation()}>
+            <img
+              src={getPhotoUrl(lightboxPhoto.photo_id)}
+              alt={lightboxPhoto.filename}
+              className="block max-h-[90vh] max-w-[90vw] object-contain rounded-lg shadow-2xl"
+              onLoad={(e) => setLightboxSize({ width: e.target.naturalWidth, height: e.target.naturalHeight })}
+            />
+            {lightboxBox && lightboxSize && (
+              <div
+                className="absolute rounded-lg border-2 border-pink-500 shadow-lg shadow-pink-500/50 pointer-events-none"
+                style={{
+                  left: `${(lightboxBox.x / lightboxSize.width) * 100}%`,
+                  top: `${(lightboxBox.y / lightboxSize.height) * 100}%`,
+                  width: `${(lightboxBox.w / lightboxSize.width) * 100}%`,
+                  height: `${(lightboxBox.h / lightboxSize.height) * 100}%`,
+                }}
+              />
+            )}
+          </div>
 
           {/* Info bar */}
           <div className="absolute bottom-6 left-1/2 -translate-x-1/2 px-6 py-3 rounded-2xl bg-black/50 backdrop-blur-sm text-white text-sm flex items-center gap-4">
             <span>{lightboxPhoto.filename}</span>
-            <span className="w-px h-4 bg-white/20"></span>
-            <span className="flex items-center gap-1">
-              <svg className="w-4 h-4 text-green-400" fill="none" viewBox="0 0 24 24" stroke="currentColor">
-                <path strokeLinecap="round" strokeLinejoin="round" strokeWidth={2} d="M9 12l2 2 4-4m6 2a9 9 0 11-18 0 9 9 0 0118 0z" />
-              </svg>
-              {Math.round(lightboxPhoto.similarity * 100)}% match
-            </span>
+            {!lightboxPhoto.burstFrame && (
+              <>
+                <span className="w-px h-4 bg-white/20"></span>
+                <span className="flex items-center gap-1">
+                  <svg className="w-4 h-4 text-green-400" fill="none" viewBox="0 0 24 24" stroke="currentColor">
+                    <path strokeLinecap="round" strokeLinejoin="round" strokeWidth={2} d="M9 12l2 2 4-4m6 2a9 9 0 11-18 0 9 9 0 0118 0z" />
+                  </svg>
+                  {Math.round(lightboxPhoto.similarity * 100)}% match
+                </span>
+              </>
+            )}
           </div>
         </div>
       )}
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""Compare per-image face analysis time of the full and lean analysis modes."""
+import sys
+from pathlib import Path
+
+# Add backend to path for analyzer/metrics modules
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+import argparse
+import json
+import time
+
+import cv2
+import numpy as np
+
+from analyzer import create_face_analyzer, ANALYSIS_MODES
+from metrics import STAGE_SECONDS
+from index_faces import get_image_files
+
+
+def run_mode(mode: str, images: list[np.ndarray], warmup: int) -> dict:
+    """Time `analyzer.get` over all images in one analysis mode."""
+    analyzer = create_face_analyzer(mode)
+    for img in images[:warmup]:
+        analyzer.get(img)
+
+    STAGE_SECONDS.clear()
+    latencies, embeddings = [], []
+    for img in images:
+        start = time.perf_counter()
+        faces = analyzer.get(img)
+        latencies.append(time.perf_counter() - start)
+        embeddings.append([face.embedding for face in faces])
+
+    stages = {}
+    for stage in ("detect", "recognize"):
+        count, total = STAGE_SECONDS.totals(stage=stage)
+        stages[stage] = total / len(images) * 1000 if count else 0.0
+
+    ms = np.array(latencies) * 1000
+    return {
+        "mode": mode,
+        "images": len(images),
+        "faces_per_image": sum(len(e) for e in embeddings) / len(images),
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "detect_ms": stages["detect"],
+        "recognize_ms": stages["recognize"],
+        "embeddings": embeddings,
+    }
+
+
+def embedding_agreement(a: list[list[np.ndarray]], b: list[list[np.ndarray]]) -> float:
+    """Lowest cosine similarity between the two modes' embeddings of the same face."""
+    lowest = 1.0
+    for faces_a, faces_b in zip(a, b):
+        for ea, eb in zip(faces_a, faces_b):
+            sim = float(np.dot(ea, eb) / (np.linalg.norm(ea) * np.linalg.norm(eb) + 1e-10))
+            lowest = min(lowest, sim)
+    return lowest
+
+
+def print_report(results: list[dict], project: int):
+    print(f"\n{'mode':<6} {'ms/img':>8} {'p50':>8} {'p95':>8} {'detect':>8} {'recog':>8} {'faces':>6}")
+    for r in results:
+        print(f"{r['mode']:<6} {r['mean_ms']:>8.1f} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} "
+              f"{r['detect_ms']:>8.1f} {r['recognize_ms']:>8.1f} {r['faces_per_image']:>6.1f}")
+
+    by_mode = {r["mode"]: r for r in results}
+    if "full" in by_mode and "lean" in by_mode:
+        full, lean = by_mode["full"], by_mode["lean"]
+        saved_ms = full["mean_ms"] - lean["mean_ms"]
+        print(f"\nLean saves {saved_ms:.1f} ms/image ({saved_ms / full['mean_ms'] * 100:.0f}%), "
+              f"~{saved_ms * project / 3_600_000:.2f} h per {project} photos")
+        print(f"Lowest embedding agreement between modes: {embedding_agreement(full['embeddings'], lean['embeddings']):.4f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark full vs lean face analysis")
+    parser.add_argument("-i", "--input", default="data/photos", help="Photos directory (default: data/photos)")
+    parser.add_argument("-n", "--images", type=int, default=50, help="Images to analyze per mode (default: 50)")
+    parser.add_argument("--warmup", type=int, default=3, help="Untimed warm-up images per mode (default: 3)")
+    parser.add_argument("--modes", nargs="+", choices=ANALYSIS_MODES, default=["full", "lean"],
+                        help="Modes to compare (default: full lean)")
+    parser.add_argument("--project", type=int, default=50000,
+                        help="Photo count to extrapolate savings to (default: 50000)")
+    parser.add_argument("-o", "--output", help="Write results as JSON for later comparison")
+    args = parser.parse_args()
+
+    photos_dir = Path(__file__).parent.parent / args.input
+    paths = get_image_files(photos_dir)[:args.images]
+    images = [img for img in (cv2.imread(str(p)) for p in paths) if img is not None]
+    if not images:
+        print(f"Error: No readable images in {photos_dir}", file=sys.stderr)
+        sys.exit(1)
+    print(f"Benchmarking {len(images)} images from {photos_dir}")
+
+    results = [run_mode(mode, images, args.warmup) for mode in args.modes]
+    print_report(results, args.project)
+
+    if args.output:
+        Path(args.output).write_text(json.dumps({
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "results": [{k: v for k, v in r.items() if k != "embeddings"} for r in results],
+        }, indent=2))
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
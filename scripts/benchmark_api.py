@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""Load-test the API hot paths and report latency percentiles, throughput and RSS."""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, Optional
+
+import httpx
+import numpy as np
+
+ENDPOINTS = ["search", "thumbnail", "download-zip", "detect-faces"]
+
+
+def read_rss_mb(pid: int) -> tuple[Optional[float], Optional[float]]:
+    """Current and peak resident set size of a process, from /proc (Linux only)."""
+    try:
+        status = Path(f"/proc/{pid}/status").read_text()
+    except OSError:
+        return None, None
+    values = {}
+    for line in status.splitlines():
+        key, _, rest = line.partition(":")
+        if key in ("VmRSS", "VmHWM"):
+            values[key] = int(rest.split()[0]) / 1024
+    return values.get("VmRSS"), values.get("VmHWM")
+
+
+async def run_scenario(name: str, make_request: Callable[[httpx.AsyncClient], Awaitable[httpx.Response]],
+                       client: httpx.AsyncClient, total: int, concurrency: int,
+                       server_pid: Optional[int]) -> dict:
+    """Fire `total` requests with at most `concurrency` in flight.
+
+    429 answers (admission control) are counted apart from errors: they mean
+    the server's limits, not its capacity, were measured.
+    """
+    latencies = []
+    errors = 0
+    throttled = 0
+    peak_rss = 0.0
+    remaining = iter(range(total))
+
+    async def worker():
+        nonlocal errors, throttled
+        for _ in remaining:
+            start = time.perf_counter()
+            try:
+                resp = await make_request(client)
+                await resp.aread()
+                status = resp.status_code
+            except httpx.HTTPError:
+                status = None
+            latencies.append(time.perf_counter() - start)
+            if status == 429:
+                throttled += 1
+            elif status is None or status >= 400:
+                errors += 1
+
+    async def sample_rss():
+        nonlocal peak_rss
+        while True:
+            rss, _ = read_rss_mb(server_pid)
+            peak_rss = max(peak_rss, rss or 0.0)
+            await asyncio.sleep(0.1)
+
+    sampler = asyncio.create_task(sample_rss()) if server_pid else None
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    if sampler:
+        sampler.cancel()
+
+    ms = np.array(latencies) * 1000
+    result = {
+        "endpoint": name,
+        "requests": total,
+        "concurrency": concurrency,
+        "errors": errors,
+        "throttled": throttled,
+        "p50_ms": round(float(np.percentile(ms, 50)), 2),
+        "p95_ms": round(float(np.percentile(ms, 95)), 2),
+        "p99_ms": round(float(np.percentile(ms, 99)), 2),
+        "throughput_rps": round(total / elapsed, 1),
+    }
+    if server_pid:
+        result["peak_rss_mb"] = round(peak_rss, 1)
+    return result
+
+
+async def detect_temp_faces(client: httpx.AsyncClient, image: bytes) -> list[str]:
+    """Upload the face image once to get temp face IDs for search requests."""
+    resp = await client.post("/api/detect-faces", files={"file": ("face.jpg", image, "image/jpeg")})
+    resp.raise_for_status()
+    return [f["temp_id"] for f in resp.json()["faces"]]
+
+
+async def benchmark(args) -> list[dict]:
+    cookies = {"session": args.session} if args.session else None
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, cookies=cookies, limits=limits,
+                                 timeout=args.timeout) as client:
+        stats = (await client.get("/api/stats")).json()
+        n_photos = stats["total_photos"]
+        if not n_photos:
+            sys.exit("Error: backend has no indexed photos")
+        print(f"Backend: {n_photos} photos, {stats['total_faces']} faces")
+
+        image = Path(args.face_image).read_bytes() if args.face_image else None
+        temp_ids = await detect_temp_faces(client, image) if image else []
+        rng = random.Random(args.seed)
+
+        scenarios = {
+            "search": lambda c: c.post("/api/search", json={
+                "temp_face_id": rng.choice(temp_ids), "threshold": args.threshold,
+                "limit": args.limit, "collection": args.collection,
+            }),
+            "thumbnail": lambda c: c.get(
+                f"/api/photos/{rng.randint(1, n_photos)}/thumbnail", params={"size": args.thumbnail_size}
+            ),
+            "download-zip": lambda c: c.post("/api/download-zip", json={
+                "photo_ids": rng.sample(range(1, n_photos + 1), min(args.zip_photos, n_photos)),
+            }),
+            "detect-faces": lambda c: c.post(
+                "/api/detect-faces", files={"file": ("face.jpg", image, "image/jpeg")}
+            ),
+        }
+
+        results = []
+        for name in args.endpoints:
+            if name in ("search", "detect-faces") and not temp_ids:
+                print(f"Skipping {name}: needs --face-image with a detectable face")
+                continue
+            total = args.requests if name != "download-zip" else max(1, args.requests // 10)
+            print(f"Running {name}: {total} requests @ concurrency {args.concurrency}...")
+            results.append(await run_scenario(name, scenarios[name], client, total,
+                                              args.concurrency, args.server_pid))
+        return results
+
+
+def print_report(results: list[dict], server_pid: Optional[int]):
+    header = f"{'endpoint':<14}{'reqs':>7}{'err':>6}{'429':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>9}"
+    if server_pid:
+        header += f"{'RSS MB':>9}"
+    print("\n" + header)
+    print("-" * len(header))
+    for r in results:
+        line = (f"{r['endpoint']:<14}{r['requests']:>7}{r['errors']:>6}{r['throttled']:>6}{r['p50_ms']:>10}"
+                f"{r['p95_ms']:>10}{r['p99_ms']:>10}{r['throughput_rps']:>9}")
+        if server_pid:
+            line += f"{r['peak_rss_mb']:>9}"
+        print(line)
+    if server_pid:
+        _, hwm = read_rss_mb(server_pid)
+        if hwm:
+            print(f"\nServer peak RSS since start: {hwm:.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark YEP Photo Finder API hot paths")
+    parser.add_argument("--base-url", default="http://localhost:8000", help="Backend URL")
+    parser.add_argument("-e", "--endpoints", nargs="+", choices=ENDPOINTS, default=ENDPOINTS,
+                        help="Endpoints to drive (default: all)")
+    parser.add_argument("-n", "--requests", type=int, default=500,
+                        help="Requests per endpoint; download-zip runs a tenth (default: 500)")
+    parser.add_argument("-c", "--concurrency", type=int, default=16, help="Requests in flight (default: 16)")
+    parser.add_argument("--face-image", help="Photo with a face, required for search and detect-faces")
+    parser.add_argument("--threshold", type=float, default=0.5, help="Search threshold")
+    parser.add_argument("--limit", type=int, default=50, help="Search result limit")
+    parser.add_argument("--collection", default=None, help="Collection to search")
+    parser.add_argument("--thumbnail-size", type=int, default=300, help="Thumbnail size")
+    parser.add_argument("--zip-photos", type=int, default=50, help="Photos per ZIP request")
+    parser.add_argument("--server-pid", type=int, help="Backend PID, to sample its RSS (Linux)")
+    parser.add_argument("--session", help="Session cookie when auth is enabled")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Per-request timeout in seconds")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for request mix")
+    parser.add_argument("-o", "--output", help="Write results as JSON for later comparison")
+    args = parser.parse_args()
+
+    results = asyncio.run(benchmark(args))
+    print_report(results, args.server_pid)
+
+    if args.output:
+        Path(args.output).write_text(json.dumps({
+            "base_url": args.base_url,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "results": results,
+        }, indent=2))
+        print(f"\nResults written to {args.output}")
+
+    throttled = sum(r["throttled"] for r in results)
+    if throttled:
+        sys.exit(f"\nError: {throttled} requests were rejected with 429 by admission control, so these "
+                 "numbers measure its limits, not the server. Restart the backend with ADMISSION_ENABLED=0.")
+
+
+if __name__ == "__main__":
+    main()
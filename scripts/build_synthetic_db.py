@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""Build a synthetic database with random embeddings and generated photos for benchmarking."""
+import sys
+from pathlib import Path
+
+# Add backend to path for database module
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+import argparse
+import numpy as np
+from PIL import Image
+from tqdm import tqdm
+
+from config import DEFAULT_COLLECTION
+from database import get_connection, init_db, insert_photo, insert_faces_batch
+
+BATCH_PHOTOS = 1000
+
+
+def generate_image_pool(output_dir: Path, count: int, width: int, height: int,
+                        rng: np.random.Generator) -> list[Path]:
+    """Write `count` noisy gradient JPEGs that photo rows point at."""
+    output_dir.mkdir(parents=True, exist_ok=True)
+    paths = []
+    yy, xx = np.mgrid[0:height, 0:width]
+    for i in range(count):
+        path = output_dir / f"synthetic_{i:05d}.jpg"
+        if not path.exists():
+            base = rng.integers(0, 256, size=3)
+            gradient = ((xx + yy) * 255 // (width + height))[..., None]
+            noise = rng.integers(0, 40, size=(height, width, 3))
+            pixels = ((base + gradient + noise) % 256).astype(np.uint8)
+            Image.fromarray(pixels).save(path, format="JPEG", quality=90)
+        paths.append(path)
+    return paths
+
+
+def build_synthetic_db(db_path: Path, n_faces: int, faces_per_photo: int, identities: int,
+                       image_paths: list[Path], collection: str, seed: int):
+    """Insert photos and faces whose embeddings are noisy copies of random identities.
+
+    Grouping faces around identities gives searches and clustering a realistic
+    number of true matches instead of pure noise.
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((identities, 512)).astype(np.float32)
+    centers /= np.linalg.norm(centers, axis=1, keepdims=True)
+
+    init_db(db_path)
+    n_photos = -(-n_faces // faces_per_photo)
+    written = 0
+    with get_connection(db_path) as conn:
+        for start in tqdm(range(0, n_photos, BATCH_PHOTOS), desc="Writing photos"):
+            for p in range(start, min(n_photos, start + BATCH_PHOTOS)):
+                image_path = image_paths[p % len(image_paths)]
+                photo_id = insert_photo(conn, f"synthetic_{p:07d}.jpg", str(image_path),
+                                        1920, 1280, collection)
+                count = min(faces_per_photo, n_faces - written)
+                labels = rng.integers(0, identities, size=count)
+                embeddings = centers[labels] + rng.normal(scale=0.035, size=(count, 512)).astype(np.float32)
+                insert_faces_batch(conn, [{
+                    'photo_id': photo_id,
+                    'bbox_x': 100 * j, 'bbox_y': 100, 'bbox_w': 80, 'bbox_h': 80,
+                    'embedding': embeddings[j],
+                    'detection_score': 0.9,
+                    'collection': collection,
+                } for j in range(count)])
+                written += count
+            conn.commit()
+
+    print(f"✓ Synthetic database ready: {n_photos} photos, {written} faces -> {db_path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a synthetic face database for benchmarks")
+    parser.add_argument("-o", "--output", default="data/bench", help="Output directory (default: data/bench)")
+    parser.add_argument("-n", "--faces", type=int, default=5000, help="Number of faces (default: 5000)")
+    parser.add_argument("--faces-per-photo", type=int, default=3, help="Faces per photo (default: 3)")
+    parser.add_argument("--identities", type=int, default=500, help="Distinct people (default: 500)")
+    parser.add_argument("--image-pool", type=int, default=50,
+                        help="Distinct generated JPEGs shared by all photo rows (default: 50)")
+    parser.add_argument("--image-size", default="1920x1280", help="Generated photo size (default: 1920x1280)")
+    parser.add_argument("-c", "--collection", default=DEFAULT_COLLECTION, help="Collection name")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0)")
+    args = parser.parse_args()
+
+    output_dir = Path(__file__).parent.parent / args.output
+    db_path = output_dir / "database.db"
+    if db_path.exists():
+        print(f"Error: {db_path} already exists, remove it or pick another --output", file=sys.stderr)
+        sys.exit(1)
+
+    width, height = (int(v) for v in args.image_size.split("x"))
+    rng = np.random.default_rng(args.seed)
+    image_paths = generate_image_pool(output_dir / "photos", args.image_pool, width, height, rng)
+    build_synthetic_db(db_path, args.faces, args.faces_per_photo, args.identities,
+                       image_paths, args.collection, args.seed)
+    print(f"Start the backend against it with: DB_PATH={db_path} uvicorn main:app")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,12 +8,28 @@ from typing import Optional, List, Dict, Tuple
 sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
 
 import argparse
+import json
+import os
+import platform
+import time
 import cv2
 import numpy as np
 from tqdm import tqdm
-from insightface.app import FaceAnalysis
 
-from database import get_connection, init_db, is_photo_indexed, insert_photo, insert_faces_batch, DB_PATH
+from database import (
+    get_connection, init_db, is_photo_indexed, insert_photo, insert_faces_batch,
+    get_all_embeddings, replace_clusters, get_all_clusters, get_unclustered_embeddings, get_cluster_sizes,
+    add_cluster_members, set_burst_id, start_index_run, get_resumable_run,
+    update_index_run, record_index_failure, clear_index_failure, get_index_failures, DB_PATH
+)
+from analyzer import FaceAnalyzer, create_face_analyzer, select_providers, ANALYSIS_MODES
+from bursts import BurstTracker, dhash
+from clustering import cluster_embeddings, assign_to_clusters
+from metrics import timed, write_textfile, STAGE_SECONDS, INDEXER_PHOTOS, INDEXER_FACES, INDEXER_THROUGHPUT
+from config import (
+    CLUSTER_THRESHOLD, CLUSTER_NEIGHBORS, CLUSTER_ITERATIONS, DEFAULT_COLLECTION, ANALYSIS_MODE,
+    INDEX_BATCH_SIZE, INDEX_MAX_ATTEMPTS
+)
 
 # Supported image extensions
 IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.bmp'}
@@ -22,16 +38,14 @@ IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.bmp'}
 MIN_FACE_SIZE = 50  # pixels
 MIN_DETECTION_SCORE = 0.7
 
+# Timed stages reported per photo (detect/recognize are timed by the analyzer)
+STAGES = ("index_decode", "index_analyze", "detect", "recognize", "index_hash", "index_write")
+COUNTERS = ("processed", "indexed", "skipped", "errors", "recovered", "faces", "burst_frames",
+            "collapsed_faces")
 
-def init_face_analyzer() -> FaceAnalysis:
-    """Initialize InsightFace analyzer with buffalo_l model."""
-    print("Loading InsightFace buffalo_l model...")
-    # Try CoreML first (Apple Silicon), fallback to CPU
-    providers = ['CoreMLExecutionProvider', 'CPUExecutionProvider']
-    app = FaceAnalysis(name='buffalo_l', providers=providers)
-    app.prepare(ctx_id=0, det_size=(640, 640))
-    print("✓ Model loaded")
-    return app
+
+class ImageError(Exception):
+    """A photo that cannot be indexed."""
 
 
 def get_image_files(photos_dir: Path) -> List[Path]:
@@ -43,103 +57,363 @@ def get_image_files(photos_dir: Path) -> List[Path]:
     return sorted(files)
 
 
-def process_image(analyzer: FaceAnalysis, image_path: Path) -> Tuple[Optional[np.ndarray], List[Dict]]:
-    """Process single image, return (image, faces_data) or (None, []) on error."""
-    try:
+def process_image(analyzer: FaceAnalyzer, image_path: Path) -> Tuple[np.ndarray, List[Dict]]:
+    """Process single image, return (image, faces_data).
+
+    Raises:
+        ImageError: If the image cannot be read.
+    """
+    with timed("index_decode"):
         img = cv2.imread(str(image_path))
-        if img is None:
-            return None, []
+    if img is None:
+        raise ImageError("unreadable image")
 
+    with timed("index_analyze"):
         faces = analyzer.get(img)
-        if not faces:
-            return img, []
-
-        face_records = []
-        for face in faces:
-            # Skip low confidence or small faces
-            if face.det_score < MIN_DETECTION_SCORE:
-                continue
-
-            bbox = face.bbox.astype(int)
-            width = bbox[2] - bbox[0]
-            height = bbox[3] - bbox[1]
-
-            if width < MIN_FACE_SIZE or height < MIN_FACE_SIZE:
-                continue
-
-            face_records.append({
-                'bbox_x': int(bbox[0]),
-                'bbox_y': int(bbox[1]),
-                'bbox_w': int(width),
-                'bbox_h': int(height),
-                'embedding': face.embedding,
-                'detection_score': float(face.det_score)
-            })
-
-        return img, face_records
-    except Exception as e:
-        print(f"\n  Warning: Error processing {image_path.name}: {e}")
-        return None, []
-
-
-def index_photos(photos_dir: Path, db_path: Path):
-    """Index all photos in directory."""
+    if not faces:
+        return img, []
+
+    face_records = []
+    for face in faces:
+        # Skip low confidence or small faces
+        if face.det_score < MIN_DETECTION_SCORE:
+            continue
+
+        bbox = face.bbox.astype(int)
+        width = bbox[2] - bbox[0]
+        height = bbox[3] - bbox[1]
+
+        if width < MIN_FACE_SIZE or height < MIN_FACE_SIZE:
+            continue
+
+        face_records.append({
+            'bbox_x': int(bbox[0]),
+            'bbox_y': int(bbox[1]),
+            'bbox_w': int(width),
+            'bbox_h': int(height),
+            'embedding': face.embedding,
+            'detection_score': float(face.det_score)
+        })
+
+    return img, face_records
+
+
+def hardware_info(analysis_mode: str) -> dict:
+    """Where a run executed, so reports can be compared across machines."""
+    return {
+        'host': platform.node(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'python': platform.python_version(),
+        'providers': select_providers(),
+        'analysis_mode': analysis_mode,
+    }
+
+
+def stage_totals(previous: Dict[str, list]) -> Dict[str, list]:
+    """[count, seconds] per stage of this process added to those of earlier sessions of the run."""
+    totals = {}
+    for stage in STAGES:
+        count, seconds = STAGE_SECONDS.totals(stage=stage)
+        before = previous.get(stage, [0, 0.0])
+        if count or before[0]:
+            totals[stage] = [before[0] + count, before[1] + seconds]
+    return totals
+
+
+def run_report(run_id: int, collection: str, progress: dict) -> dict:
+    """Counters, hardware and per-stage throughput (photos per second) of a run."""
+    elapsed = progress['elapsed']
+    worked = progress['processed'] - progress['skipped']
+    return {
+        'run_id': run_id,
+        'collection': collection,
+        'hardware': progress['hardware'],
+        'photos': {name: progress[name] for name in ('total',) + COUNTERS},
+        'elapsed_seconds': round(elapsed, 3),
+        'photos_per_second': round(worked / elapsed, 3) if elapsed > 0 else 0,
+        'stages': {
+            stage.removeprefix('index_'): {
+                'photos': count,
+                'seconds': round(seconds, 3),
+                'photos_per_second': round(count / seconds, 3) if seconds > 0 else 0,
+                'ms_per_photo': round(seconds / count * 1000, 3),
+            }
+            for stage, (count, seconds) in progress['stages'].items()
+        },
+    }
+
+
+def index_photos(photos_dir: Path, db_path: Path, collection: str = DEFAULT_COLLECTION,
+                 metrics_file: Optional[Path] = None, analysis_mode: str = ANALYSIS_MODE,
+                 collapse_bursts: bool = False, resume: bool = False, retry_failures: bool = False,
+                 report_file: Optional[Path] = None):
+    """Index all photos in directory into a collection.
+
+    Consecutive near-duplicate frames are grouped into bursts; with
+    `collapse_bursts` only the first frame's faces are stored for a burst.
+
+    The run is journaled in `index_runs`: every INDEX_BATCH_SIZE photos the
+    batch is committed together with the run's progress, and photos that fail
+    are recorded in `index_failures` and retried by later runs. With `resume`
+    the last killed or interrupted run of the collection continues after the
+    last committed photo, keeping its counters and stage timings.
+    """
     # Initialize database
     init_db(db_path)
 
+    with get_connection(db_path) as conn:
+        run = get_resumable_run(conn, collection) if resume else None
+        failures = get_index_failures(conn, collection)
+    if resume and run is None:
+        print(f"No interrupted run of '{collection}' to resume; starting a new run")
+    progress = dict.fromkeys(COUNTERS, 0) | {'elapsed': 0.0, 'stages': {}}
+    if run is not None:
+        progress |= json.loads(run['progress'] or '{}')
+        photos_dir = Path(run['photos_dir'])
+        print(f"Resuming run {run['id']} in {photos_dir} after {run['last_filename'] or 'the start'}")
+
     # Get image files
     image_files = get_image_files(photos_dir)
+    if retry_failures:
+        image_files = [f for f in image_files if f.name in failures]
+    else:
+        exhausted = {name for name, f in failures.items() if f['attempts'] >= INDEX_MAX_ATTEMPTS}
+        if exhausted:
+            print(f"Skipping {len(exhausted)} photos that failed {INDEX_MAX_ATTEMPTS} times "
+                  f"(see index_failures; use --retry-failures)")
+            image_files = [f for f in image_files if f.name not in exhausted]
     if not image_files:
-        print(f"No images found in {photos_dir}")
+        print("No failed photos to retry" if retry_failures else f"No images found in {photos_dir}")
         return
 
-    print(f"Found {len(image_files)} images")
+    # Continue after the last photo committed by the resumed run
+    start = 0
+    if run is None:
+        with get_connection(db_path) as conn:
+            run_id = start_index_run(conn, collection, str(photos_dir))
+    else:
+        run_id = run['id']
+        names = [f.name for f in image_files]
+        if run['last_filename'] in names:
+            start = names.index(run['last_filename']) + 1
+    progress['total'] = len(image_files)
+    progress['hardware'] = hardware_info(analysis_mode)
+
+    print(f"Found {len(image_files)} images" + (f", {start} done by the resumed run" if start else ""))
 
     # Initialize face analyzer
-    analyzer = init_face_analyzer()
+    analyzer = create_face_analyzer(analysis_mode)
 
     # Process images
-    total_faces = 0
-    skipped = 0
-    errors = 0
+    bursts = BurstTracker()
+    started = time.perf_counter()
+    previous_elapsed = progress['elapsed']
+    previous_stages = progress['stages']
+    processed_here = 0
+    skipped_here = 0
+
+    def snapshot() -> dict:
+        progress['elapsed'] = previous_elapsed + time.perf_counter() - started
+        progress['stages'] = stage_totals(previous_stages)
+        return dict(progress)
 
     with get_connection(db_path) as conn:
-        for image_path in tqdm(image_files, desc="Indexing faces"):
-            # Skip already indexed
-            if is_photo_indexed(conn, image_path.name):
-                skipped += 1
-                continue
+        committed = snapshot()
+        in_batch = 0
+        last_name = None
+        try:
+            for image_path in tqdm(image_files[start:], desc="Indexing faces",
+                                   initial=start, total=len(image_files)):
+                if in_batch >= INDEX_BATCH_SIZE:
+                    # Commit the batch together with the progress it represents
+                    committed = snapshot()
+                    update_index_run(conn, run_id, json.dumps(committed), last_name)
+                    conn.commit()
+                    in_batch = 0
+                last_name = image_path.name
+                progress['processed'] += 1
+                processed_here += 1
+
+                # Skip already indexed
+                if is_photo_indexed(conn, image_path.name, collection):
+                    progress['skipped'] += 1
+                    skipped_here += 1
+                    bursts.reset()
+                    INDEXER_PHOTOS.inc(result="skipped")
+                    continue
+
+                try:
+                    img, face_records = process_image(analyzer, image_path)
+                except Exception as e:
+                    reason = str(e) if isinstance(e, ImageError) else f"{type(e).__name__}: {e}"
+                    print(f"\n  Warning: Error processing {image_path.name}: {reason}")
+                    record_index_failure(conn, collection, image_path.name, str(image_path), reason, run_id)
+                    progress['errors'] += 1
+                    in_batch += 1
+                    bursts.reset()
+                    INDEXER_PHOTOS.inc(result="error")
+                    continue
+
+                with timed("index_hash"):
+                    phash = dhash(img)
+                    embeddings = [face['embedding'] for face in face_records]
+                    burst_id = bursts.match(phash, embeddings)
+
+                with timed("index_write"):
+                    # Insert photo record (even if no faces found)
+                    height, width = img.shape[:2]
+                    photo_id = insert_photo(conn, image_path.name, str(image_path), width, height, collection,
+                                            phash, burst_id)
+                    if burst_id is None:
+                        bursts.start(photo_id, phash, embeddings)
+                    else:
+                        if bursts.size == 1:
+                            set_burst_id(conn, burst_id, burst_id)
+                        bursts.size += 1
+                        progress['burst_frames'] += 1
+                        if collapse_bursts:
+                            # Same people as the representative, whose faces are indexed
+                            progress['collapsed_faces'] += len(face_records)
+                            face_records = []
+
+                    # Insert face records
+                    if face_records:
+                        for face in face_records:
+                            face['photo_id'] = photo_id
+                            face['collection'] = collection
+                        insert_faces_batch(conn, face_records)
+                        progress['faces'] += len(face_records)
+                    if image_path.name in failures:
+                        clear_index_failure(conn, collection, image_path.name)
+                        progress['recovered'] += 1
+                progress['indexed'] += 1
+                INDEXER_PHOTOS.inc(result="indexed")
+                INDEXER_FACES.inc(len(face_records))
+                in_batch += 1
+
+            committed = snapshot()
+            update_index_run(conn, run_id, json.dumps(committed), image_files[-1].name, 'completed')
+        except KeyboardInterrupt:
+            # Drop the partial batch; a resumed run redoes it from the last commit
+            conn.rollback()
+            update_index_run(conn, run_id, json.dumps(committed), status='interrupted')
+            conn.commit()
+            print(f"\nInterrupted; {committed['processed']} photos committed. "
+                  f"Continue with --resume (run {run_id})")
+            raise
+
+    elapsed = time.perf_counter() - started
+    worked = processed_here - skipped_here
+    INDEXER_THROUGHPUT.set(round(worked / elapsed, 3) if elapsed > 0 else 0)
+    if metrics_file:
+        write_textfile(metrics_file)
+
+    report = run_report(run_id, collection, committed)
+    if report_file:
+        report_file.parent.mkdir(parents=True, exist_ok=True)
+        report_file.write_text(json.dumps(report, indent=2) + "\n")
+
+    print(f"\n✓ Indexing complete (run {run_id}):")
+    print(f"  - Photos processed: {progress['processed'] - progress['skipped']}")
+    print(f"  - Photos skipped (already indexed): {progress['skipped']}")
+    print(f"  - Faces indexed: {progress['faces']}")
+    print(f"  - Burst frames: {progress['burst_frames']}" +
+          (f" ({progress['collapsed_faces']} duplicate faces not indexed)" if collapse_bursts else ""))
+    print(f"  - Errors: {progress['errors']}" +
+          (f" ({progress['recovered']} earlier failures recovered)" if progress['recovered'] else ""))
+    print(f"  - Throughput: {report['photos_per_second']:.2f} photos/s")
+    for stage, stats in report['stages'].items():
+        print(f"  - {stage}: {stats['ms_per_photo']:.1f} ms/photo ({stats['photos_per_second']:.1f} photos/s)")
+    if report_file:
+        print(f"  - Report: {report_file}")
+
+
+def cluster_faces(db_path: Path, collection: str = DEFAULT_COLLECTION):
+    """Group a collection's faces into identity clusters and store centroids."""
+    init_db(db_path)
+    with get_connection(db_path) as conn:
+        data = get_all_embeddings(conn, collection)
+
+    if not data:
+        print("No faces to cluster")
+        return
 
-            img, face_records = process_image(analyzer, image_path)
+    print(f"Clustering {len(data)} faces...")
+    face_ids = [d[0] for d in data]
+    embeddings = np.vstack([d[2] for d in data])
+    labels, centroids, representatives = cluster_embeddings(
+        embeddings, CLUSTER_THRESHOLD, CLUSTER_NEIGHBORS, CLUSTER_ITERATIONS
+    )
 
-            if img is None:
-                errors += 1
-                continue
+    with get_connection(db_path) as conn:
+        replace_clusters(conn, collection, face_ids, labels, centroids, representatives)
 
-            # Insert photo record (even if no faces found)
-            height, width = img.shape[:2]
-            photo_id = insert_photo(conn, image_path.name, str(image_path), width, height)
+    sizes = np.bincount(labels)
+    print("✓ Clustering complete:")
+    print(f"  - Identities: {len(centroids)}")
+    print(f"  - Identities with 2+ faces: {int((sizes >= 2).sum())}")
+    print(f"  - Largest identity: {int(sizes.max())} faces")
 
-            # Insert face records
-            if face_records:
-                for face in face_records:
-                    face['photo_id'] = photo_id
-                insert_faces_batch(conn, face_records)
-                total_faces += len(face_records)
 
-        conn.commit()
+def assign_new_faces(db_path: Path, collection: str = DEFAULT_COLLECTION):
+    """Attach faces indexed since the last clustering to existing identity clusters.
 
-    print(f"\n✓ Indexing complete:")
-    print(f"  - Photos processed: {len(image_files) - skipped}")
-    print(f"  - Photos skipped (already indexed): {skipped}")
-    print(f"  - Faces indexed: {total_faces}")
-    print(f"  - Errors: {errors}")
+    Unlike a rebuild this is linear in the new faces. Faces no centroid
+    matches stay unclustered (search always scans them) until the next
+    rebuild with --cluster.
+    """
+    init_db(db_path)
+    with get_connection(db_path) as conn:
+        cluster_ids, centroids, _ = get_all_clusters(conn, collection)
+        if centroids is None:
+            print("No identity clusters yet; build them with --cluster")
+            return
+        new_faces = get_unclustered_embeddings(conn, collection)
+        if not new_faces:
+            return
+
+        sizes = get_cluster_sizes(conn, collection)
+        face_ids = [face_id for face_id, _ in new_faces]
+        labels, moved = assign_to_clusters(
+            np.vstack([e for _, e in new_faces]), centroids,
+            np.array([sizes[cid] for cid in cluster_ids], dtype=np.float64), CLUSTER_THRESHOLD
+        )
+        add_cluster_members(conn, face_ids, cluster_ids, labels, moved)
+
+    assigned = int((labels >= 0).sum())
+    print(f"✓ Assigned {assigned} of {len(face_ids)} new faces to existing identities")
+    if assigned < len(face_ids):
+        print(f"  - {len(face_ids) - assigned} faces stay unclustered; rebuild with --cluster")
 
 
 def main():
     parser = argparse.ArgumentParser(description="Index faces from photos using InsightFace")
     parser.add_argument("-i", "--input", default="data/photos", help="Photos directory (default: data/photos)")
     parser.add_argument("-d", "--database", default=None, help="Database path (default: data/database.db)")
+    parser.add_argument("-c", "--collection", default=DEFAULT_COLLECTION,
+                        help=f"Collection (event) to index into (default: {DEFAULT_COLLECTION})")
+    parser.add_argument("--metrics-file", default=None,
+                        help="Write Prometheus metrics (textfile collector format) after indexing")
+    parser.add_argument("--cluster", action="store_true",
+                        help="Rebuild identity clusters from scratch after indexing (quadratic in the "
+                             "collection's faces); by default new faces join existing clusters")
+    parser.add_argument("--no-cluster", action="store_true",
+                        help="Leave new faces out of identity clusters")
+    parser.add_argument("--cluster-only", action="store_true", help="Only rebuild identity clusters")
+    parser.add_argument("--analysis-mode", choices=ANALYSIS_MODES, default=ANALYSIS_MODE,
+                        help="lean: detection + batched recognition only; full: all buffalo_l models "
+                             f"(default: {ANALYSIS_MODE})")
+    parser.add_argument("--collapse-bursts", action="store_true",
+                        help="Index faces of only the first frame of each near-duplicate burst")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue the last killed or interrupted run of the collection")
+    parser.add_argument("--retry-failures", action="store_true",
+                        help="Only index photos that failed in earlier runs, however often")
+    parser.add_argument("--report", default=None,
+                        help="Write the run's counters, hardware and per-stage throughput as JSON")
     args = parser.parse_args()
 
     # Resolve paths relative to project root
@@ -147,14 +421,26 @@ def main():
     photos_dir = project_root / args.input
     db_path = Path(args.database) if args.database else DB_PATH
 
+    if args.cluster_only:
+        cluster_faces(db_path, args.collection)
+        return
+
     if not photos_dir.exists():
         print(f"Error: Photos directory not found: {photos_dir}", file=sys.stderr)
         sys.exit(1)
 
     print(f"Photos directory: {photos_dir}")
     print(f"Database: {db_path}")
-
-    index_photos(photos_dir, db_path)
+    print(f"Collection: {args.collection}")
+
+    metrics_file = Path(args.metrics_file) if args.metrics_file else None
+    report_file = Path(args.report) if args.report else None
+    index_photos(photos_dir, db_path, args.collection, metrics_file, args.analysis_mode,
+                 args.collapse_bursts, args.resume, args.retry_failures, report_file)
+    if args.cluster:
+        cluster_faces(db_path, args.collection)
+    elif not args.no_cluster:
+        assign_new_faces(db_path, args.collection)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""Run a sharded backend locally: one uvicorn process per shard on consecutive ports.
+
+Every node serves its shard on /internal/shard-search and coordinates
+/api/search across all nodes; only the first node loads the face analyzer,
+so upload selfies and search through it.
+"""
+import argparse
+import os
+import secrets
+import signal
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).parent.parent / "backend"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run N backend shard nodes on one host")
+    parser.add_argument("-n", "--shards", type=int, default=2, help="Number of shard nodes (default: 2)")
+    parser.add_argument("--port", type=int, default=8100, help="Port of the first node (default: 8100)")
+    parser.add_argument("-d", "--database", default=None, help="Database path (default: data/database.db)")
+    parser.add_argument("--detect-on-all", action="store_true",
+                        help="Load the face analyzer on every node, not just the first")
+    args = parser.parse_args()
+
+    nodes = [f"http://127.0.0.1:{args.port + i}" for i in range(args.shards)]
+    token = os.environ.get("SHARD_TOKEN") or secrets.token_hex(16)
+
+    processes = []
+    for index, node in enumerate(nodes):
+        env = dict(os.environ,
+                   SHARD_INDEX=str(index),
+                   SHARD_COUNT=str(args.shards),
+                   SHARD_NODES=",".join(nodes),
+                   SHARD_TOKEN=token)
+        if args.database:
+            env["DB_PATH"] = str(Path(args.database).resolve())
+        if index > 0 and not args.detect_on_all:
+            env["FACE_DETECTION_ENABLED"] = "0"
+        cmd = [sys.executable, "-m", "uvicorn", "main:app",
+               "--host", "127.0.0.1", "--port", str(args.port + index)]
+        processes.append(subprocess.Popen(cmd, cwd=BACKEND_DIR, env=env))
+        print(f"Shard {index}/{args.shards}: {node} (pid {processes[-1].pid})")
+
+    print(f"\nCoordinator: {nodes[0]} (Ctrl+C to stop all nodes)")
+
+    def stop(*_):
+        for proc in processes:
+            proc.terminate()
+
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        while all(proc.poll() is None for proc in processes):
+            time.sleep(0.5)
+        print("A shard node exited; stopping the others", file=sys.stderr)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop()
+        for proc in processes:
+            proc.wait()
+
+
+if __name__ == "__main__":
+    main()
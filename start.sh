@@ -23,22 +23,23 @@ cd ..
 # Wait for backend to start
 sleep 3
 
-# Start frontend dev server (or serve built files)
+# The backend serves a built frontend itself (from memory, compressed);
+# without a build, start the Vite dev server
 if [ -d "frontend/dist" ]; then
-    echo "Serving built frontend..."
-    cd frontend/dist
-    python3 -m http.server 5173 &
-    FRONTEND_PID=$!
+    echo "Serving built frontend from the backend..."
+    FRONTEND_URL="http://localhost:8000"
 else
     echo "Starting frontend dev server on http://localhost:5173..."
     cd frontend
     npm run dev &
     FRONTEND_PID=$!
+    cd ..
+    FRONTEND_URL="http://localhost:5173"
 fi
 
 echo ""
 echo "✅ App is running!"
-echo "   Frontend: http://localhost:5173"
+echo "   Frontend: $FRONTEND_URL"
 echo "   Backend:  http://localhost:8000"
 echo ""
 echo "Press Ctrl+C to stop..."